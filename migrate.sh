@@ -0,0 +1,4 @@
+#!/bin/bash
+# Applies the db_search migrations. This is run once per release (ie, by the gwcloud-db-search-migrate job) rather
+# than each time a server starts
+/src/venv/bin/python /src/production-manage.py migrate db_search --database db_search
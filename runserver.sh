@@ -1,4 +1,3 @@
 #!/bin/bash
-/src/venv/bin/python /src/production-manage.py migrate db_search;
-
-/src/venv/bin/gunicorn gw_db_search.wsgi -b 0.0.0.0:8000
+# Migrations are applied separately by migrate.sh, so starting a server doesn't wait on them
+/src/venv/bin/gunicorn -c /src/gunicorn.conf.py gw_db_search.asgi
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class DbSearchConfig(AppConfig):
     name = 'db_search'
+
+    def ready(self):
+        # Compile the common search statements up front rather than during the first requests
+        from db_search.utils.job_search import warm_search_statements
+        warm_search_statements()
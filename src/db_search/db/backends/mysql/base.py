@@ -0,0 +1,74 @@
+"""
+A MySQL backend that reuses connections from a pool rather than opening a new connection each time Django connects to
+the database. Connections are checked out of the pool when Django connects, and are returned to it when Django closes
+the connection, ie, at the end of each request.
+
+The pool of each database is configured by the POOL entry of the database settings, for example:-
+
+    'bilbyui': {
+        'ENGINE': 'db_search.db.backends.mysql',
+        ...
+        'POOL': {
+            'SIZE': 10,
+            'IDLE_TIMEOUT': 300,
+            'CHECKOUT_TIMEOUT': 10
+        }
+    }
+"""
+from django.db.backends.mysql import base
+from django.db.backends.mysql.base import Database
+
+from db_search.db.pool import ConnectionPool, get_pool
+
+DEFAULT_POOL_SETTINGS = {
+    # The maximum number of connections open at once by each process
+    'SIZE': 10,
+    # The number of seconds a connection may be idle in the pool before it is closed. This should be less than the MySQL
+    # wait_timeout, after which the server closes the connection
+    'IDLE_TIMEOUT': 300,
+    # The number of seconds to wait for a connection when every connection is in use
+    'CHECKOUT_TIMEOUT': 10
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_pool(self, conn_params):
+        """
+        Gets the connection pool of this database
+
+        :param conn_params: The parameters used to open new connections
+
+        :return: The connection pool
+        """
+        pool_settings = {**DEFAULT_POOL_SETTINGS, **self.settings_dict.get('POOL', {})}
+
+        def create():
+            return ConnectionPool(
+                connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                check=lambda connection: connection.ping(),
+                close=lambda connection: connection.close(),
+                size=pool_settings['SIZE'],
+                idle_timeout=pool_settings['IDLE_TIMEOUT'],
+                checkout_timeout=pool_settings['CHECKOUT_TIMEOUT']
+            )
+
+        return get_pool(self.alias, self.settings_dict['NAME'], create)
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        return self.pool.checkout()
+
+    def _close(self):
+        if self.connection is None:
+            return
+
+        with self.wrap_database_errors:
+            reusable = True
+            if not self.get_autocommit() or self.in_atomic_block:
+                # Don't leave an open transaction on the connection for the next user
+                try:
+                    self.connection.rollback()
+                except Database.Error:
+                    reusable = False
+
+            self.pool.release(self.connection, reusable)
@@ -0,0 +1,226 @@
+import collections
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+# The connection pools of the current process, by database alias and name (See get_pool)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """
+    Raised when a connection can't be checked out of a pool before the checkout timeout
+    """
+    pass
+
+
+class ConnectionPool:
+    """
+    A pool of database connections for a single database. At most size connections are open at once, either checked
+    out or idle in the pool. Idle connections are health checked when they are checked out, and are closed once they
+    have been idle for longer than idle_timeout seconds.
+    """
+
+    def __init__(self, connect, check, close, size, idle_timeout, checkout_timeout):
+        """
+        :param connect: A function that opens a new connection
+        :param check: A function that raises an exception if an idle connection can no longer be used
+        :param close: A function that closes a connection
+        :param size: The maximum number of connections open at once
+        :param idle_timeout: The number of seconds a connection may be idle before it is closed
+        :param checkout_timeout: The number of seconds to wait for a connection when every connection is in use
+        """
+        self.connect = connect
+        self.check = check
+        self.close = close
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+
+        self.condition = threading.Condition()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets every connection. Connections inherited from a parent process are shared with the parent, so they are
+        dropped rather than closed.
+        """
+        self.pid = os.getpid()
+
+        # Idle connections and the time they were released, the most recently released are at the right
+        self.idle = collections.deque()
+        self.in_use = 0
+
+        # Metrics
+        self.checkouts = 0
+        self.created = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self.evicted = 0
+        self.failed_checks = 0
+
+    def _check_process(self):
+        # The pool must be used with the condition held
+        if self.pid != os.getpid():
+            self.reset()
+
+    def _close_quietly(self, connection):
+        try:
+            self.close(connection)
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        # The pool must be used with the condition held
+        expired = time.monotonic() - self.idle_timeout
+        while self.idle and self.idle[0][1] < expired:
+            connection, _ = self.idle.popleft()
+            self._close_quietly(connection)
+            self.evicted += 1
+
+    def checkout(self):
+        """
+        Checks a connection out of the pool, waiting for one to be released if every connection is in use
+
+        :return: The connection
+        """
+        with self.condition:
+            self._check_process()
+            self._evict_idle()
+
+            # Wait until there is an idle connection or room to open a new one
+            if not self.idle and self.in_use >= self.size:
+                self.waits += 1
+                started = time.monotonic()
+
+                waited = self.condition.wait_for(
+                    lambda: self.idle or self.in_use < self.size,
+                    self.checkout_timeout
+                )
+
+                self.wait_seconds += time.monotonic() - started
+
+                if not waited:
+                    self.timeouts += 1
+                    raise PoolTimeout(
+                        f'Timed out waiting for a database connection after {self.checkout_timeout} seconds'
+                    )
+
+            # Reuse the most recently released connection, as it is the least likely to have been closed by the server
+            connection = self.idle.pop()[0] if self.idle else None
+            self.in_use += 1
+            self.checkouts += 1
+
+        try:
+            if connection is not None:
+                try:
+                    self.check(connection)
+                except Exception:
+                    self._close_quietly(connection)
+                    connection = None
+
+                    with self.condition:
+                        self.failed_checks += 1
+
+            if connection is None:
+                connection = self.connect()
+
+                with self.condition:
+                    self.created += 1
+        except Exception:
+            # The connection could not be opened, so free its place in the pool
+            with self.condition:
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+
+        return connection
+
+    def release(self, connection, reusable=True):
+        """
+        Returns a checked out connection to the pool
+
+        :param connection: The connection
+        :param reusable: If this is False the connection is closed instead of being returned to the pool
+        """
+        with self.condition:
+            if self.pid != os.getpid():
+                # The connection was checked out by the parent process
+                return
+
+            self.in_use -= 1
+
+            if reusable:
+                self.idle.append((connection, time.monotonic()))
+            else:
+                self._close_quietly(connection)
+
+            self.condition.notify()
+
+    def clear(self):
+        """
+        Closes every idle connection
+        """
+        with self.condition:
+            self._check_process()
+
+            while self.idle:
+                connection, _ = self.idle.popleft()
+                self._close_quietly(connection)
+
+    def metrics(self):
+        """
+        Gets the metrics of the pool
+
+        :return: A dictionary of metric name -> value
+        """
+        with self.condition:
+            self._check_process()
+
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'checkouts': self.checkouts,
+                'created': self.created,
+                'waits': self.waits,
+                'wait_seconds': self.wait_seconds,
+                'timeouts': self.timeouts,
+                'evicted': self.evicted,
+                'failed_checks': self.failed_checks
+            }
+
+
+def get_pool(alias, name, create):
+    """
+    Gets the connection pool of a database, creating it if it doesn't exist
+
+    :param alias: The database alias
+    :param name: The name of the database, the test database has a separate pool
+    :param create: A function that creates the pool
+
+    :return: The connection pool
+    """
+    with _pools_lock:
+        pool = _pools.get((alias, name))
+        if pool is None:
+            pool = _pools[(alias, name)] = create()
+
+        return pool
+
+
+def get_pool_metrics():
+    """
+    Gets the metrics of every connection pool in the current process
+
+    :return: A dictionary of database alias -> dictionary of metric name -> value
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+
+    # Metrics are reported by alias, the pool for the database currently in use by an alias is the most recent
+    return {alias: pool.metrics() for (alias, _), pool in pools}
@@ -0,0 +1,66 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from gwauth.models import GWCloudUser
+
+from db_search.utils.benchmark import PAGE_OFFSETS, TERM_COUNTS, TIME_RANGES, compare_results, get_scenarios, \
+    run_benchmark
+from db_search.utils.job_search import job_klasses
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks job searches and the GraphQL endpoint, reporting latency percentiles and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=10, help='The number of times each scenario is run')
+        parser.add_argument('--terms', type=int, nargs='+', default=TERM_COUNTS, help='The numbers of search terms')
+        parser.add_argument('--time-ranges', nargs='+', default=TIME_RANGES, help='The time ranges, ie, 1d or 1y')
+        parser.add_argument('--offsets', type=int, nargs='+', default=PAGE_OFFSETS, help='The page offsets')
+        parser.add_argument(
+            '--application',
+            choices=job_klasses.keys(),
+            action='append',
+            help='Only search this application. May be specified more than once.'
+        )
+        parser.add_argument('--no-graphql', action='store_true', help='Only benchmark job_search')
+        parser.add_argument('--seed', type=int, default=0, help='The random seed used to pick search terms')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='Compare the results with those in this JSON file from an earlier run')
+
+    def handle(self, *args, **options):
+        # The GraphQL queries must be made by a logged in user
+        user = GWCloudUser.objects.using('gwauth').order_by('id').first()
+        if user is None:
+            raise CommandError('There are no users to run the GraphQL queries as, see generate_search_data')
+
+        scenarios = get_scenarios(options['terms'], options['time_ranges'], options['offsets'])
+
+        def log(name, result):
+            self.stdout.write(
+                f'{name}  p50 {result["p50"]:.1f}ms  p90 {result["p90"]:.1f}ms  p99 {result["p99"]:.1f}ms  '
+                f'mean {result["mean"]:.1f}ms  queries {result["queries"]:.1f}  rows {result["rows"]:.1f}'
+            )
+
+        results = run_benchmark(
+            user, scenarios,
+            applications=options['application'],
+            iterations=options['iterations'],
+            graphql=not options['no_graphql'],
+            seed=options['seed'],
+            log=log
+        )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+            self.stdout.write('Compared with the baseline:')
+            for name, baseline_p50, p50, ratio, baseline_queries, queries in compare_results(baseline, results):
+                self.stdout.write(
+                    f'{name}  p50 {baseline_p50:.1f}ms -> {p50:.1f}ms ({ratio:.2f}x)  '
+                    f'queries {baseline_queries:.1f} -> {queries:.1f}'
+                )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from db_search.utils.fulltext import create_fulltext_indexes, get_missing_fulltext_indexes
+from db_search.utils.job_search import job_klasses
+
+
+class Command(BaseCommand):
+    help = 'Creates the FULLTEXT indexes used when SEARCH_ENGINE is "fulltext", or checks that they exist'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--application',
+            choices=job_klasses.keys(),
+            action='append',
+            help='Only create the indexes for this application. May be specified more than once.'
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only check that the indexes exist, failing if any are missing'
+        )
+
+    def handle(self, *args, **options):
+        missing = []
+        for application in options['application'] or job_klasses.keys():
+            job_klass = job_klasses[application]
+
+            if options['verify']:
+                indexes = get_missing_fulltext_indexes(application, job_klass)
+                missing += indexes
+                action = 'Missing'
+            else:
+                indexes = create_fulltext_indexes(application, job_klass)
+                action = 'Created'
+
+            for table, columns in indexes:
+                self.stdout.write(f'{action} FULLTEXT index on {application} {table} ({", ".join(columns)})')
+
+        if missing:
+            raise CommandError(f'{len(missing)} FULLTEXT indexes are missing, run create_fulltext_indexes')
+
+        self.stdout.write('Every FULLTEXT index exists')
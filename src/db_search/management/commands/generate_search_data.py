@@ -0,0 +1,84 @@
+import random
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from db_search.utils.job_search import job_klasses
+from db_search.utils.synthetic import BATCH_SIZE, generate_event_ids, generate_jobs, generate_labels, generate_users
+
+
+class Command(BaseCommand):
+    help = 'Adds synthetic users, jobs, labels, event ids and job histories to the databases for benchmarking searches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jobs', type=int, default=100000, help='The number of jobs to add to each application')
+        parser.add_argument('--users', type=int, default=1000, help='The number of users to add')
+        parser.add_argument('--labels', type=int, default=10, help='The number of labels to add to each application')
+        parser.add_argument('--event-ids', type=int, default=500, help='The number of bilby event ids to add')
+        parser.add_argument(
+            '--histories',
+            type=float,
+            default=5,
+            help='The mean number of job history entries of each job'
+        )
+        parser.add_argument('--days', type=int, default=365, help='Jobs are created over this many days up to now')
+        parser.add_argument('--private', type=float, default=0.1, help='The fraction of jobs that are private')
+        parser.add_argument('--ligo', type=float, default=0.3, help='The fraction of jobs that are LIGO jobs')
+        parser.add_argument(
+            '--uploaded',
+            type=float,
+            default=0.1,
+            help='The fraction of bilby jobs that are uploaded, and so have no job history'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='The random seed, so the same data can be generated')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='The number of rows inserted at once')
+        parser.add_argument(
+            '--application',
+            choices=job_klasses.keys(),
+            action='append',
+            help='Only add jobs to this application. May be specified more than once.'
+        )
+        parser.add_argument(
+            '--i-know-this-is-not-production',
+            action='store_true',
+            help='Add the data even though neither DEBUG nor TESTING is set'
+        )
+
+    def handle(self, *args, **options):
+        # The data is added to whichever databases are configured, so it must never be added to production by mistake
+        if not (settings.DEBUG or settings.TESTING or options['i_know_this_is_not_production']):
+            raise CommandError(
+                'Refusing to add synthetic data since neither DEBUG nor TESTING is set. Pass '
+                '--i-know-this-is-not-production if these databases are not production databases'
+            )
+
+        rng = random.Random(options['seed'])
+
+        user_ids = generate_users(rng, options['users'], batch_size=options['batch_size'])
+        self.stdout.write(f'Added {len(user_ids)} users')
+
+        for application in options['application'] or job_klasses.keys():
+            job_klass = job_klasses[application]
+
+            label_ids = generate_labels(application, job_klass, options['labels'])
+
+            event_ids = []
+            if application == 'bilbyui':
+                event_ids = generate_event_ids(rng, options['event_ids'], batch_size=options['batch_size'])
+
+            history_count = generate_jobs(
+                rng, application, job_klass, options['jobs'], user_ids,
+                label_ids=label_ids,
+                event_ids=event_ids,
+                days=options['days'],
+                mean_histories=options['histories'],
+                private_fraction=options['private'],
+                ligo_fraction=options['ligo'],
+                uploaded_fraction=options['uploaded'],
+                batch_size=options['batch_size']
+            )
+
+            self.stdout.write(
+                f'Added {options["jobs"]} {application} jobs with {len(label_ids)} labels, {len(event_ids)} event ids '
+                f'and {history_count} job history entries'
+            )
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from db_search.utils.sync import SYNC_STRUCTURES, get_sync_structures, rebuild_structure, sync_structure
+
+
+class Command(BaseCommand):
+    help = 'Re-indexes the jobs that have changed since the search structures used by SEARCH_ENGINE were last synced'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--structure',
+            choices=SYNC_STRUCTURES.keys(),
+            action='append',
+            help='Sync this search structure rather than those used by SEARCH_ENGINE. May be specified more than once.'
+        )
+
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the search structures from every job, removing deleted jobs'
+        )
+
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='The number of worker processes used to rebuild the search structures. Defaults to '
+                 'SEARCH_SYNC_WORKERS, 0 rebuilds them in this process'
+        )
+
+    def handle(self, *args, **options):
+        structures = options['structure'] or get_sync_structures()
+        if not structures:
+            self.stderr.write('The search engine does not use any search structures that need to be synced')
+
+        for structure in structures:
+            if options['rebuild']:
+                count = rebuild_structure(structure, workers=options['workers'])
+            else:
+                count = sync_structure(structure)
+
+            if count is None:
+                self.stderr.write(f'The {structure} search structure is already being synced by another process')
+            else:
+                self.stdout.write(f'Indexed {count} jobs in the {structure} search structure')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from db_search.utils.job_state import update_job_states
+
+
+class Command(BaseCommand):
+    help = 'Updates the job state table used when SEARCH_JOB_STATE_TABLE is enabled from new job history entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the job state table from the full job history'
+        )
+
+    def handle(self, *args, **options):
+        count = update_job_states(rebuild=options['rebuild'])
+
+        if count is None:
+            self.stderr.write('The job states are already being updated by another process')
+        else:
+            self.stdout.write(f'Applied {count} job history entries')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from db_search.utils.job_search import job_klasses
+from db_search.utils.replica import update_replica
+
+
+class Command(BaseCommand):
+    help = 'Updates the SQLite search replica used when SEARCH_ENGINE is "replica" from new and changed jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the replica from scratch, removing deleted jobs and labels'
+        )
+
+    def handle(self, *args, **options):
+        count = update_replica(job_klasses, rebuild=options['rebuild'])
+
+        if count is None:
+            self.stderr.write('The search replica is already being updated by another process')
+        else:
+            self.stdout.write(f'Copied {count} jobs to the search replica')
@@ -0,0 +1,22 @@
+import asyncio
+
+from django.utils.decorators import sync_and_async_middleware
+
+from db_search.utils.metrics import observe_request
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Records the time taken and the number of database queries made by each request (See db_search.utils.metrics)
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            with observe_request():
+                return await get_response(request)
+    else:
+        def middleware(request):
+            with observe_request():
+                return get_response(request)
+
+    return middleware
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.19 on 2026-10-18 14:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchNgram',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('application', models.CharField(max_length=32)),
+                ('job_id', models.IntegerField()),
+                ('ngram', models.CharField(max_length=3)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchngram',
+            index=models.Index(fields=['application', 'job_id'], name='db_search_s_applica_0b71a9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchngram',
+            unique_together={('application', 'ngram', 'job_id')},
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.19 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_search', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobState',
+            fields=[
+                ('job_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('application', models.CharField(max_length=32)),
+                ('state', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('last_history_id', models.IntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='jobstate',
+            index=models.Index(fields=['application', 'timestamp', 'state'], name='db_search_j_applica_fbbe95_idx'),
+        ),
+    ]
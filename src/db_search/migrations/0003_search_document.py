@@ -0,0 +1,43 @@
+# Generated by Django 3.2.19 on 2026-10-18 16:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_search', '0002_job_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('application', models.CharField(max_length=32)),
+                ('job_id', models.IntegerField()),
+                ('text', models.TextField()),
+                ('owner', models.TextField()),
+                ('labels', models.TextField()),
+                ('event_ids', models.TextField()),
+                ('private', models.BooleanField()),
+                ('is_ligo_job', models.BooleanField()),
+                ('job_type', models.IntegerField(default=0)),
+                ('creation_time', models.DateTimeField()),
+                ('state', models.IntegerField(null=True)),
+                ('last_activity', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchdocument',
+            index=models.Index(fields=['application', 'last_activity', 'state'], name='db_search_s_applica_65aa05_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchdocument',
+            index=models.Index(fields=['application', 'creation_time'], name='db_search_s_applica_4f6cb4_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='searchdocument',
+            unique_together={('application', 'job_id')},
+        ),
+    ]
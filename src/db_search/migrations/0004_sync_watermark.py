@@ -0,0 +1,25 @@
+# Generated by Django 3.2.19 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_search', '0003_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('structure', models.CharField(max_length=32)),
+                ('name', models.CharField(max_length=64)),
+                ('value', models.CharField(max_length=64)),
+            ],
+            options={
+                'unique_together': {('structure', 'name')},
+            },
+        ),
+    ]
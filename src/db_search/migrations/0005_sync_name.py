@@ -0,0 +1,26 @@
+# Generated by Django 3.2.19 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db_search', '0004_sync_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncName',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('structure', models.CharField(max_length=32)),
+                ('source', models.CharField(max_length=32)),
+                ('row_id', models.IntegerField()),
+                ('digest', models.CharField(max_length=40)),
+            ],
+            options={
+                'unique_together': {('structure', 'source', 'row_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,137 @@
+from django.db import models
+
+
+class SearchNgram(models.Model):
+    """
+    A single posting in the n-gram search index. Each posting records that the searchable text of a job (the job name
+    and description, the owning user's names, label names and for bilby the event id fields) contains the n-gram.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    # The application the job belongs to, ie, "bilbyui" or "viterbi"
+    application = models.CharField(max_length=32)
+
+    # The id of the job in the application database
+    job_id = models.IntegerField()
+
+    # The normalised n-gram (See db_search.utils.ngram.normalise)
+    ngram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ('application', 'ngram', 'job_id')
+        indexes = [
+            models.Index(fields=['application', 'job_id'])
+        ]
+
+
+class JobState(models.Model):
+    """
+    The most recent state of a job controller job. This is maintained incrementally from the job history (See
+    db_search.utils.job_state) so that searches don't need to find the newest job history entry of every job.
+    """
+    # The id of the job in the job controller database
+    job_id = models.IntegerField(primary_key=True)
+
+    # The application the job belongs to, ie, "bilbyui" or "viterbi"
+    application = models.CharField(max_length=32)
+
+    # The state and timestamp of the newest job history entry for the job
+    state = models.IntegerField()
+    timestamp = models.DateTimeField()
+
+    # The id of the newest job history entry that has been applied to this record
+    last_history_id = models.IntegerField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['application', 'timestamp', 'state'])
+        ]
+
+
+class SearchDocument(models.Model):
+    """
+    The searchable text and search filters of a single job, so that searches can be answered from this one table when
+    SEARCH_ENGINE is "document" rather than reaching across the auth, application and job controller databases. Each
+    text field holds the normalised strings it is made from (See db_search.utils.ngram.normalise), one per line.
+    """
+    id = models.BigAutoField(primary_key=True)
+
+    # The application the job belongs to, ie, "bilbyui" or "viterbi"
+    application = models.CharField(max_length=32)
+
+    # The id of the job in the application database
+    job_id = models.IntegerField()
+
+    # The name and description of the job
+    text = models.TextField()
+
+    # The first and last name of the user that owns the job
+    owner = models.TextField()
+
+    # The names of the labels on the job
+    labels = models.TextField()
+
+    # The event id, trigger id and nickname of the job's event id, for applications that have them
+    event_ids = models.TextField()
+
+    private = models.BooleanField()
+    is_ligo_job = models.BooleanField()
+
+    # The type of the job for applications that have job types, ie, bilby uploaded jobs. Otherwise 0
+    job_type = models.IntegerField(default=0)
+
+    creation_time = models.DateTimeField()
+
+    # The state and timestamp of the newest job history entry of the job's job controller job, or None if it has none
+    state = models.IntegerField(null=True)
+    last_activity = models.DateTimeField(null=True)
+
+    class Meta:
+        unique_together = ('application', 'job_id')
+        indexes = [
+            models.Index(fields=['application', 'last_activity', 'state']),
+            models.Index(fields=['application', 'creation_time'])
+        ]
+
+
+class SyncWatermark(models.Model):
+    """
+    How far the sync of a search structure has got through one of the tables it is built from, ie, the id of the newest
+    job history entry applied to the search documents (See db_search.utils.sync)
+    """
+    id = models.AutoField(primary_key=True)
+
+    # The search structure, ie, "documents" or "ngrams"
+    structure = models.CharField(max_length=32)
+
+    # The name of the watermark, ie, "bilbyui_job_id" or "job_history_id"
+    name = models.CharField(max_length=64)
+
+    # The newest id or ISO 8601 last updated time that has been applied
+    value = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = ('structure', 'name')
+
+
+class SyncName(models.Model):
+    """
+    A digest of the searchable text of a user, label or event id as it was when it was last applied to a search
+    structure, so that renamed rows can be found and the jobs that use them re-indexed (See db_search.utils.sync)
+    """
+    id = models.AutoField(primary_key=True)
+
+    # The search structure, ie, "documents" or "ngrams"
+    structure = models.CharField(max_length=32)
+
+    # The table the row belongs to, ie, "users", "viterbi_labels" or "bilbyui_event_ids"
+    source = models.CharField(max_length=32)
+
+    # The id of the row in its table
+    row_id = models.IntegerField()
+
+    # The SHA-1 digest of the normalised searchable text of the row
+    digest = models.CharField(max_length=40)
+
+    class Meta:
+        unique_together = ('structure', 'source', 'row_id')
@@ -1,16 +1,21 @@
 import datetime
+import functools
 
 import graphene
 from django.conf import settings
 from django.utils import timezone
 from graphene_django import DjangoObjectType
+from graphql import GraphQLError
 from graphql_jwt.decorators import login_required
 from gwauth.models import GWCloudUser
 from jobserver.models import JobHistory
 from bilbyui.models import BilbyJob
 from viterbi.models import ViterbiJob
 
-from db_search.utils.job_search import job_search
+from db_search.utils.cache import get_search_cache, quantise_time
+from db_search.utils.cursor import decode_cursor, encode_cursor
+from db_search.utils.job_search import job_klasses, job_search, public_job_search
+from db_search.utils.selection import get_selected_fields
 
 
 class UserNode(DjangoObjectType):
@@ -46,14 +51,67 @@ class ViterbiPublicJob(graphene.ObjectType):
     history = graphene.List(JobHistoryNode)
 
 
+class PublicJobNode(graphene.Union):
+    class Meta:
+        types = (BilbyJobNode, ViterbiJobNode)
+
+
+class PublicJob(graphene.ObjectType):
+    application = graphene.String()
+    user = graphene.Field(UserNode)
+    job = graphene.Field(PublicJobNode)
+    history = graphene.List(JobHistoryNode)
+
+
 search_kwargs = dict(
     search=graphene.String(),
     time_range=graphene.String(),
+    since=graphene.DateTime(
+        description="Only find jobs last active at or after this ISO-8601 time. If since or until is given, "
+                    "time_range is ignored"
+    ),
+    until=graphene.DateTime(
+        description="Only find jobs last active at or before this ISO-8601 time. If since or until is given, "
+                    "time_range is ignored"
+    ),
     first=graphene.Int(),
     count=graphene.Int(),
-    exclude_ligo_jobs=graphene.Boolean()
+    exclude_ligo_jobs=graphene.Boolean(),
+    history_limit=graphene.Int(
+        default_value=1,
+        description="The number of job history entries to return for each job, newest first. 0 returns the full history"
+    )
 )
 
+# The relay connection fields provide their own first and after arguments
+connection_search_kwargs = dict(
+    search=graphene.String(),
+    time_range=graphene.String(),
+    since=graphene.DateTime(
+        description="Only find jobs last active at or after this ISO-8601 time. If since or until is given, "
+                    "time_range is ignored"
+    ),
+    until=graphene.DateTime(
+        description="Only find jobs last active at or before this ISO-8601 time. If since or until is given, "
+                    "time_range is ignored"
+    ),
+    exclude_ligo_jobs=graphene.Boolean(),
+    history_limit=graphene.Int(
+        default_value=1,
+        description="The number of job history entries to return for each job, newest first. 0 returns the full history"
+    )
+)
+
+
+class BilbyPublicJobConnection(graphene.relay.Connection):
+    class Meta:
+        node = BilbyPublicJob
+
+
+class ViterbiPublicJobConnection(graphene.relay.Connection):
+    class Meta:
+        node = ViterbiPublicJob
+
 
 class Query(object):
     public_bilby_jobs = graphene.List(
@@ -66,8 +124,35 @@ class Query(object):
         search_kwargs
     )
 
+    public_jobs = graphene.List(
+        PublicJob,
+        applications=graphene.List(
+            graphene.String,
+            default_value=list(job_klasses.keys()),
+            description="The applications to search, ie, bilbyui and viterbi"
+        ),
+        **search_kwargs
+    )
+
+    public_bilby_jobs_connection = graphene.relay.ConnectionField(
+        BilbyPublicJobConnection,
+        **connection_search_kwargs
+    )
+
+    public_viterbi_jobs_connection = graphene.relay.ConnectionField(
+        ViterbiPublicJobConnection,
+        **connection_search_kwargs
+    )
+
     @staticmethod
-    def perform_search(klass, application, info, **kwargs):
+    def get_search_criteria(**kwargs):
+        """
+        Parses the search criteria common to all public job searches
+
+        :return: A tuple of the list of search terms, the end time for jobs, the time jobs must have been active until,
+        if LIGO jobs should be excluded and the number of job history entries to return for each job. The end time and
+        until are None if the time window has no start or end
+        """
         # Get the search criteria
         search = kwargs.get("search", "")
 
@@ -84,7 +169,21 @@ class Query(object):
         # Calculate the end time for jobs
         time_range = kwargs.get("time_range", "1d")
         end_time = timezone.now()
-        if time_range == "1d":
+        until = None
+        explicit = kwargs.get("since") is not None or kwargs.get("until") is not None
+        if explicit:
+            # An explicit time window replaces the time range. Times without a time zone are taken to be UTC
+            end_time = kwargs.get("since")
+            if end_time is not None and timezone.is_naive(end_time):
+                end_time = timezone.make_aware(end_time, datetime.timezone.utc)
+
+            until = kwargs.get("until")
+            if until is not None and timezone.is_naive(until):
+                until = timezone.make_aware(until, datetime.timezone.utc)
+
+            if end_time is not None and until is not None and end_time > until:
+                raise GraphQLError("since must not be after until")
+        elif time_range == "1d":
             end_time -= datetime.timedelta(days=1)
         elif time_range == "1w":
             end_time -= datetime.timedelta(weeks=1)
@@ -93,24 +192,154 @@ class Query(object):
         elif time_range == "1y":
             end_time -= datetime.timedelta(days=365)
         else:
-            end_time = datetime.datetime(year=1900, month=1, day=1)
+            # Searches of all time have no end time, so the search doesn't need to join the job history
+            end_time = None
 
-        # Get the range
-        first = kwargs.get("first", 0)
-        count = kwargs.get("count", settings.GRAPHENE_RESULTS_LIMIT)
-
-        # Limit the maximum number of results
-        count = min(count, settings.GRAPHENE_RESULTS_LIMIT)
+        # Searches of a time range made close together in time use the same end time when search results are cached,
+        # so they can share results. An explicit since is always searched as given
+        if not explicit and end_time is not None and get_search_cache() is not None:
+            end_time = quantise_time(end_time, settings.SEARCH_CACHE_TIME_QUANTUM)
 
         # Check if we should exclude LIGO jobs or not
         exclude_ligo_jobs = kwargs.get("exclude_ligo_jobs", True)
 
-        # Perform the search
-        jobs = job_search(application, search_terms, end_time, None, first, count, exclude_ligo_jobs)
+        # Get the number of job history entries to return for each job, 0 or less returns the full history. A null limit
+        # returns the default of the newest entry
+        history_limit = kwargs.get("history_limit")
+        history_limit = max(history_limit if history_limit is not None else 1, 0)
+
+        return search_terms, end_time, until, exclude_ligo_jobs, history_limit
+
+    @staticmethod
+    def get_search_range(**kwargs):
+        """
+        Parses the range of results requested by a public job search. first and count may be given as null, in which
+        case their defaults are used
+
+        :return: A tuple of the number of results to skip and the number of results to return
+        """
+        first = kwargs.get("first") or 0
+        count = kwargs.get("count") or settings.GRAPHENE_RESULTS_LIMIT
+
+        if first < 0 or count < 0:
+            raise GraphQLError("first and count must not be negative")
+
+        # Every result before the page is found by the search to be skipped, so how far in to the results a page can
+        # start is limited
+        if first > settings.SEARCH_MAX_OFFSET:
+            raise GraphQLError(f"first must not be more than {settings.SEARCH_MAX_OFFSET}")
+
+        # Limit the maximum number of results
+        return first, min(count, settings.GRAPHENE_RESULTS_LIMIT)
+
+    @staticmethod
+    def get_job_search(info):
+        """
+        Gets the job search function to use for a query
+
+        :return: job_search, which looks up the users and histories of the jobs found concurrently on the search
+        thread pool if the query is being served by the asynchronous view
+        """
+        if getattr(info.context, 'concurrent_search', False):
+            return functools.partial(job_search, concurrent=True)
+
+        return job_search
+
+    @staticmethod
+    def perform_search(klass, application, info, **kwargs):
+        search_terms, end_time, until, exclude_ligo_jobs, history_limit = Query.get_search_criteria(**kwargs)
+
+        # Get the range
+        first, count = Query.get_search_range(**kwargs)
+
+        # Perform the search, only loading the job fields, users and histories requested by the query
+        selected = get_selected_fields(info)
+        jobs = Query.get_job_search(info)(
+            application, search_terms, end_time, None, first, count, exclude_ligo_jobs,
+            history_limit=history_limit,
+            job_fields=get_selected_fields(info, 'job'),
+            include_user='user' in selected,
+            include_history='history' in selected,
+            until=until
+        )
 
         # Generate the results
         return [klass(**job) for job in jobs]
 
+    @staticmethod
+    def perform_public_job_search(info, **kwargs):
+        applications = kwargs.get("applications", list(job_klasses.keys()))
+        for application in applications:
+            if application not in job_klasses:
+                raise GraphQLError(f'Unknown application "{application}"')
+
+        search_terms, end_time, until, exclude_ligo_jobs, history_limit = Query.get_search_criteria(**kwargs)
+
+        # Get the range
+        first, count = Query.get_search_range(**kwargs)
+
+        # Perform the search of every application at once, only loading what is requested by the query
+        selected = get_selected_fields(info)
+        jobs = public_job_search(
+            applications, search_terms, end_time, first, count, exclude_ligo_jobs,
+            history_limit=history_limit,
+            job_fields=get_selected_fields(info, 'job'),
+            include_user='user' in selected,
+            include_history='history' in selected,
+            until=until
+        )
+
+        return [PublicJob(**job) for job in jobs]
+
+    @staticmethod
+    def perform_connection_search(klass, connection_klass, application, info, **kwargs):
+        if kwargs.get("last") is not None or kwargs.get("before") is not None:
+            raise GraphQLError("Public job connections can only be paginated forwards with first and after")
+
+        search_terms, end_time, until, exclude_ligo_jobs, history_limit = Query.get_search_criteria(**kwargs)
+
+        # Get the page size, limiting the maximum number of results
+        if (kwargs.get("first") or 0) < 0:
+            raise GraphQLError("first must not be negative")
+
+        count = min(kwargs.get("first") or settings.GRAPHENE_RESULTS_LIMIT, settings.GRAPHENE_RESULTS_LIMIT)
+
+        # Get the position of the last job on the previous page
+        after = kwargs.get("after")
+        if after:
+            try:
+                after = decode_cursor(after)
+            except ValueError as e:
+                raise GraphQLError(str(e))
+
+        # Fetch one more job than was requested to find out if there is another page
+        selected = get_selected_fields(info, 'edges', 'node')
+        jobs = Query.get_job_search(info)(
+            application, search_terms, end_time, None, 0, count + 1, exclude_ligo_jobs, after, history_limit,
+            job_fields=get_selected_fields(info, 'edges', 'node', 'job'),
+            include_user='user' in selected,
+            include_history='history' in selected,
+            until=until
+        )
+
+        edges = [
+            connection_klass.Edge(
+                node=klass(**job),
+                cursor=encode_cursor(job['job'].creation_time, job['job'].id)
+            )
+            for job in jobs[:count]
+        ]
+
+        return connection_klass(
+            edges=edges,
+            page_info=graphene.relay.PageInfo(
+                has_next_page=len(jobs) > count,
+                has_previous_page=bool(after),
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None
+            )
+        )
+
     @login_required
     def resolve_public_bilby_jobs(self, info, **kwargs):
         return Query.perform_search(BilbyPublicJob, 'bilbyui', info, **kwargs)
@@ -119,6 +348,22 @@ class Query(object):
     def resolve_public_viterbi_jobs(self, info, **kwargs):
         return Query.perform_search(ViterbiPublicJob, 'viterbi', info, **kwargs)
 
+    @login_required
+    def resolve_public_jobs(self, info, **kwargs):
+        return Query.perform_public_job_search(info, **kwargs)
+
+    @login_required
+    def resolve_public_bilby_jobs_connection(self, info, **kwargs):
+        return Query.perform_connection_search(
+            BilbyPublicJob, BilbyPublicJobConnection, 'bilbyui', info, **kwargs
+        )
+
+    @login_required
+    def resolve_public_viterbi_jobs_connection(self, info, **kwargs):
+        return Query.perform_connection_search(
+            ViterbiPublicJob, ViterbiPublicJobConnection, 'viterbi', info, **kwargs
+        )
+
 
 class Mutation(graphene.ObjectType):
     pass
@@ -0,0 +1,39 @@
+from django.test import SimpleTestCase
+
+from db_search.utils.benchmark import compare_results, get_scenarios, percentile, summarise
+
+
+class TestBenchmark(SimpleTestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 90), 90)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 99), 3)
+
+    def test_summarise(self):
+        result = summarise([0.001, 0.002, 0.003, 0.010], [4, 4, 5, 5], [100, 100, 50, 0])
+
+        self.assertAlmostEqual(result['p50'], 2)
+        self.assertAlmostEqual(result['p99'], 10)
+        self.assertAlmostEqual(result['mean'], 4)
+        self.assertEqual(result['queries'], 4.5)
+        self.assertEqual(result['rows'], 62.5)
+
+    def test_scenarios(self):
+        scenarios = get_scenarios([0, 2], ['1d'], [0, 100])
+        self.assertEqual(len(scenarios), 8)
+        self.assertIn((2, '1d', 100, False), scenarios)
+
+    def test_compare_results(self):
+        baseline = {
+            'a': {'p50': 10, 'queries': 4},
+            'b': {'p50': 5, 'queries': 3}
+        }
+
+        results = {
+            'a': {'p50': 5, 'queries': 3},
+            'c': {'p50': 1, 'queries': 1}
+        }
+
+        self.assertEqual(compare_results(baseline, results), [('a', 10, 5, 0.5, 4, 3)])
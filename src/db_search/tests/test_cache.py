@@ -0,0 +1,79 @@
+import datetime
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from db_search.utils.cache import LocalSearchCache, DjangoSearchCache, get_search_cache, quantise_time
+
+
+class TestLocalSearchCache(SimpleTestCase):
+    def test_get_set(self):
+        cache = LocalSearchCache(60, 10)
+
+        self.assertIsNone(cache.get(('bilbyui', ('a',))))
+
+        cache.set(('bilbyui', ('a',)), [1, 2, 3])
+        self.assertEqual(cache.get(('bilbyui', ('a',))), [1, 2, 3])
+
+        cache.clear()
+        self.assertIsNone(cache.get(('bilbyui', ('a',))))
+
+    def test_ttl(self):
+        cache = LocalSearchCache(60, 10)
+
+        with mock.patch('db_search.utils.cache.time.monotonic', return_value=1000):
+            cache.set('key', 'value')
+
+        with mock.patch('db_search.utils.cache.time.monotonic', return_value=1059):
+            self.assertEqual(cache.get('key'), 'value')
+
+        with mock.patch('db_search.utils.cache.time.monotonic', return_value=1060):
+            self.assertIsNone(cache.get('key'))
+
+    def test_lru_eviction(self):
+        cache = LocalSearchCache(60, 2)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        # Reading a makes b the least recently used entry
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+
+class TestSearchCacheSettings(SimpleTestCase):
+    @override_settings(SEARCH_CACHE_BACKEND=None)
+    def test_disabled(self):
+        self.assertIsNone(get_search_cache())
+
+    @override_settings(SEARCH_CACHE_BACKEND='local')
+    def test_local(self):
+        self.assertIsInstance(get_search_cache(), LocalSearchCache)
+        self.assertIs(get_search_cache(), get_search_cache())
+
+    @override_settings(SEARCH_CACHE_BACKEND='django')
+    def test_django(self):
+        cache = get_search_cache()
+        self.assertIsInstance(cache, DjangoSearchCache)
+
+        cache.set(('viterbi', ()), [4, 5])
+        self.assertEqual(cache.get(('viterbi', ())), [4, 5])
+
+    @override_settings(SEARCH_CACHE_BACKEND='unknown')
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_search_cache()
+
+
+class TestQuantiseTime(SimpleTestCase):
+    def test_quantise_time(self):
+        value = datetime.datetime(2021, 5, 3, 10, 15, 30, 123456, tzinfo=timezone.utc)
+
+        self.assertEqual(quantise_time(value, 60), datetime.datetime(2021, 5, 3, 10, 15, tzinfo=timezone.utc))
+        self.assertEqual(quantise_time(value, 3600), datetime.datetime(2021, 5, 3, 10, tzinfo=timezone.utc))
+        self.assertEqual(quantise_time(value, 0), value)
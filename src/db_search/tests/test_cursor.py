@@ -0,0 +1,21 @@
+import datetime
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from db_search.utils.cursor import decode_cursor, encode_cursor
+
+
+class TestCursor(SimpleTestCase):
+    def test_round_trip(self):
+        creation_time = datetime.datetime(2021, 5, 3, 10, 15, 30, 123456, tzinfo=timezone.utc)
+
+        cursor = encode_cursor(creation_time, 42)
+        self.assertEqual(decode_cursor(cursor), (creation_time, 42))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor')
+
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor(timezone.now(), 'abc'))
@@ -0,0 +1,197 @@
+import datetime
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from gwauth.models import GWCloudUser
+from jobserver.models import Job, JobHistory
+from viterbi.models import ViterbiJob
+
+from db_search.models import JobState
+from db_search.status import JobStatus
+from db_search.utils.job_search import job_search
+from db_search.utils.job_state import clear_job_states_ready, update_job_states
+
+
+@override_settings(TESTING=True, SEARCH_JOB_STATE_TABLE=True)
+class TestJobState(SimpleTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        # Clean everything up first just in case - because we are unable to use TransactionTestCase which would normally
+        # manage this for us
+        GWCloudUser.objects.using('gwauth').all().delete()
+        Job.objects.using('jobserver').all().delete()
+        JobHistory.objects.using('jobserver').all().delete()
+        ViterbiJob.objects.using('viterbi').all().delete()
+        JobState.objects.using('db_search').all().delete()
+        clear_job_states_ready()
+
+        self.user = GWCloudUser.objects.using('gwauth').create(
+            email='user1@example.com',
+            username='user1',
+            first_name='User',
+            last_name='One'
+        )
+
+        self.job_controller_job = Job.objects.using('jobserver').create(
+            user=self.user.id,
+            cluster="test_cluster",
+            bundle="test_bundle",
+            application='viterbi'
+        )
+
+        self.history_queued = JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='submit',
+            state=JobStatus.QUEUED,
+            timestamp=timezone.now()
+        )
+
+        self.history_running = JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='submit',
+            state=JobStatus.RUNNING,
+            timestamp=timezone.now()
+        )
+
+        self.viterbi_job = ViterbiJob.objects.using('viterbi').create(
+            user_id=self.user.id,
+            job_controller_id=self.job_controller_job.id,
+            name="test_job_viterbi",
+            description="my job is orange",
+            private=False
+        )
+
+    def get_job_state(self):
+        return JobState.objects.using('db_search').get(job_id=self.job_controller_job.id)
+
+    def test_update_job_states(self):
+        self.assertEqual(update_job_states(), 2)
+
+        job_state = self.get_job_state()
+        self.assertEqual(job_state.application, 'viterbi')
+        self.assertEqual(job_state.state, JobStatus.RUNNING)
+        self.assertEqual(job_state.timestamp, self.history_running.timestamp)
+        self.assertEqual(job_state.last_history_id, self.history_running.id)
+
+        # Nothing should be applied if there are no new job history entries
+        self.assertEqual(update_job_states(), 0)
+
+        # New job history entries should update the state
+        history_error = JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='_job_completion_',
+            state=JobStatus.ERROR,
+            timestamp=timezone.now()
+        )
+
+        self.assertEqual(update_job_states(), 1)
+
+        job_state = self.get_job_state()
+        self.assertEqual(job_state.state, JobStatus.ERROR)
+        self.assertEqual(job_state.timestamp, history_error.timestamp)
+
+        # A new entry that is older than the current state should be recorded as applied without changing the state
+        history_old = JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='jid0',
+            state=JobStatus.COMPLETED,
+            timestamp=timezone.now() - datetime.timedelta(days=2)
+        )
+
+        self.assertEqual(update_job_states(), 1)
+
+        job_state = self.get_job_state()
+        self.assertEqual(job_state.state, JobStatus.ERROR)
+        self.assertEqual(job_state.last_history_id, history_old.id)
+
+        # An entry that is committed after an entry with a greater id has been applied should still be applied
+        history_late = JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='_job_completion_',
+            state=JobStatus.COMPLETED,
+            timestamp=timezone.now()
+        )
+        JobState.objects.using('db_search').filter(job_id=self.job_controller_job.id).update(
+            last_history_id=history_late.id + 1
+        )
+
+        self.assertEqual(update_job_states(), 0)
+
+        job_state = self.get_job_state()
+        self.assertEqual(job_state.state, JobStatus.COMPLETED)
+        self.assertEqual(job_state.timestamp, history_late.timestamp)
+        self.assertEqual(job_state.last_history_id, history_late.id + 1)
+
+        # Rebuilding should apply every entry again
+        self.assertEqual(update_job_states(rebuild=True), 5)
+
+        job_state = self.get_job_state()
+        self.assertEqual(job_state.state, JobStatus.COMPLETED)
+        self.assertEqual(job_state.last_history_id, history_late.id)
+
+        # Rebuilding should drop deleted entries from the state, and remove the states of jobs with no entries left
+        JobHistory.objects.using('jobserver').filter(id__in=[history_error.id, history_late.id]).delete()
+        JobState.objects.using('db_search').create(
+            job_id=self.job_controller_job.id + 1,
+            application='viterbi',
+            state=JobStatus.COMPLETED,
+            timestamp=timezone.now(),
+            last_history_id=history_late.id
+        )
+
+        self.assertEqual(update_job_states(rebuild=True), 3)
+
+        job_state = self.get_job_state()
+        self.assertEqual(job_state.state, JobStatus.RUNNING)
+        self.assertEqual(job_state.timestamp, self.history_running.timestamp)
+        self.assertFalse(JobState.objects.using('db_search').filter(job_id=self.job_controller_job.id + 1).exists())
+
+    def test_rebuild_batches(self):
+        update_job_states()
+
+        # Every batch after the first with a job should update its state rather than replace it
+        self.assertEqual(update_job_states(rebuild=True, batch_size=1), 2)
+        self.assertEqual(self.get_job_state().state, JobStatus.RUNNING)
+
+    def test_update_job_states_batches(self):
+        self.assertEqual(update_job_states(batch_size=1), 2)
+        self.assertEqual(self.get_job_state().state, JobStatus.RUNNING)
+
+    def test_search_not_built(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # Searches should use the job history until the job state table has been built, without building it
+        results = job_search('viterbi', ['orange'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [self.viterbi_job])
+        self.assertFalse(JobState.objects.using('db_search').exists())
+
+    def test_search(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        update_job_states()
+
+        results = job_search('viterbi', ['orange'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [self.viterbi_job])
+
+        # Jobs that haven't been active since the end time shouldn't be found
+        results = job_search('viterbi', [], timezone.now() + datetime.timedelta(days=1), None, 0, 20, False)
+        self.assertSequenceEqual(results, [])
+
+        # Jobs that finish in an invalid state should drop out of the search once the new entry has been applied.
+        # Searches don't apply it themselves
+        JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='_job_completion_',
+            state=JobStatus.ERROR,
+            timestamp=timezone.now()
+        )
+
+        results = job_search('viterbi', ['orange'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [self.viterbi_job])
+
+        update_job_states()
+
+        results = job_search('viterbi', ['orange'], end_time, None, 0, 20, False)
+        self.assertSequenceEqual(results, [])
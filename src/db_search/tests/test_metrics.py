@@ -0,0 +1,115 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from prometheus_client import REGISTRY
+from prometheus_client.mmap_dict import MmapedDict, mmap_key
+
+from gwauth.models import GWCloudUser
+
+from db_search.utils.metrics import count_rows, observe_request, observe_stage, render_metrics, update_pool_metrics
+
+
+def get_sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestMetrics(SimpleTestCase):
+    def test_observe_stage(self):
+        count = get_sample('db_search_stage_seconds_count', stage='search', application='bilbyui')
+
+        with observe_stage('search', 'bilbyui'):
+            pass
+
+        self.assertEqual(get_sample('db_search_stage_seconds_count', stage='search', application='bilbyui'), count + 1)
+
+    def test_count_rows(self):
+        rows = get_sample('db_search_stage_rows_total', stage='users', application='viterbi')
+
+        count_rows('users', 'viterbi', 3)
+
+        self.assertEqual(get_sample('db_search_stage_rows_total', stage='users', application='viterbi'), rows + 3)
+
+    def test_pool_metrics(self):
+        def pool_metrics(in_use, checkouts):
+            return {
+                'test_pool': {
+                    'in_use': in_use, 'idle': 1, 'checkouts': checkouts, 'created': 1, 'waits': 0, 'wait_seconds': 0,
+                    'timeouts': 0, 'evicted': 0, 'failed_checks': 0
+                }
+            }
+
+        with mock.patch('db_search.utils.metrics.get_pool_metrics', return_value=pool_metrics(2, 5)):
+            update_pool_metrics()
+
+        self.assertEqual(get_sample('db_search_db_pool_in_use', alias='test_pool'), 2)
+        self.assertEqual(get_sample('db_search_db_pool_checkouts_total', alias='test_pool'), 5)
+
+        # The pool counters should only count the checkouts made since they were last updated
+        with mock.patch('db_search.utils.metrics.get_pool_metrics', return_value=pool_metrics(1, 8)):
+            update_pool_metrics()
+
+        self.assertEqual(get_sample('db_search_db_pool_in_use', alias='test_pool'), 1)
+        self.assertEqual(get_sample('db_search_db_pool_checkouts_total', alias='test_pool'), 8)
+
+        # A pool that has been replaced starts counting again
+        with mock.patch('db_search.utils.metrics.get_pool_metrics', return_value=pool_metrics(1, 2)):
+            update_pool_metrics()
+
+        self.assertEqual(get_sample('db_search_db_pool_checkouts_total', alias='test_pool'), 10)
+
+    def test_metrics_view(self):
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE db_search_stage_seconds histogram', response.content)
+        self.assertIn(b'# TYPE db_search_request_queries histogram', response.content)
+        self.assertIn(b'# TYPE db_search_db_pool_checkouts_total counter', response.content)
+
+    def test_metrics_view_access(self):
+        # Requests forwarded by a proxy shouldn't be served the metrics
+        response = self.client.get('/metrics', HTTP_X_FORWARDED_FOR='203.0.113.1')
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.1')
+        self.assertEqual(response.status_code, 403)
+
+        # Unless they have the token, if one is set
+        with self.settings(SEARCH_METRICS_TOKEN='secret'):
+            response = self.client.get('/metrics')
+            self.assertEqual(response.status_code, 403)
+
+            response = self.client.get(
+                '/metrics', REMOTE_ADDR='203.0.113.1', HTTP_X_FORWARDED_FOR='203.0.113.1',
+                HTTP_AUTHORIZATION='Bearer secret'
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_multiprocess(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            # The metrics written by every worker should be reported
+            values = MmapedDict(os.path.join(directory, 'counter_1.db'))
+            values.write_value(
+                mmap_key('db_search_queries', 'db_search_queries_total', ['alias'], ['gwauth'], 'Queries'), 5
+            )
+            values.close()
+
+            self.assertIn(b'db_search_queries_total{alias="gwauth"} 5.0\n', render_metrics())
+
+
+@override_settings(TESTING=True)
+class TestRequestQueries(SimpleTestCase):
+    databases = '__all__'
+
+    def test_observe_request(self):
+        count = get_sample('db_search_request_queries_count')
+        total = get_sample('db_search_request_queries_sum')
+
+        with observe_request():
+            list(GWCloudUser.objects.using('gwauth').all())
+            list(GWCloudUser.objects.using('gwauth').all())
+
+        self.assertEqual(get_sample('db_search_request_queries_count'), count + 1)
+        self.assertEqual(get_sample('db_search_request_queries_sum'), total + 2)
@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+
+from db_search.utils.ngram import normalise, text_ngrams, term_ngrams
+
+
+class TestNgram(SimpleTestCase):
+    def test_normalise(self):
+        self.assertEqual(normalise('GW150914'), 'gw150914')
+        self.assertEqual(normalise('Café Crème'), 'cafe creme')
+        self.assertEqual(normalise(''), '')
+        self.assertEqual(normalise(None), '')
+
+    def test_text_ngrams(self):
+        self.assertEqual(text_ngrams('Potato'), {'pot', 'ota', 'tat', 'ato'})
+        self.assertEqual(text_ngrams('aaaa'), {'aaa'})
+
+        # Text shorter than an n-gram has no n-grams
+        self.assertEqual(text_ngrams('ab'), set())
+        self.assertEqual(text_ngrams(None), set())
+
+    def test_term_ngrams(self):
+        self.assertEqual(term_ngrams('brown'), {'bro', 'row', 'own'})
+
+        # N-grams containing LIKE wildcards can't be looked up in the index
+        self.assertEqual(term_ngrams('test_job'), {'tes', 'est', 'job'})
+        self.assertEqual(term_ngrams('a%b'), set())
+
+        # Terms that are too short can't use the index
+        self.assertEqual(term_ngrams('gw'), set())
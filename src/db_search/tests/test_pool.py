@@ -0,0 +1,126 @@
+import os
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from db_search.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.healthy = True
+        self.closed = False
+
+    def ping(self):
+        if not self.healthy:
+            raise ConnectionError()
+
+
+class TestConnectionPool(SimpleTestCase):
+    def setUp(self):
+        self.connections = []
+
+        def connect():
+            connection = FakeConnection()
+            self.connections.append(connection)
+            return connection
+
+        def close(connection):
+            connection.closed = True
+
+        self.pool = ConnectionPool(
+            connect=connect,
+            check=lambda connection: connection.ping(),
+            close=close,
+            size=2,
+            idle_timeout=60,
+            checkout_timeout=0.1
+        )
+
+    def test_reuse(self):
+        connection = self.pool.checkout()
+        self.assertEqual(self.pool.metrics()['in_use'], 1)
+
+        self.pool.release(connection)
+        self.assertEqual(self.pool.checkout(), connection)
+
+        metrics = self.pool.metrics()
+        self.assertEqual(metrics['created'], 1)
+        self.assertEqual(metrics['checkouts'], 2)
+        self.assertEqual(metrics['in_use'], 1)
+        self.assertEqual(metrics['idle'], 0)
+
+    def test_not_reusable(self):
+        connection = self.pool.checkout()
+        self.pool.release(connection, reusable=False)
+
+        self.assertTrue(connection.closed)
+        self.assertNotEqual(self.pool.checkout(), connection)
+
+    def test_health_check(self):
+        connection = self.pool.checkout()
+        self.pool.release(connection)
+
+        # Connections that fail the health check should be replaced
+        connection.healthy = False
+        new_connection = self.pool.checkout()
+
+        self.assertNotEqual(new_connection, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.metrics()['failed_checks'], 1)
+        self.assertEqual(self.pool.metrics()['in_use'], 1)
+
+    def test_idle_eviction(self):
+        with mock.patch('db_search.db.pool.time.monotonic', return_value=1000):
+            connection = self.pool.checkout()
+            self.pool.release(connection)
+
+        with mock.patch('db_search.db.pool.time.monotonic', return_value=1061):
+            self.assertNotEqual(self.pool.checkout(), connection)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.metrics()['evicted'], 1)
+
+    def test_size(self):
+        connection1 = self.pool.checkout()
+        self.pool.checkout()
+
+        # There is no room for another connection, so checking out should time out
+        with self.assertRaises(PoolTimeout):
+            self.pool.checkout()
+
+        metrics = self.pool.metrics()
+        self.assertEqual(metrics['waits'], 1)
+        self.assertEqual(metrics['timeouts'], 1)
+        self.assertEqual(metrics['in_use'], 2)
+
+        # A waiting checkout should be given a connection as soon as one is released
+        self.pool.checkout_timeout = 10
+        timer = threading.Timer(0.05, self.pool.release, [connection1])
+        timer.start()
+
+        self.assertEqual(self.pool.checkout(), connection1)
+        timer.join()
+
+        self.assertEqual(self.pool.metrics()['waits'], 2)
+        self.assertEqual(len(self.connections), 2)
+
+    def test_connect_error(self):
+        self.pool.connect = mock.Mock(side_effect=ConnectionError())
+
+        with self.assertRaises(ConnectionError):
+            self.pool.checkout()
+
+        # A failed connection shouldn't use up a place in the pool
+        self.assertEqual(self.pool.metrics()['in_use'], 0)
+
+    def test_fork(self):
+        connection = self.pool.checkout()
+        self.pool.release(connection)
+
+        # Connections shared with a parent process should be dropped without closing them
+        with mock.patch('db_search.db.pool.os.getpid', return_value=os.getpid() + 1):
+            self.assertNotEqual(self.pool.checkout(), connection)
+
+        self.assertFalse(connection.closed)
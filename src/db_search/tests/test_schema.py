@@ -1,8 +1,11 @@
 import datetime
 
 import graphene
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import connections
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from gwauth.models import GWCloudUser
 from jobserver.models import JobHistory, Job
@@ -11,6 +14,10 @@ from viterbi.models import ViterbiJob
 
 from db_search.status import JobStatus
 from db_search.tests.testcases import CustomJwtTestCase
+from db_search.utils.event_ids import get_event_id_index
+from db_search.utils.job_search import job_klasses
+from db_search.utils.labels import get_label_names
+from db_search.utils.users import get_user_index
 
 User = get_user_model()
 
@@ -47,6 +54,12 @@ class TestQueriesCustom(CustomJwtTestCase):
             last_name='Two yellow'
         )
 
+        # The users were just created, so the name indexes and label dictionary are loaded again
+        get_user_index(refresh=True)
+        get_event_id_index(refresh=True)
+        for application, job_klass in job_klasses.items():
+            get_label_names(application, job_klass, refresh=True)
+
         # Insert jobs
 
         # Completed Job
@@ -155,27 +168,30 @@ class TestQueriesCustom(CustomJwtTestCase):
                 'private': False,
                 'jobControllerId': self.bilby_job_completed2.job_controller_id
             },
+            # Only the newest job history entry is returned by default
             'history': [{
                 'id': str(self.job_controller_job_completed2_history3.id),
                 'timestamp': graphene.DateTime().serialize(self.job_controller_job_completed2_history3.timestamp),
                 'what': '_job_completion_',
                 'state': 500,
                 'details': ''
-            }, {
-                'id': str(self.job_controller_job_completed2_history2.id),
-                'timestamp': graphene.DateTime().serialize(self.job_controller_job_completed2_history2.timestamp),
-                'what': 'submit',
-                'state': 500,
-                'details': ''
-            }, {
-                'id': str(self.job_controller_job_completed2_history1.id),
-                'timestamp': graphene.DateTime().serialize(self.job_controller_job_completed2_history1.timestamp),
-                'what': 'submit',
-                'state': 40,
-                'details': ''
             }]
         }
 
+        self.bilby_job_completed2_full_history = self.bilby_job_completed2_result['history'] + [{
+            'id': str(self.job_controller_job_completed2_history2.id),
+            'timestamp': graphene.DateTime().serialize(self.job_controller_job_completed2_history2.timestamp),
+            'what': 'submit',
+            'state': 500,
+            'details': ''
+        }, {
+            'id': str(self.job_controller_job_completed2_history1.id),
+            'timestamp': graphene.DateTime().serialize(self.job_controller_job_completed2_history1.timestamp),
+            'what': 'submit',
+            'state': 40,
+            'details': ''
+        }]
+
         # Incomplete job
         self.job_controller_job_incomplete = Job.objects.using('jobserver').create(
             user=self.user_2.id,
@@ -709,6 +725,54 @@ class TestQueriesCustom(CustomJwtTestCase):
             }
         )
 
+    def test_time_window(self):
+        def run_time_window(arguments):
+            response = self.client.execute(
+                f"""
+                    query {{
+                      publicBilbyJobs ({arguments}, excludeLigoJobs: false) {{
+                        job {{
+                          id
+                        }}
+                      }}
+                    }}
+                """
+            )
+
+            self.assertIsNone(response.errors)
+            return [result['job']['id'] for result in response.data['publicBilbyJobs']]
+
+        now = timezone.now()
+        since = (now - datetime.timedelta(days=400)).isoformat()
+        until = (now - datetime.timedelta(days=300)).isoformat()
+
+        # Only jobs last active within the window should be found, whatever the time range
+        self.assertEqual(
+            run_time_window(f'since: "{since}", until: "{until}", timeRange: "1d"'),
+            [str(self.bilby_job_completed_old.id)]
+        )
+
+        self.assertEqual(run_time_window(f'until: "{until}"'), [str(self.bilby_job_completed_old.id)])
+
+        ids = run_time_window(f'since: "{until}"')
+        self.assertIn(str(self.bilby_job_completed.id), ids)
+        self.assertNotIn(str(self.bilby_job_completed_old.id), ids)
+
+        # The window can't end before it starts
+        response = self.client.execute(
+            f"""
+                query {{
+                  publicBilbyJobs (since: "{until}", until: "{since}") {{
+                    job {{
+                      id
+                    }}
+                  }}
+                }}
+            """
+        )
+
+        self.assertIsNotNone(response.errors)
+
     def run_terms_bilby(self, terms, expected):
         response = self.client.execute(
             f"""
@@ -1183,3 +1247,251 @@ class TestQueriesCustom(CustomJwtTestCase):
                 self.bilby_job_incomplete_result
             ]
         })
+
+    def test_connection(self):
+        def fetch_page(first, after, expected_jobs, has_next_page):
+            after = f', after: "{after}"' if after else ''
+            response = self.client.execute(
+                f"""
+                    query {{
+                      publicBilbyJobsConnection (first: {first}{after}, excludeLigoJobs: false) {{
+                        pageInfo {{
+                          hasNextPage
+                          endCursor
+                        }}
+                        edges {{
+                          cursor
+                          node {{
+                            job {{
+                              id
+                              name
+                            }}
+                          }}
+                        }}
+                      }}
+                    }}
+                """
+            )
+
+            connection = response.data['publicBilbyJobsConnection']
+
+            self.assertEqual(
+                [edge['node']['job'] for edge in connection['edges']],
+                [{'id': str(job.id), 'name': job.name} for job in expected_jobs]
+            )
+            self.assertEqual(connection['pageInfo']['hasNextPage'], has_next_page)
+
+            if expected_jobs:
+                self.assertEqual(connection['pageInfo']['endCursor'], connection['edges'][-1]['cursor'])
+
+            return connection['pageInfo']['endCursor']
+
+        cursor = fetch_page(2, None, [self.bilby_job_incomplete, self.bilby_job_completed2], True)
+        cursor = fetch_page(2, cursor, [self.bilby_job_completed], False)
+        fetch_page(2, cursor, [], False)
+
+        # The whole result set fits on one page
+        fetch_page(3, None, [self.bilby_job_incomplete, self.bilby_job_completed2, self.bilby_job_completed], False)
+
+        # Invalid cursors should return an error
+        response = self.client.execute(
+            """
+                query {
+                  publicBilbyJobsConnection (first: 2, after: "invalid") {
+                    edges {
+                      cursor
+                    }
+                  }
+                }
+            """
+        )
+
+        self.assertIsNotNone(response.errors)
+
+        # As should negative page sizes
+        response = self.client.execute(
+            """
+                query {
+                  publicBilbyJobsConnection (first: -1) {
+                    edges {
+                      cursor
+                    }
+                  }
+                }
+            """
+        )
+
+        self.assertIsNotNone(response.errors)
+
+    def test_history_limit(self):
+        def run_history_limit(history_limit, expected_history):
+            history_limit = f', historyLimit: {history_limit}' if history_limit is not None else ''
+            response = self.client.execute(
+                f"""
+                    query {{
+                      publicBilbyJobs (search: "cyan"{history_limit}) {{
+                        history {{
+                          id
+                          timestamp
+                          what
+                          state
+                          details
+                        }}
+                      }}
+                    }}
+                """
+            )
+
+            self.assertEqual(response.data, {'publicBilbyJobs': [{'history': expected_history}]})
+
+        full_history = self.bilby_job_completed2_full_history
+
+        # The newest entry should be returned by default, or if the limit is null
+        run_history_limit(None, full_history[:1])
+        run_history_limit('null', full_history[:1])
+        run_history_limit(1, full_history[:1])
+        run_history_limit(2, full_history[:2])
+
+        # Limits larger than the history should return the full history
+        run_history_limit(10, full_history)
+
+        # 0 or less should return the full history
+        run_history_limit(0, full_history)
+        run_history_limit(-1, full_history)
+
+        # The limit should also apply to connections
+        response = self.client.execute(
+            """
+                query {
+                  publicBilbyJobsConnection (search: "cyan", historyLimit: 2) {
+                    edges {
+                      node {
+                        history {
+                          id
+                        }
+                      }
+                    }
+                  }
+                }
+            """
+        )
+
+        self.assertEqual(
+            response.data['publicBilbyJobsConnection']['edges'][0]['node']['history'],
+            [{'id': history['id']} for history in full_history[:2]]
+        )
+
+    def test_job_field_projection(self):
+        query = """
+            query {
+              publicBilbyJobs (search: "cyan") {
+                job {
+                  id
+                  name
+                }
+              }
+            }
+        """
+
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            response = self.client.execute(query)
+
+        self.assertEqual(
+            response.data,
+            {'publicBilbyJobs': [{'job': {'id': str(self.bilby_job_completed2.id), 'name': 'test_job_purple'}}]}
+        )
+
+        # Only the requested fields and those needed to order the results should be loaded, and the deferred fields
+        # must not be loaded by extra queries
+        page_query = queries.captured_queries[-1]['sql']
+        self.assertIn('`name`', page_query)
+        self.assertNotIn('`description`', page_query)
+        self.assertEqual(len(queries), 1)
+
+    def test_public_jobs(self):
+        def run_public_jobs(arguments, expected_jobs):
+            response = self.client.execute(
+                f"""
+                    query {{
+                      publicJobs ({arguments}) {{
+                        application
+                        user {{
+                          id
+                        }}
+                        job {{
+                          ... on BilbyJobNode {{
+                            id
+                            name
+                          }}
+                          ... on ViterbiJobNode {{
+                            id
+                            name
+                          }}
+                        }}
+                      }}
+                    }}
+                """
+            )
+
+            self.assertEqual(
+                response.data,
+                {
+                    'publicJobs': [
+                        {
+                            'application': application,
+                            'user': {'id': str(job.user_id)},
+                            'job': {'id': str(job.id), 'name': job.name}
+                        }
+                        for application, job in expected_jobs
+                    ]
+                }
+            )
+
+        all_jobs = [
+            ('viterbi', self.job_completed_viterbi),
+            ('bilbyui', self.bilby_job_incomplete),
+            ('bilbyui', self.bilby_job_completed2),
+            ('bilbyui', self.bilby_job_completed)
+        ]
+
+        # The jobs of every application should be merged into a single page ordered by creation time
+        run_public_jobs('timeRange: "1d"', all_jobs)
+        run_public_jobs('timeRange: "1d", first: 1, count: 2', all_jobs[1:3])
+        run_public_jobs('timeRange: "1d", first: 3, count: 2', all_jobs[3:])
+
+        # Null ranges should use the defaults
+        run_public_jobs('timeRange: "1d", first: null, count: null', all_jobs)
+
+        # Only the requested applications should be searched
+        run_public_jobs('timeRange: "1d", applications: ["bilbyui"]', all_jobs[1:])
+        run_public_jobs('timeRange: "1d", applications: ["viterbi"]', all_jobs[:1])
+
+        # The search terms should apply to every application
+        run_public_jobs('search: "magenta"', [all_jobs[0], all_jobs[3]])
+
+        # Unknown applications should return an error
+        response = self.client.execute(
+            """
+                query {
+                  publicJobs (applications: ["potato"]) {
+                    application
+                  }
+                }
+            """
+        )
+
+        self.assertIsNotNone(response.errors)
+
+        # As should ranges that are negative or start too far in to the results
+        for search_range in ['first: -1', 'count: -1', f'first: {settings.SEARCH_MAX_OFFSET + 1}']:
+            response = self.client.execute(
+                f"""
+                    query {{
+                      publicJobs ({search_range}) {{
+                        application
+                      }}
+                    }}
+                """
+            )
+
+            self.assertIsNotNone(response.errors)
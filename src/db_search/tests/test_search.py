@@ -1,6 +1,11 @@
 import datetime
+from unittest import mock
 
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import connections
 from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from bilbyui.constants import BilbyJobType
@@ -10,8 +15,19 @@ from bilbyui.models import BilbyJob, Label, EventID, IniKeyValue
 from bilbyui.tests.test_utils import create_test_ini_string
 from viterbi.models import ViterbiJob
 
+from db_search.models import SearchDocument, SearchNgram
 from db_search.status import JobStatus
-from db_search.utils.job_search import job_search
+from db_search.utils.fulltext import create_fulltext_indexes, fulltext_query, get_missing_fulltext_indexes
+from db_search.utils.job_search import job_search, job_search_terms, prepare_search, build_search_statement, \
+    clear_search_statements, clear_term_matches, job_klasses, job_search_async, warm_search_statements, \
+    get_search_page, get_search_watermark, search_states
+from db_search.utils.event_ids import get_event_id_index
+from db_search.utils.labels import clear_label_names, get_label_names
+from db_search.utils.names import NEW_ROW_CHECK_INTERVAL, NameIndex, like_regex
+import db_search.utils.names as names
+from db_search.utils.replica import drop_replica, update_replica
+from db_search.utils.sync import rebuild_structure
+from db_search.utils.users import get_user_index
 
 
 @override_settings(TESTING=True)
@@ -328,6 +344,12 @@ class TestSearch(SimpleTestCase):
         self.uploaded_bilby_job2.event_id = self.event_id_2
         self.uploaded_bilby_job2.save()
 
+        # The users, labels and event ids were just created, so the name indexes and label dictionary are loaded again
+        get_user_index(refresh=True)
+        get_event_id_index(refresh=True)
+        for application, job_klass in job_klasses.items():
+            get_label_names(application, job_klass, refresh=True)
+
     def test_no_terms(self):
         expected = [
             {
@@ -989,6 +1011,412 @@ class TestSearch(SimpleTestCase):
         results = job_search('bilbyui', ['GW123456_123456', 'GW123456_654321'], end_time, None, 0, 20, False)
         self.assertSequenceEqual(results, [])
 
+    def test_after(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        expected = [result['job'] for result in job_search('bilbyui', [], end_time, None, 0, 20, False)]
+        self.assertEqual(len(expected), 5)
+
+        # Seeking past each job should return every job after it
+        for idx, job in enumerate(expected):
+            results = job_search('bilbyui', [], end_time, None, 0, 20, False, (job.creation_time, job.id))
+            self.assertSequenceEqual([result['job'] for result in results], expected[idx + 1:])
+
+        # Jobs with the same creation time should be ordered by id
+        self.uploaded_bilby_job1.creation_time = self.uploaded_bilby_job2.creation_time
+        self.uploaded_bilby_job1.save()
+
+        after = (self.uploaded_bilby_job2.creation_time, self.uploaded_bilby_job2.id)
+        results = job_search('bilbyui', [], end_time, None, 0, 1, False, after)
+        self.assertSequenceEqual([result['job'] for result in results], [self.uploaded_bilby_job1])
+
+    def test_page_query(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # The search, ordering and range should all be done by a single query that only returns the requested page
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['job'], end_time, None, 1, 2, False)
+
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIMIT 2 OFFSET 1', queries[0]['sql'])
+        self.assertSequenceEqual(
+            [result['job'] for result in results],
+            [self.uploaded_bilby_job2, self.uploaded_bilby_job1]
+        )
+
+    def test_async(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # The asynchronous search should find the same jobs, users and histories as the synchronous search
+        for terms in [[], ['job'], ['potato', 'job']]:
+            self.assertSequenceEqual(
+                async_to_sync(job_search_async)('bilbyui', terms, end_time, None, 0, 20, False),
+                job_search('bilbyui', terms, end_time, None, 0, 20, False)
+            )
+
+        results = async_to_sync(job_search_async)(
+            'bilbyui', ['job'], end_time, None, 1, 2, False, include_user=False, include_history=False
+        )
+        self.assertSequenceEqual(
+            results,
+            [
+                {'user': None, 'history': None, 'job': self.uploaded_bilby_job2},
+                {'user': None, 'history': None, 'job': self.uploaded_bilby_job1}
+            ]
+        )
+
+    # Searches for several terms are matched by the search statement rather than one term at a time
+    @override_settings(SEARCH_CANDIDATE_LIMIT=0)
+    def test_statement_registry(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+        clear_search_statements()
+
+        with mock.patch(
+                'db_search.utils.job_search.build_search_statement', wraps=build_search_statement
+        ) as build_statement:
+            # Searches with the same number of terms should share a statement
+            job_search('bilbyui', ['potato'], end_time, None, 0, 20, False)
+            job_search('bilbyui', ['yellow'], end_time, None, 0, 20, False)
+            self.assertEqual(build_statement.call_count, 1)
+
+            # Each application and number of terms has its own statement
+            job_search('viterbi', ['potato'], end_time, None, 0, 20, False)
+            job_search('bilbyui', ['potato', 'job'], end_time, None, 0, 20, False)
+            self.assertEqual(build_statement.call_count, 3)
+
+            job_search('bilbyui', ['job', 'potato'], end_time, None, 0, 20, False)
+            self.assertEqual(build_statement.call_count, 3)
+
+    @override_settings(SEARCH_JOB_STATE_TABLE=True)
+    def test_warm_statements(self):
+        clear_search_statements()
+
+        # The statements are built while the application loads, before the tables may exist, so building them shouldn't
+        # query the database
+        with mock.patch('db_search.utils.job_state.job_states_ready') as job_states_ready, \
+                CaptureQueriesContext(connections['db_search']) as queries:
+            warm_search_statements()
+
+        job_states_ready.assert_not_called()
+        self.assertEqual(len(queries), 0)
+
+    def test_skip_user_and_history(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # The users and histories shouldn't be looked up if they aren't needed
+        with CaptureQueriesContext(connections['gwauth']) as user_queries, \
+                CaptureQueriesContext(connections['jobserver']) as history_queries:
+            results = job_search(
+                'bilbyui', ['job'], end_time, None, 1, 2, False, include_user=False, include_history=False
+            )
+
+        self.assertEqual(len(user_queries), 0)
+        self.assertEqual(len(history_queries), 0)
+        self.assertSequenceEqual(
+            results,
+            [
+                {'user': None, 'history': None, 'job': self.uploaded_bilby_job2},
+                {'user': None, 'history': None, 'job': self.uploaded_bilby_job1}
+            ]
+        )
+
+    def test_time_window(self):
+        # Searches of all time shouldn't join the job history
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['job'], None, None, 0, 20, False)
+
+        self.assertFalse(any('JOIN' in query['sql'] for query in queries))
+        self.assertSequenceEqual(
+            results,
+            job_search('bilbyui', ['job'], timezone.now() - datetime.timedelta(days=10000), None, 0, 20, False)
+        )
+
+        # Jobs last active after the end of the window shouldn't be found
+        until = timezone.now() - datetime.timedelta(hours=1)
+        self.assertSequenceEqual(job_search('bilbyui', ['job'], None, None, 0, 20, False, until=until), [])
+
+        until = timezone.now() + datetime.timedelta(hours=1)
+        self.assertSequenceEqual(job_search('bilbyui', ['job'], None, None, 0, 20, False, until=until), results)
+
+    @override_settings(SEARCH_CACHE_BACKEND='local', SEARCH_CACHE_TTL=600, SEARCH_CACHE_WATERMARK_TTL=0)
+    def test_cache(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        with mock.patch('db_search.utils.job_search.prepare_search', wraps=prepare_search) as search:
+            expected = job_search('bilbyui', ['potato', 'job'], end_time, None, 0, 20, False)
+            self.assertEqual(search.call_count, 1)
+
+            # The end time should be searched as given, rather than widened to share results
+            self.assertEqual(search.call_args[0][2], end_time)
+
+            # The same search, with the terms in any order, should be served from the cache
+            results = job_search('bilbyui', ['job', 'potato'], end_time, None, 0, 20, False)
+            self.assertEqual(search.call_count, 1)
+            self.assertSequenceEqual(results, expected)
+
+            # Different pages are cached separately
+            results = job_search('bilbyui', ['potato', 'job'], end_time, None, 1, 20, False)
+            self.assertEqual(search.call_count, 2)
+            self.assertSequenceEqual(results, expected[1:])
+
+            # Jobs made private since the results were cached shouldn't be returned from the cache
+            BilbyJob.objects.using('bilbyui').filter(id=expected[0]['job'].id).update(private=True)
+
+            results = job_search('bilbyui', ['potato', 'job'], end_time, None, 0, 20, False)
+            self.assertEqual(search.call_count, 2)
+            self.assertSequenceEqual(results, expected[1:])
+
+            BilbyJob.objects.using('bilbyui').filter(id=expected[0]['job'].id).update(private=False)
+
+            # Adding a job history entry should invalidate the cached results
+            self.job_controller_job_incomplete_history2 = JobHistory.objects.using('jobserver').create(
+                job=self.job_controller_job_incomplete,
+                what='_job_completion_',
+                state=JobStatus.ERROR,
+                timestamp=timezone.now()
+            )
+
+            results = job_search('bilbyui', ['potato', 'job'], end_time, None, 0, 20, False)
+            self.assertEqual(search.call_count, 3)
+            self.assertSequenceEqual(
+                [result['job'] for result in results],
+                [result['job'] for result in expected if result['job'] != self.bilby_job_incomplete]
+            )
+
+    @override_settings(SEARCH_CACHE_BACKEND='local', SEARCH_CACHE_TTL=600, SEARCH_CACHE_WATERMARK_TTL=600)
+    def test_cache_watermark(self):
+        def search():
+            return get_search_page('bilbyui', BilbyJob, ['job'], None, search_states, 0, 20, False, None)
+
+        with mock.patch('db_search.utils.job_search.get_search_page_jobs', return_value=[]) as search_page, \
+                mock.patch('db_search.utils.job_search.get_search_watermark', wraps=get_search_watermark) as watermark:
+            search()
+            search()
+            self.assertEqual(search_page.call_count, 1)
+
+            # The watermark should only be read once every SEARCH_CACHE_WATERMARK_TTL seconds
+            self.assertEqual(watermark.call_count, 1)
+
+            # Results found by another search engine shouldn't be shared
+            with self.settings(SEARCH_ENGINE='document'):
+                search()
+
+            self.assertEqual(search_page.call_count, 2)
+            self.assertEqual(watermark.call_count, 1)
+
+    @override_settings(SEARCH_CANDIDATE_LIMIT=0)
+    def test_multiple_terms_single_query(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # Every term should be matched by a single query, rather than one query per term
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            job_ids = job_search_terms(
+                'bilbyui', BilbyJob, ['purple', 'production', 'review', 'test', 'job'], end_time,
+                [JobStatus.RUNNING, JobStatus.COMPLETED], False
+            )
+
+        self.assertEqual(len(queries), 1)
+        self.assertSequenceEqual(job_ids, [self.bilby_job_completed2.id])
+
+    def test_candidate_pushdown(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+        clear_term_matches()
+
+        # The longer, more selective term should be matched first, and the other term only checked against its matches
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['job', 'purple'], end_time, None, 0, 20, False)
+
+        self.assertSequenceEqual([result['job'] for result in results], [self.bilby_job_completed2])
+
+        term_queries = [query['sql'] for query in queries if '%job%' in query['sql'] or '%purple%' in query['sql']]
+        self.assertEqual(len(term_queries), 2)
+        self.assertIn('%purple%', term_queries[0])
+        self.assertIn(f'IN ({self.bilby_job_completed2.id})', term_queries[1])
+
+        # No more terms should be checked, and the search statement shouldn't be run, once no jobs are left
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['job', 'nonexistentterm'], end_time, None, 0, 20, False)
+
+        self.assertSequenceEqual(results, [])
+        self.assertFalse(any('%job%' in query['sql'] for query in queries))
+
+        # Too many candidates should leave the terms to the search statement
+        with self.settings(SEARCH_CANDIDATE_LIMIT=1):
+            results = job_search('bilbyui', ['job', 'test'], end_time, None, 0, 20, False)
+            self.assertEqual(len(results), 5)
+
+    def test_fulltext_engine(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        for application, job_klass in [('bilbyui', BilbyJob), ('viterbi', ViterbiJob)]:
+            create_fulltext_indexes(application, job_klass)
+            self.assertSequenceEqual(get_missing_fulltext_indexes(application, job_klass), [])
+
+        # Whole words should match the same jobs as they do with LIKE scans, including label names, event ids and
+        # user names. "my" is too short for the FULLTEXT indexes, and is matched with a LIKE scan
+        for terms in [['potato'], ['magenta'], ['bad'], ['gw123456_123456'], ['arbitrary'], ['potato', 'my']]:
+            expected = job_search('bilbyui', terms, end_time, None, 0, 20, False)
+
+            with self.settings(SEARCH_ENGINE='fulltext'):
+                self.assertSequenceEqual(job_search('bilbyui', terms, end_time, None, 0, 20, False), expected)
+
+        with self.settings(SEARCH_ENGINE='fulltext'):
+            with CaptureQueriesContext(connections['bilbyui']) as queries:
+                job_search('bilbyui', ['potato'], end_time, None, 0, 20, False)
+
+            self.assertTrue(any('AGAINST' in query['sql'] for query in queries))
+
+    def test_document_engine(self):
+        SearchDocument.objects.using('db_search').all().delete()
+        rebuild_structure('documents', workers=0)
+
+        document = SearchDocument.objects.using('db_search').get(
+            application='bilbyui', job_id=self.bilby_job_completed.id
+        )
+        self.assertEqual(document.text, 'test_job\nmy potato job is brown')
+        self.assertEqual(document.owner, 'user\none magenta')
+        self.assertEqual(document.event_ids, 'gw123456_123456\ns111111a\narbitrary_nickname')
+        self.assertEqual(document.state, JobStatus.COMPLETED)
+
+        # Every search should find the same jobs from the documents alone
+        for days in [1, 365]:
+            end_time = timezone.now() - datetime.timedelta(days=days)
+
+            for terms in [[], ['job'], ['potato', 'job'], ['magenta'], ['bad'], ['arbitrary'], ['s111'], ['nothing']]:
+                for application in job_klasses:
+                    for exclude_ligo_jobs in [True, False]:
+                        expected = job_search(application, terms, end_time, None, 0, 20, exclude_ligo_jobs)
+
+                        with self.settings(SEARCH_ENGINE='document'):
+                            with CaptureQueriesContext(connections[application]) as queries:
+                                results = job_search(application, terms, end_time, None, 0, 20, exclude_ligo_jobs)
+
+                        self.assertSequenceEqual(results, expected)
+                        self.assertIn('db_search_searchdocument', queries[0]['sql'])
+
+    def test_fulltext_query(self):
+        self.assertEqual(fulltext_query('potato'), '+potato*')
+        self.assertEqual(fulltext_query('GW123456-654321'), '+GW123456* +654321*')
+        self.assertEqual(fulltext_query('+pot*ato'), '+pot* +ato*')
+        self.assertIsNone(fulltext_query('my'))
+        self.assertIsNone(fulltext_query('a-potato'))
+
+    def test_label_dictionary(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # Label names should be matched from the label dictionary rather than the label table
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['review'], end_time, None, 0, 20, False)
+
+        self.assertIn(self.bilby_job_completed, [result['job'] for result in results])
+        self.assertIn(self.bilby_job_completed2, [result['job'] for result in results])
+        self.assertFalse(any('bilbyui_label.' in query['sql'] for query in queries))
+
+        # Renamed labels should be found once the dictionary is loaded again
+        self.label_bad_run.name = 'Quixotic Run'
+        self.label_bad_run.save()
+
+        with self.settings(SEARCH_ENGINE='like'):
+            self.assertSequenceEqual(job_search('bilbyui', ['quixotic'], end_time, None, 0, 20, False), [])
+
+            clear_label_names()
+            results = job_search('bilbyui', ['quixotic'], end_time, None, 0, 20, False)
+            self.assertIn(self.bilby_job_completed, [result['job'] for result in results])
+
+    def test_user_name_index(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # User names should be matched from the user name index rather than the auth database
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['yellow'], end_time, None, 0, 20, False)
+
+        self.assertTrue(results)
+        self.assertTrue(all(result['user'] == self.user_2 for result in results))
+        self.assertFalse(any('gwauth_gwclouduser' in query['sql'] for query in queries))
+
+        # Terms that match too many users to list their ids should match the user names in the auth database instead
+        with self.settings(SEARCH_ENGINE='like', SEARCH_MAX_USER_IDS=0):
+            with CaptureQueriesContext(connections['bilbyui']) as queries:
+                self.assertSequenceEqual(job_search('bilbyui', ['yellow'], end_time, None, 0, 20, False), results)
+
+        self.assertTrue(any('gwauth_gwclouduser' in query['sql'] for query in queries))
+
+        # Renamed users should be found once the index is loaded again
+        self.user_2.last_name = 'Two quixotic'
+        self.user_2.save()
+
+        with self.settings(SEARCH_ENGINE='like'):
+            self.assertSequenceEqual(job_search('bilbyui', ['quixotic'], end_time, None, 0, 20, False), [])
+
+            get_user_index(refresh=True)
+            results = job_search('bilbyui', ['quixotic'], end_time, None, 0, 20, False)
+            self.assertTrue(results)
+            self.assertTrue(all(result['user'] == self.user_2 for result in results))
+
+    def test_event_id_index(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # Event ids should be matched from the event id index rather than the event id table
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['s111111'], end_time, None, 0, 20, False)
+
+        self.assertIn(self.bilby_job_completed, [result['job'] for result in results])
+        self.assertNotIn(self.bilby_job_completed2, [result['job'] for result in results])
+        self.assertFalse(any('bilbyui_eventid' in query['sql'] for query in queries))
+
+        # New event ids should be added to the index without loading it again
+        event_id = EventID.objects.using('bilbyui').create(
+            event_id='GW654321_123456',
+            trigger_id='S333333a',
+            nickname='quixotic_nickname'
+        )
+        self.bilby_job_error.event_id = event_id
+        self.bilby_job_error.save()
+
+        index = get_event_id_index()
+        index.checked_at -= NEW_ROW_CHECK_INTERVAL
+        self.assertEqual(get_event_id_index(), index)
+        self.assertEqual(index.match('quixotic'), [event_id.id])
+
+        # While another thread loads the index again, the existing index should still be used without waiting
+        index.loaded_at -= settings.SEARCH_EVENT_ID_REFRESH_INTERVAL
+        with mock.patch('db_search.utils.names.load_name_index') as load_name_index:
+            with names._name_index_loads[('event_ids', connections['bilbyui'].settings_dict['NAME'])]:
+                self.assertEqual(get_event_id_index(), index)
+
+            load_name_index.assert_not_called()
+
+        index.loaded_at += settings.SEARCH_EVENT_ID_REFRESH_INTERVAL
+
+        # Renamed event ids should be found once the index is loaded again
+        self.event_id_2.nickname = 'quixotic_string'
+        self.event_id_2.save()
+
+        with self.settings(SEARCH_ENGINE='like'):
+            results = job_search('bilbyui', ['quixotic'], end_time, None, 0, 20, False)
+            self.assertNotIn(self.bilby_job_completed2, [result['job'] for result in results])
+
+            get_event_id_index(refresh=True)
+            results = job_search('bilbyui', ['quixotic'], end_time, None, 0, 20, False)
+            self.assertIn(self.bilby_job_completed2, [result['job'] for result in results])
+
+    def test_name_index_match(self):
+        index = NameIndex([(1, 'Café', 'Crème'), (2, 'Bob', 'Smith_Jones')])
+
+        self.assertEqual(index.match('CAFE'), [1])
+        self.assertEqual(index.match('e'), [1, 2])
+        self.assertEqual(index.match('h_j'), [2])
+        self.assertEqual(index.match('o%s'), [2])
+        self.assertEqual(index.match('potato'), [])
+
+    def test_like_regex(self):
+        self.assertTrue(like_regex('%run%').fullmatch('bad run'))
+        self.assertTrue(like_regex('%b_d%').fullmatch('bad run'))
+        self.assertTrue(like_regex('%RÉVIEW%').fullmatch('reviewed'))
+        self.assertFalse(like_regex('%b\\_d%').fullmatch('bad run'))
+        self.assertTrue(like_regex('%b\\_d%').fullmatch('b_d'))
+        self.assertFalse(like_regex('%potato%').fullmatch('bad run'))
+
     def test_single_term_viterbi(self):
         job_completed = {
             'user': self.user_1,
@@ -1045,3 +1473,175 @@ class TestSearch(SimpleTestCase):
 
         for result in results:
             self.assertFalse(result['job'].is_ligo_job)
+
+
+@override_settings(SEARCH_ENGINE='ngram')
+class TestSearchNgram(TestSearch):
+    """
+    Runs all of the search tests again with term matching going through the n-gram index
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        SearchNgram.objects.using('db_search').all().delete()
+
+        rebuild_structure('ngrams', workers=0)
+
+    def test_unindexed_jobs_are_searched(self):
+        # Jobs created after the index was last built should still be found
+        job = BilbyJob.objects.using('bilbyui').create(
+            user_id=self.user_1.id,
+            job_controller_id=None,
+            name="test_job_unindexed",
+            description="a freshly uploaded job",
+            private=False,
+            job_type=BilbyJobType.UPLOADED,
+            ini_string=create_test_ini_string({'trigger-time': 2.0, 'n-simulation': 0})
+        )
+
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        results = job_search('bilbyui', ['freshly'], end_time, None, 0, 20, False)
+        self.assertSequenceEqual(
+            results,
+            [
+                {
+                    'user': self.user_1,
+                    'history': [],
+                    'job': job
+                }
+            ]
+        )
+
+        # Once the job has been indexed it should be found through the index
+        rebuild_structure('ngrams', workers=0)
+
+        self.assertTrue(
+            SearchNgram.objects.using('db_search').filter(application='bilbyui', job_id=job.id, ngram='fre').exists()
+        )
+
+        results = job_search('bilbyui', ['freshly'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [job])
+
+    def test_renamed_users_are_searched(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        expected = [
+            result for result in job_search('bilbyui', [], end_time, None, 0, 20, False)
+            if result['user'] == self.user_2
+        ]
+        self.assertTrue(expected)
+
+        # Jobs should be found by their owner's new name before they have been indexed again
+        self.user_2.last_name = 'Two marmalade'
+        self.user_2.save()
+        get_user_index(refresh=True)
+
+        results = job_search('bilbyui', ['marmalade'], end_time, None, 0, 20, False)
+        self.assertSequenceEqual(results, expected)
+
+
+@override_settings(SEARCH_ENGINE='replica')
+class TestSearchReplica(TestSearch):
+    """
+    Runs all of the search tests again with terms resolved from the SQLite search replica
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        update_replica(job_klasses, rebuild=True)
+
+    def test_statement_registry(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+        clear_search_statements()
+
+        with mock.patch(
+                'db_search.utils.job_search.build_search_statement', wraps=build_search_statement
+        ) as build_statement:
+            # Searches with the same number of terms should share the statement limited to the jobs found in the
+            # replica
+            job_search('bilbyui', ['potato', 'job'], end_time, None, 0, 20, False)
+            job_search('bilbyui', ['purple', 'job'], end_time, None, 0, 20, False)
+            self.assertEqual(build_statement.call_count, 1)
+
+            job_search('bilbyui', ['job', 'test', 'potato'], end_time, None, 0, 20, False)
+            self.assertEqual(build_statement.call_count, 2)
+
+    def test_candidate_pushdown(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # The terms should be resolved by the replica, so LIKE scans are only made against the jobs created since the
+        # replica was last updated
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['job', 'purple'], end_time, None, 0, 20, False)
+
+        replica_job_id = BilbyJob.objects.using('bilbyui').order_by('-id').values_list('id', flat=True).first()
+
+        self.assertSequenceEqual([result['job'] for result in results], [self.bilby_job_completed2])
+        self.assertEqual(len(queries), 1)
+        self.assertIn(f'.id > {replica_job_id}', queries[0]['sql'])
+        self.assertIn(f'.id IN ({self.bilby_job_completed2.id})', queries[0]['sql'])
+
+        # Jobs created since the replica was last updated could still match when no jobs in the replica do
+        with CaptureQueriesContext(connections['bilbyui']) as queries:
+            results = job_search('bilbyui', ['job', 'nonexistentterm'], end_time, None, 0, 20, False)
+
+        self.assertSequenceEqual(results, [])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('.id IN (', queries[0]['sql'])
+
+        # Too many matching jobs should leave the terms to the search statement
+        with self.settings(SEARCH_CANDIDATE_LIMIT=1):
+            results = job_search('bilbyui', ['job', 'test'], end_time, None, 0, 20, False)
+            self.assertEqual(len(results), 5)
+
+    def test_replica_update(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # New jobs should be found before the replica has been updated, and after it
+        job = BilbyJob.objects.using('bilbyui').create(
+            user_id=self.user_1.id,
+            job_controller_id=None,
+            name="test_job_replicated",
+            description="a freshly uploaded job",
+            private=False,
+            job_type=BilbyJobType.UPLOADED,
+            ini_string=create_test_ini_string({'trigger-time': 2.0, 'n-simulation': 0})
+        )
+
+        results = job_search('bilbyui', ['freshly'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [job])
+
+        update_replica(job_klasses)
+        results = job_search('bilbyui', ['freshly'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [job])
+
+        # Changed jobs should be copied again
+        job.description = "a recently uploaded job"
+        job.save()
+
+        update_replica(job_klasses)
+        self.assertSequenceEqual(job_search('bilbyui', ['freshly'], end_time, None, 0, 20, False), [])
+        results = job_search('bilbyui', ['recently'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [job])
+
+        # As should labels added to a job and renamed users
+        job.labels.add(self.label_reviewed)
+        self.user_1.last_name = 'One turquoise'
+        self.user_1.save()
+
+        update_replica(job_klasses)
+        results = job_search('bilbyui', ['replicated', 'reviewed', 'turquoise'], end_time, None, 0, 20, False)
+        self.assertEqual([result['job'] for result in results], [job])
+
+    def test_replica_not_built(self):
+        end_time = timezone.now() - datetime.timedelta(days=1)
+
+        # Searches should match the terms with the search statement until the replica has been built
+        with connections[settings.SEARCH_REPLICA_DATABASE].cursor() as cursor:
+            drop_replica(cursor, job_klasses)
+
+        results = job_search('bilbyui', ['job', 'purple'], end_time, None, 0, 20, False)
+        self.assertSequenceEqual([result['job'] for result in results], [self.bilby_job_completed2])
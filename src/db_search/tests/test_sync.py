@@ -0,0 +1,172 @@
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from gwauth.models import GWCloudUser
+from jobserver.models import Job, JobHistory
+from bilbyui.models import BilbyJob
+from viterbi.models import ViterbiJob
+
+from db_search.models import SearchDocument, SearchNgram, SyncName, SyncWatermark
+from db_search.status import JobStatus
+from db_search.utils.sync import get_sync_structures, get_watermarks, rebuild_structure, sync_structure
+
+
+@override_settings(TESTING=True)
+class TestSync(SimpleTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        # Clean everything up first just in case - because we are unable to use TransactionTestCase which would normally
+        # manage this for us
+        GWCloudUser.objects.using('gwauth').all().delete()
+        Job.objects.using('jobserver').all().delete()
+        JobHistory.objects.using('jobserver').all().delete()
+        BilbyJob.objects.using('bilbyui').all().delete()
+        ViterbiJob.objects.using('viterbi').all().delete()
+        SearchDocument.objects.using('db_search').all().delete()
+        SearchNgram.objects.using('db_search').all().delete()
+        SyncWatermark.objects.using('db_search').all().delete()
+        SyncName.objects.using('db_search').all().delete()
+
+        self.user = GWCloudUser.objects.using('gwauth').create(
+            email='user1@example.com',
+            username='user1',
+            first_name='User',
+            last_name='One'
+        )
+
+        self.job_controller_job = Job.objects.using('jobserver').create(
+            user=self.user.id,
+            cluster="test_cluster",
+            bundle="test_bundle",
+            application='viterbi'
+        )
+
+        JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='submit',
+            state=JobStatus.RUNNING,
+            timestamp=timezone.now()
+        )
+
+        self.viterbi_job = ViterbiJob.objects.using('viterbi').create(
+            user_id=self.user.id,
+            job_controller_id=self.job_controller_job.id,
+            name="test_job_viterbi",
+            description="my job is orange",
+            private=False
+        )
+
+    def get_document(self, job):
+        return SearchDocument.objects.using('db_search').get(application='viterbi', job_id=job.id)
+
+    def test_sync_documents(self):
+        self.assertEqual(sync_structure('documents'), 1)
+        self.assertEqual(self.get_document(self.viterbi_job).state, JobStatus.RUNNING)
+
+        # New jobs should be indexed
+        job = ViterbiJob.objects.using('viterbi').create(
+            user_id=self.user.id,
+            name="another_job",
+            description="my job is purple",
+            private=False
+        )
+
+        sync_structure('documents')
+        self.assertEqual(self.get_document(job).text, 'another_job\nmy job is purple')
+
+        # New job history entries should update the state of the job
+        JobHistory.objects.using('jobserver').create(
+            job=self.job_controller_job,
+            what='_job_completion_',
+            state=JobStatus.COMPLETED,
+            timestamp=timezone.now()
+        )
+
+        sync_structure('documents')
+        self.assertEqual(self.get_document(self.viterbi_job).state, JobStatus.COMPLETED)
+
+        # As should labels added to a job
+        label = ViterbiJob.labels.field.related_model.objects.using('viterbi').create(name='Blue label')
+        job.labels.add(label)
+
+        sync_structure('documents')
+        self.assertEqual(self.get_document(job).labels, 'blue label')
+
+        self.assertEqual(get_watermarks('documents')['viterbi_job_id'], str(job.id))
+
+    def test_sync_batches(self):
+        ViterbiJob.objects.using('viterbi').create(
+            user_id=self.user.id,
+            name="another_job",
+            description="my job is purple",
+            private=False
+        )
+
+        self.assertEqual(sync_structure('ngrams', batch_size=1), 2)
+        self.assertTrue(
+            SearchNgram.objects.using('db_search').filter(application='viterbi', ngram='pur').exists()
+        )
+
+    def test_ngrams(self):
+        self.viterbi_job.description = 'Straße strase'
+        self.viterbi_job.save()
+
+        label = ViterbiJob.labels.field.related_model.objects.using('viterbi').create(name='Blue label')
+        self.viterbi_job.labels.add(label)
+
+        # Only the job name and description should be indexed. N-grams that the collation compares equal shouldn't
+        # collide
+        sync_structure('ngrams')
+        ngrams = set(
+            SearchNgram.objects.using('db_search').filter(job_id=self.viterbi_job.id).values_list('ngram', flat=True)
+        )
+        self.assertIn('vit', ngrams)
+        self.assertIn('str', ngrams)
+        self.assertNotIn('blu', ngrams)
+        self.assertNotIn('one', ngrams)
+
+    def test_sync_renames(self):
+        label = ViterbiJob.labels.field.related_model.objects.using('viterbi').create(name='Blue label')
+        self.viterbi_job.labels.add(label)
+
+        sync_structure('documents')
+        self.assertEqual(self.get_document(self.viterbi_job).owner, 'user\none')
+
+        # Renamed users and labels should be picked up by the jobs that use them
+        self.user.last_name = 'Renamed'
+        self.user.save()
+
+        label.name = 'Green label'
+        label.save()
+
+        sync_structure('documents')
+        self.assertEqual(self.get_document(self.viterbi_job).owner, 'user\nrenamed')
+        self.assertEqual(self.get_document(self.viterbi_job).labels, 'green label')
+
+    def test_rebuild(self):
+        job = ViterbiJob.objects.using('viterbi').create(
+            user_id=self.user.id,
+            name="another_job",
+            description="my job is purple",
+            private=False
+        )
+
+        sync_structure('documents')
+
+        # Rebuilding should pick up changes that a sync can't, such as deleted jobs
+        ViterbiJob.objects.using('viterbi').filter(id=job.id).delete()
+
+        self.assertEqual(rebuild_structure('documents', workers=0, range_size=1), 2)
+        self.assertEqual(self.get_document(self.viterbi_job).text, 'test_job_viterbi\nmy job is orange')
+        self.assertFalse(
+            SearchDocument.objects.using('db_search').filter(application='viterbi', job_id=job.id).exists()
+        )
+        self.assertEqual(get_watermarks('documents')['viterbi_job_id'], str(self.viterbi_job.id))
+
+    def test_sync_structures(self):
+        with self.settings(SEARCH_ENGINE='like'):
+            self.assertEqual(get_sync_structures(), [])
+
+        with self.settings(SEARCH_ENGINE='document'):
+            self.assertEqual(get_sync_structures(), ['documents'])
@@ -0,0 +1,199 @@
+"""
+Benchmarks job searches against the data in the databases, ie, synthetic data made by the generate_search_data
+management command (See the benchmark_search management command).
+
+Each scenario is a combination of the number of search terms, the time range, the page offset and if LIGO jobs are
+excluded. Scenarios are run through job_search for each application and through the GraphQL endpoint, and the latency
+percentiles and number of database queries of each are reported, so that runs can be compared before and after a
+change.
+"""
+import itertools
+import json
+import math
+import random
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory
+
+from db_search.schema import Query
+from db_search.utils.job_search import job_klasses, job_search
+from db_search.utils.metrics import count_queries
+from db_search.utils.synthetic import random_terms
+from db_search.views import AsyncGraphQLView
+
+TERM_COUNTS = [0, 1, 2, 3]
+TIME_RANGES = ['1d', '1m', '1y', 'any']
+PAGE_OFFSETS = [0, 100, 1000]
+PAGE_SIZE = 100
+
+GRAPHQL_FIELDS = {
+    'bilbyui': 'publicBilbyJobs',
+    'viterbi': 'publicViterbiJobs'
+}
+
+GRAPHQL_QUERY = """
+    query {{
+      {field}(search: "{search}", timeRange: "{time_range}", first: {first}, count: {count},
+              excludeLigoJobs: {exclude_ligo_jobs}) {{
+        user {{ id username firstName lastName }}
+        job {{ id name description creationTime private }}
+        history {{ timestamp state }}
+      }}
+    }}
+"""
+
+
+def percentile(values, percent):
+    """
+    Gets a percentile of a list of values by the nearest rank method
+
+    :return: The value at the percentile
+    """
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * percent / 100) - 1)]
+
+
+def summarise(latencies, queries, rows):
+    """
+    Summarises the runs of a scenario
+
+    :param latencies: The time taken by each run in seconds
+    :param queries: The number of database queries made by each run
+    :param rows: The number of results returned by each run
+
+    :return: A dictionary of the latency percentiles in milliseconds, the mean number of queries and results
+    """
+    return {
+        'p50': percentile(latencies, 50) * 1000,
+        'p90': percentile(latencies, 90) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+        'mean': statistics.mean(latencies) * 1000,
+        'queries': statistics.mean(queries),
+        'rows': statistics.mean(rows)
+    }
+
+
+def get_scenarios(term_counts=TERM_COUNTS, time_ranges=TIME_RANGES, page_offsets=PAGE_OFFSETS,
+                  exclude_ligo_jobs=(True, False)):
+    """
+    Gets every combination of the scenario parameters
+
+    :return: A list of (term count, time range, page offset, exclude ligo jobs) tuples
+    """
+    return list(itertools.product(term_counts, time_ranges, page_offsets, exclude_ligo_jobs))
+
+
+def scenario_name(target, term_count, time_range, first, exclude_ligo_jobs):
+    return f'{target}:terms={term_count}:range={time_range}:first={first}:exclude_ligo={exclude_ligo_jobs}'
+
+
+def run_job_search(application, terms, time_range, first, exclude_ligo_jobs, **kwargs):
+    """
+    Runs a search directly with job_search, with the history limit used by the GraphQL queries
+
+    :return: The number of results
+    """
+    search_terms, end_time, until, _, history_limit = Query.get_search_criteria(
+        search=' '.join(terms), time_range=time_range
+    )
+
+    return len(job_search(
+        application, search_terms, end_time, None, first, PAGE_SIZE, exclude_ligo_jobs, history_limit=history_limit,
+        until=until
+    ))
+
+
+def run_graphql(application, terms, time_range, first, exclude_ligo_jobs, user):
+    """
+    Runs a search through the GraphQL view as it is served, without the network or authentication
+
+    :return: The number of results
+    """
+    query = GRAPHQL_QUERY.format(
+        field=GRAPHQL_FIELDS[application],
+        search=' '.join(terms),
+        time_range=time_range,
+        first=first,
+        count=PAGE_SIZE,
+        exclude_ligo_jobs='true' if exclude_ligo_jobs else 'false'
+    )
+
+    request = RequestFactory().post('/graphql', json.dumps({'query': query}), content_type='application/json')
+    request.user = user
+
+    response = async_to_sync(AsyncGraphQLView.as_view())(request)
+    result = json.loads(response.content)
+    if result.get('errors'):
+        raise RuntimeError(f'GraphQL query failed: {result["errors"]}')
+
+    return len(result['data'][GRAPHQL_FIELDS[application]])
+
+
+def run_benchmark(user, scenarios, applications=None, iterations=10, graphql=True, seed=0, log=None):
+    """
+    Runs every scenario against job_search and the GraphQL endpoint of each application
+
+    :param user: The user to run the GraphQL queries as
+    :param scenarios: A list of scenarios (See get_scenarios)
+    :param applications: The applications to search, or None to search them all
+    :param iterations: The number of times each scenario is run
+    :param graphql: If the scenarios should also be run through the GraphQL endpoint
+    :param seed: The seed used to pick search terms, so that runs search for the same terms
+    :param log: An optional function called with the name and results of each scenario as it finishes
+
+    :return: A dictionary of scenario name -> results (See summarise)
+    """
+    rng = random.Random(seed)
+    targets = [('job_search', run_job_search)] + ([('graphql', run_graphql)] if graphql else [])
+    results = {}
+
+    for application in applications or job_klasses.keys():
+        for term_count, time_range, first, exclude_ligo_jobs in scenarios:
+            # Each iteration searches for different terms, so the runs aren't just served from the search cache
+            terms = [random_terms(rng, term_count) for _ in range(iterations)]
+
+            for target, run in targets:
+                name = scenario_name(f'{target}:{application}', term_count, time_range, first, exclude_ligo_jobs)
+                latencies, queries, rows = [], [], []
+
+                for iteration_terms in terms:
+                    with count_queries() as query_count:
+                        started = time.perf_counter()
+                        rows.append(run(
+                            application, iteration_terms, time_range, first, exclude_ligo_jobs, user=user
+                        ))
+                        latencies.append(time.perf_counter() - started)
+
+                    queries.append(query_count.count)
+
+                results[name] = summarise(latencies, queries, rows)
+                if log:
+                    log(name, results[name])
+
+    return results
+
+
+def compare_results(baseline, results):
+    """
+    Compares benchmark results with those of an earlier run
+
+    :param baseline: The results of the earlier run
+    :param results: The results of this run
+
+    :return: A list of (scenario name, baseline p50, p50, p50 ratio, baseline queries, queries) tuples for the
+    scenarios in both runs
+    """
+    return [
+        (
+            name,
+            baseline[name]['p50'],
+            result['p50'],
+            result['p50'] / baseline[name]['p50'] if baseline[name]['p50'] else math.inf,
+            baseline[name]['queries'],
+            result['queries']
+        )
+        for name, result in results.items()
+        if name in baseline
+    ]
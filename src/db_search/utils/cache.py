@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# The search cache created from the current settings (See get_search_cache)
+_search_cache = None
+
+
+class LocalSearchCache:
+    """
+    An in-process least recently used cache. Each worker process has its own cache.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DjangoSearchCache:
+    """
+    A cache stored in one of the Django caches (See the CACHES setting), which may be shared between processes
+    """
+
+    def __init__(self, ttl, alias):
+        self.ttl = ttl
+        self.cache = caches[alias]
+
+    @staticmethod
+    def make_key(key):
+        # Django cache keys must be short strings, so the key is hashed
+        return 'db_search:' + hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def get(self, key):
+        return self.cache.get(self.make_key(key))
+
+    def set(self, key, value):
+        self.cache.set(self.make_key(key), value, self.ttl)
+
+
+def get_search_cache():
+    """
+    Gets the search result cache configured by the SEARCH_CACHE_BACKEND setting
+
+    :return: The search cache, or None if search results should not be cached
+    """
+    global _search_cache
+
+    if settings.SEARCH_CACHE_BACKEND is None:
+        return None
+
+    if _search_cache is None:
+        if settings.SEARCH_CACHE_BACKEND == 'local':
+            _search_cache = LocalSearchCache(settings.SEARCH_CACHE_TTL, settings.SEARCH_CACHE_MAX_ENTRIES)
+        elif settings.SEARCH_CACHE_BACKEND == 'django':
+            _search_cache = DjangoSearchCache(settings.SEARCH_CACHE_TTL, settings.SEARCH_CACHE_ALIAS)
+        else:
+            raise ValueError(f'Unknown search cache backend "{settings.SEARCH_CACHE_BACKEND}"')
+
+    return _search_cache
+
+
+@receiver(setting_changed)
+def reset_search_cache(setting, **kwargs):
+    """
+    Discards the search cache when any of the search cache settings change, so the cache is recreated from the new
+    settings
+    """
+    global _search_cache
+
+    if setting.startswith('SEARCH_CACHE_'):
+        _search_cache = None
+
+
+def quantise_time(value, quantum):
+    """
+    Rounds a time down to a multiple of quantum seconds, so that searches made close together in time can share results
+
+    :param value: The datetime to round
+    :param quantum: The number of seconds to round to
+
+    :return: The rounded datetime
+    """
+    if not quantum:
+        return value
+
+    return datetime.datetime.fromtimestamp(value.timestamp() // quantum * quantum, tz=value.tzinfo)
@@ -0,0 +1,100 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections
+from django.dispatch import receiver
+
+# The thread pool used to query several databases at once (See get_search_executor)
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+
+def get_search_executor():
+    """
+    Gets the thread pool used to run the database queries of a search concurrently. The pool has at most
+    SEARCH_THREAD_POOL_SIZE threads, so the number of database connections opened by each process is bounded.
+
+    :return: The thread pool
+    """
+    global _search_executor
+
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(
+                max_workers=settings.SEARCH_THREAD_POOL_SIZE,
+                thread_name_prefix='db_search'
+            )
+
+        return _search_executor
+
+
+@receiver(setting_changed)
+def reset_search_executor(setting, **kwargs):
+    """
+    Discards the thread pool when its size changes, so the pool is recreated with the new size
+    """
+    global _search_executor
+
+    if setting == 'SEARCH_THREAD_POOL_SIZE':
+        with _search_executor_lock:
+            if _search_executor is not None:
+                _search_executor.shutdown(wait=False)
+            _search_executor = None
+
+
+def run_with_connections(func, *args, **kwargs):
+    """
+    Runs a function on a pool thread. Django database connections belong to the thread that opened them, so the
+    connections the function uses are managed as they would be for a request, and are closed once they are no longer
+    usable or are older than CONN_MAX_AGE.
+    """
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def run_concurrently(*calls):
+    """
+    Runs several functions at once on the search thread pool
+
+    :param calls: Tuples of a function followed by its arguments
+
+    :return: A list of the values returned by each function, in the same order as the calls. If any function raises an
+    exception it is raised here once every function has finished
+    """
+    executor = get_search_executor()
+
+    # Each call runs in a copy of the caller's context, so it is counted as part of the caller's request (See
+    # db_search.utils.metrics)
+    futures = [
+        executor.submit(contextvars.copy_context().run, run_with_connections, *call)
+        for call in calls
+    ]
+
+    # Wait for every call to finish before raising any errors, so no call is left using a connection in the background
+    for future in futures:
+        future.exception()
+
+    return [future.result() for future in futures]
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """
+    Runs a blocking function, such as a database query, on the search thread pool so the event loop can carry on with
+    other work while it runs. Connections are managed as for run_with_connections.
+
+    The search thread pool is only used for database queries, never for code that waits on other threads (such as the
+    views run by the event loop's default executor), so a busy server can't fill the pool with threads that are each
+    waiting for a free thread.
+
+    :return: The value returned by the function
+    """
+    call = functools.partial(contextvars.copy_context().run, run_with_connections, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_search_executor(), call)
@@ -0,0 +1,29 @@
+import base64
+import datetime
+
+
+def encode_cursor(creation_time, job_id):
+    """
+    Encodes the position of a job in the search results as an opaque cursor
+
+    :param creation_time: The creation time of the job
+    :param job_id: The id of the job
+
+    :return: The cursor string
+    """
+    return base64.urlsafe_b64encode(f'{creation_time.isoformat()}|{job_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor generated by encode_cursor
+
+    :param cursor: The cursor string
+
+    :return: A tuple of the creation time and id of the job the cursor points to
+    """
+    try:
+        creation_time, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.datetime.fromisoformat(creation_time), int(job_id)
+    except ValueError:
+        raise ValueError(f'Invalid cursor "{cursor}"')
@@ -0,0 +1,133 @@
+"""
+Maintains the search document table used when SEARCH_ENGINE is "document" (See db_search.models.SearchDocument). Each
+public search document holds everything a search needs to know about a job, so that a search only reads this one table
+to find the matching jobs.
+"""
+from django.db import transaction
+from gwauth.models import GWCloudUser
+from jobserver.models import JobHistory
+
+from db_search.models import SearchDocument
+from db_search.utils.ngram import normalise
+import db_search.utils.isms.bilby
+
+# The number of jobs to load and build documents for at a time
+DOCUMENT_BATCH_SIZE = 500
+
+# The fields of the jobs that documents are built from
+DOCUMENT_JOB_FIELDS = ['id', 'name', 'description', 'user_id', 'job_controller_id', 'private', 'is_ligo_job',
+                       'creation_time']
+
+
+def join_text(strings):
+    """
+    Joins searchable strings in to a single text field, one normalised string per line, so that a term can't match
+    across two strings
+    """
+    return '\n'.join(normalise(string) for string in strings if string)
+
+
+def get_job_states(application, job_controller_ids):
+    """
+    Finds the newest job history entry of each of a list of job controller jobs
+
+    :param application: The application the jobs belong to, ie, "viterbi" or "bilbyui"
+    :param job_controller_ids: The ids of the job controller jobs
+
+    :return: A dictionary of job controller job id -> (state, timestamp) of the newest entry. Jobs with no history, or
+    that belong to another application, are left out
+    """
+    histories = JobHistory.objects.using('jobserver') \
+        .filter(job_id__in=job_controller_ids, job__application=application) \
+        .order_by('job_id', 'timestamp', 'id') \
+        .values_list('job_id', 'state', 'timestamp')
+
+    # Entries are ordered oldest first, so the newest entry of each job is the last one seen
+    return {job_id: (state, timestamp) for job_id, state, timestamp in histories}
+
+
+def build_documents(application, job_klass, jobs):
+    """
+    Builds the search documents of a list of jobs
+
+    :param application: The application the jobs belong to, ie, "viterbi" or "bilbyui"
+    :param job_klass: The class representing the main job class for the provided application, ie, BilbyJob or ViterbiJob
+    :param jobs: A list of job instances, with at least the DOCUMENT_JOB_FIELDS loaded
+
+    :return: A list of unsaved search documents
+    """
+    job_ids = [job.id for job in jobs]
+
+    users = GWCloudUser.objects.using('gwauth') \
+        .filter(id__in={job.user_id for job in jobs}) \
+        .in_bulk()
+
+    # Collect the names of the labels on each job
+    label_klass = job_klass.labels.field.related_model
+    label_names = dict(label_klass.objects.using(application).values_list('id', 'name'))
+
+    job_field = f'{job_klass._meta.model_name}_id'
+    job_labels = {job_id: [] for job_id in job_ids}
+    for job_id, label_id in job_klass.labels.through.objects.using(application) \
+            .filter(**{f'{job_field}__in': job_ids}) \
+            .values_list(job_field, 'label_id'):
+        job_labels[job_id].append(label_names.get(label_id))
+
+    # Bilby jobs have event ids and job types
+    event_ids = {}
+    if application == 'bilbyui':
+        event_ids = db_search.utils.isms.bilby.get_event_id_text(job_ids)
+
+    states = get_job_states(application, {job.job_controller_id for job in jobs if job.job_controller_id})
+
+    documents = []
+    for job in jobs:
+        user = users.get(job.user_id)
+        state, last_activity = states.get(job.job_controller_id, (None, None))
+
+        documents.append(
+            SearchDocument(
+                application=application,
+                job_id=job.id,
+                text=join_text([job.name, job.description]),
+                owner=join_text([user.first_name, user.last_name] if user else []),
+                labels=join_text(job_labels[job.id]),
+                event_ids=join_text(event_ids.get(job.id, [])),
+                private=job.private,
+                is_ligo_job=job.is_ligo_job,
+                job_type=getattr(job, 'job_type', 0),
+                creation_time=job.creation_time,
+                state=state,
+                last_activity=last_activity
+            )
+        )
+
+    return documents
+
+
+def get_document_jobs(application, job_klass):
+    """
+    Gets the query for the jobs of an application with the fields needed to build their documents
+    """
+    fields = DOCUMENT_JOB_FIELDS + (['job_type'] if application == 'bilbyui' else [])
+    return job_klass.objects.using(application).only(*fields)
+
+
+def index_documents(application, job_klass, job_ids):
+    """
+    Replaces the search documents of the specified jobs
+
+    :param application: The application the jobs belong to, ie, "viterbi" or "bilbyui"
+    :param job_klass: The class representing the main job class for the provided application, ie, BilbyJob or ViterbiJob
+    :param job_ids: The ids of the jobs to build documents for. Jobs that no longer exist have their documents removed
+
+    :return: The number of documents written
+    """
+    jobs = list(get_document_jobs(application, job_klass).filter(id__in=job_ids))
+    documents = build_documents(application, job_klass, jobs)
+
+    with transaction.atomic(using='db_search'):
+        SearchDocument.objects.using('db_search').filter(application=application, job_id__in=job_ids).delete()
+        SearchDocument.objects.using('db_search').bulk_create(documents, batch_size=DOCUMENT_BATCH_SIZE)
+
+    return len(documents)
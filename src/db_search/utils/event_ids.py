@@ -0,0 +1,35 @@
+"""
+An in-process index of the bilby event ids, so that search terms are matched against the event id, trigger id and
+nickname of each event id in Python rather than by scanning the event id table for every term of every bilby search
+(See db_search.utils.names). New event ids are added to the index as they are created, and the index is loaded again
+every SEARCH_EVENT_ID_REFRESH_INTERVAL seconds to pick up changed and deleted event ids.
+"""
+from django.conf import settings
+from bilbyui.models import EventID
+
+from db_search.utils.names import get_name_index
+
+
+def get_event_id_index(refresh=False):
+    """
+    Gets the event id index
+
+    :param refresh: If the index should be loaded again now
+
+    :return: The NameIndex of the event id, trigger id and nickname of each event id
+    """
+    return get_name_index(
+        'event_ids', EventID.objects.using('bilbyui'), ['event_id', 'trigger_id', 'nickname'],
+        settings.SEARCH_EVENT_ID_REFRESH_INTERVAL, refresh
+    )
+
+
+def match_event_ids(term):
+    """
+    Finds the event ids whose event id, trigger id or nickname contains a search term
+
+    :param term: The single word search term
+
+    :return: A sorted list of the ids of the matching event ids
+    """
+    return get_event_id_index().match(term)
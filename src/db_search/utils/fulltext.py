@@ -0,0 +1,165 @@
+"""
+Support for the "fulltext" search engine, which matches terms with InnoDB FULLTEXT indexes rather than LIKE scans.
+
+The indexes are created on the application tables with the create_fulltext_indexes management command. Until every
+index of an application exists, searches of that application fall back to LIKE scans.
+"""
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+# The number of seconds before an application found to be missing an index is checked again
+FULLTEXT_RECHECK_INTERVAL = 60
+
+# If each application has every FULLTEXT index, and when it was checked, by database alias and name (See fulltext_ready)
+_ready = {}
+_ready_lock = threading.Lock()
+
+
+def get_fulltext_indexes(application, job_klass):
+    """
+    Gets the FULLTEXT indexes that the fulltext search engine needs for an application
+
+    :param application: The application, ie, "viterbi" or "bilbyui"
+    :param job_klass: The class representing the main job class for the application, ie, BilbyJob or ViterbiJob
+
+    :return: A list of (table name, column names) tuples. The column names must match the MATCH clauses of the
+    fulltext term filters exactly. User names, label names and event ids are matched in process (See
+    db_search.utils.job_search.match_term_ids), so their tables don't need an index
+    """
+    return [
+        (job_klass._meta.db_table, ('name', 'description'))
+    ]
+
+
+def get_index_name(columns):
+    return 'db_search_ft_' + '_'.join(columns)
+
+
+def get_existing_fulltext_indexes(application, table):
+    """
+    Gets the column lists of the FULLTEXT indexes on a table
+
+    :return: A set of tuples of the column names of each index, in index order
+    """
+    with connections[application].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT
+                INDEX_NAME,
+                COLUMN_NAME
+            FROM
+                information_schema.STATISTICS
+            WHERE
+                TABLE_SCHEMA = DATABASE()
+                AND TABLE_NAME = %s
+                AND INDEX_TYPE = 'FULLTEXT'
+            ORDER BY
+                INDEX_NAME,
+                SEQ_IN_INDEX
+            """,
+            [table]
+        )
+
+        indexes = {}
+        for index_name, column_name in cursor.fetchall():
+            indexes.setdefault(index_name, []).append(column_name)
+
+    return {tuple(columns) for columns in indexes.values()}
+
+
+def get_missing_fulltext_indexes(application, job_klass):
+    """
+    Finds the FULLTEXT indexes of an application that don't exist yet
+
+    :return: A list of (table name, column names) tuples (See get_fulltext_indexes)
+    """
+    return [
+        (table, columns)
+        for table, columns in get_fulltext_indexes(application, job_klass)
+        if columns not in get_existing_fulltext_indexes(application, table)
+    ]
+
+
+def create_fulltext_indexes(application, job_klass):
+    """
+    Creates any missing FULLTEXT indexes of an application. Building an index reads the whole table, so this can take a
+    while on large tables.
+
+    :return: A list of the (table name, column names) of the indexes that were created
+    """
+    missing = get_missing_fulltext_indexes(application, job_klass)
+
+    connection = connections[application]
+    with connection.cursor() as cursor:
+        for table, columns in missing:
+            cursor.execute(
+                f'ALTER TABLE {connection.ops.quote_name(table)} ADD FULLTEXT INDEX '
+                f'{connection.ops.quote_name(get_index_name(columns))} '
+                f'({", ".join(connection.ops.quote_name(column) for column in columns)})'
+            )
+
+    clear_fulltext_ready()
+    return missing
+
+
+def fulltext_ready(application, job_klass):
+    """
+    Checks if every FULLTEXT index of an application exists, so searches can use the fulltext engine. The result is
+    remembered once the indexes exist. Otherwise the indexes are checked again after FULLTEXT_RECHECK_INTERVAL seconds,
+    so that indexes created by another process are picked up.
+
+    :return: True if every index exists
+    """
+    key = (application, connections[application].settings_dict['NAME'])
+
+    with _ready_lock:
+        checked = _ready.get(key)
+
+    if checked is not None:
+        ready, checked_at = checked
+        if ready or time.monotonic() - checked_at < FULLTEXT_RECHECK_INTERVAL:
+            return ready
+
+    ready = not get_missing_fulltext_indexes(application, job_klass)
+
+    with _ready_lock:
+        _ready[key] = (ready, time.monotonic())
+
+    return ready
+
+
+def clear_fulltext_ready():
+    with _ready_lock:
+        _ready.clear()
+
+
+@receiver(setting_changed)
+def reset_fulltext_ready(setting, **kwargs):
+    """
+    Checks the indexes again when the databases change
+    """
+    if setting == 'DATABASES':
+        clear_fulltext_ready()
+
+
+def fulltext_query(term):
+    """
+    Converts a search term to a boolean mode MATCH ... AGAINST query matching words that start with the term. Boolean
+    mode operators are removed from the term, and a term with punctuation in it must match each of its words.
+
+    :param term: The single word search term
+
+    :return: The query, or None if the term has a word too short to be in the index, in which case the term should be
+    matched with a LIKE scan instead
+    """
+    words = re.findall(r'\w+', term)
+    if not words or any(len(word) < settings.SEARCH_FULLTEXT_MIN_TOKEN_SIZE for word in words):
+        return None
+
+    return ' '.join(f'+{word}*' for word in words)
@@ -1,83 +1,99 @@
-sql_term_search = """
+from bilbyui.models import BilbyJob
+
+# Bilby jobs that weren't submitted through the job controller (job_type 1 or 2) have no job history, so the time window
+# is applied to their creation time instead
+sql_search = """
 SELECT
     id
 FROM
     {job_table}
 WHERE
-    (
-        user_id IN (
-            SELECT
-                id
-            FROM
-                {auth_database}.gwauth_gwclouduser
-            WHERE
-                first_name LIKE %(term)s
-                OR last_name LIKE %(term)s
-        )
-        OR {job_table}.name LIKE %(term)s
-        OR {job_table}.description LIKE %(term)s
-        OR id IN (
-            SELECT
-                {job_label_table}.{job_model_name}job_id
-            FROM
-                {job_label_table}
-            WHERE
-                {job_label_table}.label_id IN (
-                    SELECT
-                        {label_table}.id
-                    FROM
-                        {label_table}
-                    WHERE
-                        name LIKE %(term)s
-                )
-        )
-        OR event_id_id IN (
-            SELECT
-                {event_id_table}.id
-            FROM
-                {event_id_table}
-            WHERE
-                event_id LIKE %(term)s
-                OR trigger_id LIKE %(term)s
-                OR nickname LIKE %(term)s
-        )
-    )
+    {term_filter}
     AND
     (
         (
             job_controller_id in (
-                SELECT
-                    {jobcontroller_database}.jobserver_job.id
-                FROM
-                    {jobcontroller_database}.jobserver_job
-                INNER JOIN
-                    {jobcontroller_database}.jobserver_jobhistory ON
-                        (
-                            {jobcontroller_database}.jobserver_job.id =
-                            {jobcontroller_database}.jobserver_jobhistory.job_id
-                        )
-                WHERE
-                    {jobcontroller_database}.jobserver_jobhistory.timestamp >= %(end_time)s
-                    AND (
-                        SELECT
-                            {jobcontroller_database}.jobserver_jobhistory.state
-                        FROM
-                            {jobcontroller_database}.jobserver_jobhistory
-                        WHERE
-                            {jobcontroller_database}.jobserver_jobhistory.job_id =
-                            {jobcontroller_database}.jobserver_job.id
-                        ORDER BY {jobcontroller_database}.jobserver_jobhistory.timestamp DESC
-                        LIMIT 1
-                    ) in %(valid_states)s
-                    AND application = %(application)s
+                {job_controller_filter}
             )
             AND {job_table}.job_type = 0
         )
         OR (
             {job_table}.job_type IN (1, 2)
-            AND {job_table}.creation_time >= %(end_time)s
+            {creation_time_window_filter}
         )
     )
     AND {job_table}.private = FALSE
     AND {job_table}.is_ligo_job IN %(ligo_job_states)s
 """
+
+# Bilby jobs that weren't submitted through the job controller have no job state, so they are filtered on their creation
+# time instead, as for sql_search
+sql_document_search = """
+SELECT
+    {document_table}.job_id
+FROM
+    {document_table}
+WHERE
+    {document_table}.application = %(application)s
+    AND {term_filter}
+    AND
+    (
+        (
+            {document_table}.job_type = 0
+            AND {document_table}.state IN %(valid_states)s
+            {last_activity_window_filter}
+        )
+        OR (
+            {document_table}.job_type IN (1, 2)
+            {document_creation_time_window_filter}
+        )
+    )
+    AND {document_table}.private = FALSE
+    AND {document_table}.is_ligo_job IN %(ligo_job_states)s
+"""
+
+# Bilby jobs can also be matched by their event id, trigger id or nickname
+sql_term_filter = """
+    (
+        (
+            (
+                {job_table}.name LIKE %({term})s
+                OR {job_table}.description LIKE %({term})s
+            )
+            {ngram_filter}
+        )
+        {user_ids_filter}
+        {label_ids_filter}
+        {event_ids_filter}
+    )
+"""
+
+# The bilby fulltext term filter also matches the event ids
+sql_fulltext_term_filter = """
+    (
+        MATCH ({job_table}.name, {job_table}.description) AGAINST (%({fulltext})s IN BOOLEAN MODE)
+        {user_ids_filter}
+        {label_ids_filter}
+        {event_ids_filter}
+    )
+"""
+
+# Matches the bilby jobs with any of the event ids whose event id, trigger id or nickname contain the term. The event
+# ids are found from the event id index (See db_search.utils.event_ids) rather than the event id table, and the filter
+# is left out if no event ids contain the term
+sql_event_id_filter = "OR event_id_id IN %({event_ids})s"
+
+
+def get_event_id_text(job_ids):
+    """
+    Collects the searchable event id strings for bilby jobs
+
+    :param job_ids: The ids of the bilby jobs to collect the event id strings for
+
+    :return: A dictionary of job id -> list of event id, trigger id and nickname for jobs that have an event id
+    """
+    jobs = BilbyJob.objects.using('bilbyui') \
+        .filter(id__in=job_ids, event_id__isnull=False) \
+        .values_list('id', 'event_id__event_id', 'event_id__trigger_id', 'event_id__nickname')
+
+    return {job_id: [event_id, trigger_id, nickname] for job_id, event_id, trigger_id, nickname in jobs}
@@ -1,4 +1,17 @@
+import asyncio
+import functools
+import re
+import threading
+import time
+from collections import OrderedDict
+
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
 from gwauth.models import GWCloudUser
 from jobserver.models import JobHistory
 from bilbyui.models import BilbyJob
@@ -6,54 +19,92 @@ from viterbi.models import ViterbiJob
 
 from bilbyui.utils.embargo import qs_embargo_filter
 
+from db_search.models import SearchNgram
 from db_search.status import JobStatus
+from db_search.utils.cache import get_search_cache
+from db_search.utils.concurrency import run_concurrently, run_in_thread
+from db_search.utils.event_ids import match_event_ids
+from db_search.utils.fulltext import fulltext_query, fulltext_ready
+from db_search.utils.job_state import use_job_state_table
+from db_search.utils.labels import match_labels
+from db_search.utils.metrics import CACHE_LOOKUPS, count_rows, observe_stage
+from db_search.utils.ngram import term_ngrams
+from db_search.utils.replica import find_replica_candidates, get_replica_job_id
+from db_search.utils.users import match_users
 import db_search.utils.isms.bilby
 
-sql_term_search = """
+# The job fields that are always loaded, because they are needed to order the jobs and to look up their users and
+# histories
+required_job_fields = ['id', 'creation_time', 'user_id', 'job_controller_id']
+
+# The job states that searches return jobs in. Always include completed or running jobs
+search_states = [
+    # A job is pending if it is currently waiting for a cluster to submit the job to
+    # (ie, all available clusters are offline)
+    JobStatus.PENDING,
+    # A job is submitting if the job has been submitted but is waiting for the client to acknowledge it has received
+    # the job submission command
+    JobStatus.SUBMITTING,
+    # A job is submitted if it is submitted on a cluster
+    JobStatus.SUBMITTED,
+    # A job is queued if it is in the queue on the cluster it is to run on
+    JobStatus.QUEUED,
+    # A job is running if it is currently running on the cluster it is to run on
+    JobStatus.RUNNING,
+    # A job is completed if it is finished running on the cluster without error
+    JobStatus.COMPLETED
+]
+
+# The main job class for each application that can be searched
+job_klasses = {
+    'bilbyui': BilbyJob,
+    'viterbi': ViterbiJob
+}
+
+# The registry of compiled search statements, by application, term variant and settings (See get_search_statement)
+MAX_SEARCH_STATEMENTS = 256
+_search_statements = {}
+
+# The number of jobs each term matched the last time it was the first term of a search, by application and term (See
+# estimate_term_matches)
+MAX_TERM_MATCHES = 1024
+_term_matches = OrderedDict()
+_term_matches_lock = threading.Lock()
+
+# The search watermarks last read by this process, and when they were read, by application and database name (See
+# get_recent_search_watermark)
+_search_watermarks = {}
+_search_watermarks_lock = threading.Lock()
+
+# When nothing is known about how many jobs a term matches, each character of the term is assumed to halve the number
+# of jobs it matches
+TERM_CHARACTER_SELECTIVITY = 0.5
+
+# The search statement. The job state and time window filter is evaluated once, no matter how many terms are searched
+sql_search = """
 SELECT
     id
 FROM
     {job_table}
 WHERE
-    (
-        user_id IN (
-            SELECT
-                id
-            FROM
-                {auth_database}.gwauth_gwclouduser
-            WHERE
-                first_name LIKE %(term)s
-                OR last_name LIKE %(term)s
-        )
-        OR {job_table}.name LIKE %(term)s
-        OR {job_table}.description LIKE %(term)s
-        OR id IN (
-            SELECT
-                {job_label_table}.{job_model_name}job_id
-            FROM
-                {job_label_table}
-            WHERE
-                {job_label_table}.label_id IN (
-                    SELECT
-                        {label_table}.id
-                    FROM
-                        {label_table}
-                    WHERE
-                        name LIKE %(term)s
-                )
-        )
-    )
+    {term_filter}
     AND job_controller_id in (
+        {job_controller_filter}
+    )
+    AND {job_table}.private = FALSE
+    AND {job_table}.is_ligo_job IN %(ligo_job_states)s
+"""
+
+# Selects the job controller jobs whose last activity is within the time window and whose newest job history entry is in
+# one of the valid states. The job history is only joined if the window has a start time
+sql_job_history_filter = """
         SELECT
             {jobcontroller_database}.jobserver_job.id
         FROM
             {jobcontroller_database}.jobserver_job
-        INNER JOIN
-            {jobcontroller_database}.jobserver_jobhistory ON
-                ({jobcontroller_database}.jobserver_job.id = {jobcontroller_database}.jobserver_jobhistory.job_id)
+        {history_since_join}
         WHERE
-            {jobcontroller_database}.jobserver_jobhistory.timestamp >= %(end_time)s
-            AND (
+            (
                 SELECT
                     {jobcontroller_database}.jobserver_jobhistory.state
                 FROM
@@ -64,12 +115,861 @@ WHERE
                 LIMIT 1
             ) in %(valid_states)s
             AND application = %(application)s
+            {history_until_filter}
+"""
+
+# Limits sql_job_history_filter to the jobs with any job history entry since the start of the time window
+sql_job_history_since_join = """INNER JOIN
+            {jobcontroller_database}.jobserver_jobhistory ON
+                ({jobcontroller_database}.jobserver_job.id = {jobcontroller_database}.jobserver_jobhistory.job_id)
+                AND {jobcontroller_database}.jobserver_jobhistory.timestamp >= %(end_time)s"""
+
+# Limits sql_job_history_filter to the jobs with no job history entry after the end of the time window
+sql_job_history_until_filter = """AND NOT EXISTS (
+                SELECT
+                    1
+                FROM
+                    {jobcontroller_database}.jobserver_jobhistory
+                WHERE
+                    {jobcontroller_database}.jobserver_jobhistory.job_id = {jobcontroller_database}.jobserver_job.id
+                    AND {jobcontroller_database}.jobserver_jobhistory.timestamp > %(until)s
+            )"""
+
+# Limit a timestamp column to the start and end of the time window. Each is left out of the statement if the window has
+# no start or end time, so searches of all time don't filter on time at all
+sql_since_filter = "AND {column} >= %(end_time)s"
+sql_until_filter = "AND {column} <= %(until)s"
+
+# The timestamp columns limited to the time window of a search, by the name of their filter in the search statements
+window_filter_columns = {
+    'job_state_window_filter': '{job_state_table}.timestamp',
+    'last_activity_window_filter': '{document_table}.last_activity',
+    'creation_time_window_filter': '{job_table}.creation_time',
+    'document_creation_time_window_filter': '{document_table}.creation_time'
+}
+
+# Selects the same jobs as sql_job_history_filter from the db_search job state table, which holds the newest state and
+# timestamp of each job so a single index range scan replaces the correlated job history subquery
+sql_job_state_filter = """
+        SELECT
+            {job_state_table}.job_id
+        FROM
+            {job_state_table}
+        WHERE
+            {job_state_table}.application = %(application)s
+            AND {job_state_table}.state IN %(valid_states)s
+            {job_state_window_filter}
+"""
+
+# The predicate a job must satisfy to match a single term. The term parameter names are filled in by compile_search so
+# that each term in the search gets its own parameters. The n-gram filter only narrows the LIKE scans, since jobs
+# matched by their user or labels are found from the ids of the users and labels rather than the n-gram index
+sql_term_filter = """
+    (
+        (
+            (
+                {job_table}.name LIKE %({term})s
+                OR {job_table}.description LIKE %({term})s
+            )
+            {ngram_filter}
+        )
+        {user_ids_filter}
+        {label_ids_filter}
     )
+"""
+
+# The search statement when SEARCH_ENGINE is "document". The terms, job state and time window are all matched against
+# the db_search search document of each job (See db_search.utils.document), so no other database is read
+sql_document_search = """
+SELECT
+    {document_table}.job_id
+FROM
+    {document_table}
+WHERE
+    {document_table}.application = %(application)s
+    AND {term_filter}
+    AND {document_table}.state IN %(valid_states)s
+    {last_activity_window_filter}
+    AND {document_table}.private = FALSE
+    AND {document_table}.is_ligo_job IN %(ligo_job_states)s
+"""
+
+# The predicate a search document must satisfy to match a single term
+sql_document_term_filter = """
+    (
+        {document_table}.text LIKE %({term})s
+        OR {document_table}.owner LIKE %({term})s
+        OR {document_table}.labels LIKE %({term})s
+        OR {document_table}.event_ids LIKE %({term})s
+    )
+"""
+
+# The predicate a job must satisfy to match a single term when SEARCH_ENGINE is "fulltext". The job text is matched
+# with FULLTEXT indexes (See db_search.utils.fulltext)
+sql_fulltext_term_filter = """
+    (
+        MATCH ({job_table}.name, {job_table}.description) AGAINST (%({fulltext})s IN BOOLEAN MODE)
+        {user_ids_filter}
+        {label_ids_filter}
+    )
+"""
+
+# Matches the jobs owned by any of the users whose first or last names contain the term. The users are found from the
+# user name index (See db_search.utils.users) rather than the auth database, and the filter is left out if no user
+# names contain the term
+sql_user_filter = "OR user_id IN %({user_ids})s"
+
+# Matches the jobs owned by any of the users whose first or last names contain the term by querying the auth database.
+# This replaces sql_user_filter for terms that match more than SEARCH_MAX_USER_IDS users, such as terms of one or two
+# characters, rather than putting every one of their ids in the statement
+sql_user_name_filter = """OR user_id IN (
+            SELECT
+                id
+            FROM
+                {auth_database}.gwauth_gwclouduser
+            WHERE
+                first_name LIKE %({term})s
+                OR last_name LIKE %({term})s
+        )"""
+
+# Matches the jobs with any of the labels whose names contain the term. The labels are found from the label dictionary
+# (See db_search.utils.labels) rather than the label table, and the filter is left out if no label names contain the
+# term
+sql_label_filter = """OR id IN (
+            SELECT
+                {job_label_table}.{job_model_name}job_id
+            FROM
+                {job_label_table}
+            WHERE
+                {job_label_table}.label_id IN %({label_ids})s
+        )"""
+
+# The filters that match a term against the ids of the users, labels and event ids whose names contain it, by the name
+# of their parameter (See match_term_ids)
+sql_id_filters = {
+    'user_ids': sql_user_filter,
+    'label_ids': sql_label_filter,
+    'event_ids': db_search.utils.isms.bilby.sql_event_id_filter
+}
+
+# Finds the jobs matching a single term, used to narrow a search with several terms down to a set of candidate jobs
+# before the search statement is run (See find_candidates). Terms after the first are only checked against the jobs
+# that matched the terms before them
+sql_term_candidates = """
+SELECT
+    id
+FROM
+    {job_table}
+WHERE
+    {term_filter}
     AND {job_table}.private = FALSE
     AND {job_table}.is_ligo_job IN %(ligo_job_states)s
+LIMIT %(candidate_limit)s
+"""
+
+# Limits a statement to the candidate jobs found by find_candidates, in place of the term filters
+sql_candidate_filter = "{job_table}.id IN %(candidate_ids)s"
+
+# Matches the jobs created since the search replica was last updated with the term filters, alongside the candidate jobs
+# found in the replica, so that new jobs are found before the replica has caught up with them
+sql_replica_tail_filter = """(
+        {job_table}.id > %(replica_job_id)s
+        AND {term_filter}
+    )"""
+
+# Limits the LIKE scans to jobs that the n-gram index says contain every n-gram of the term. Jobs newer than the most
+# recently indexed job are always scanned so that jobs are still found before the index has caught up with them.
+sql_ngram_filter = """
+    AND (
+        {job_table}.id IN (
+            SELECT
+                {ngram_table}.job_id
+            FROM
+                {ngram_table}
+            WHERE
+                {ngram_table}.application = %(application)s
+                AND {ngram_table}.ngram IN %({ngrams})s
+            GROUP BY
+                {ngram_table}.job_id
+            HAVING
+                COUNT(*) = %({ngram_count})s
+        )
+        OR {job_table}.id > (
+            SELECT
+                COALESCE(MAX({ngram_table}.job_id), 0)
+            FROM
+                {ngram_table}
+            WHERE
+                {ngram_table}.application = %(application)s
+        )
+    )
 """
 
 
+def get_db_dict(application):
+    """
+    Generates the database and table names used to format the search SQL for an application
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+
+    :return: A dictionary of template names to their fully qualified database or table name
+    """
+    job_model_name = 'bilby' if application == 'bilbyui' else application
+
+    # We need to use the correct database names for testing
+    if settings.TESTING:
+        def database(alias):
+            return settings.DATABASES[alias]['TEST']['NAME']
+    else:
+        def database(alias):
+            return settings.DATABASES[alias]['NAME']
+
+    return {
+        'auth_database': database('gwauth'),
+        'jobcontroller_database': database('jobserver'),
+        'job_table': database(application) + f'.{application}_{job_model_name}job',
+        'label_table': database(application) + f'.{application}_label',
+        'job_label_table': database(application) + f'.{application}_{job_model_name}job_labels',
+        'ngram_table': database('db_search') + '.db_search_searchngram',
+        'job_state_table': database('db_search') + '.db_search_jobstate',
+        'document_table': database('db_search') + '.db_search_searchdocument',
+        'application': application,
+        'job_model_name': job_model_name
+    }
+
+
+def get_term_param_names(idx):
+    """
+    Gets the names of the statement parameters of a term in a search
+
+    :param idx: The index of the term in the search
+
+    :return: A dictionary of the term template names to their parameter names
+    """
+    return {
+        'term': f'term_{idx}',
+        'ngrams': f'ngrams_{idx}',
+        'ngram_count': f'ngram_count_{idx}',
+        'fulltext': f'fulltext_{idx}',
+        'label_ids': f'label_ids_{idx}',
+        'user_ids': f'user_ids_{idx}',
+        'event_ids': f'event_ids_{idx}'
+    }
+
+
+def build_term_filter(application, db_dict, idx, variant):
+    """
+    Builds the predicate a job must satisfy to match a term
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param db_dict: The database and table names of the application (See get_db_dict)
+    :param idx: The index of the term in the search
+    :param variant: A tuple of if the term is looked up in the index of the search engine, either the n-gram index or
+    the FULLTEXT indexes, and the names of the id filters with ids that match the term (See sql_id_filters), or
+    "user_names" if too many users match the term to list their ids. Terms not looked up in the index are matched with
+    LIKE scans
+
+    :return: The SQL predicate, using the named parameters of the term (See get_term_param_names)
+    """
+    use_index, matched = variant
+
+    term_dict = {**db_dict, **get_term_param_names(idx)}
+    for name, sql_id_filter in sql_id_filters.items():
+        term_dict[f'{name}_filter'] = sql_id_filter.format_map(term_dict) if name in matched else ''
+
+    # Terms that match too many users are matched against the user names by the auth database instead
+    if 'user_names' in matched:
+        term_dict['user_ids_filter'] = sql_user_name_filter.format_map(term_dict)
+
+    if use_index and settings.SEARCH_ENGINE == 'fulltext':
+        # Get the correct SQL for bilby
+        if application == 'bilbyui':
+            return db_search.utils.isms.bilby.sql_fulltext_term_filter.format_map(term_dict).strip()
+
+        return sql_fulltext_term_filter.format_map(term_dict).strip()
+
+    # Get the correct SQL for bilby
+    sql_term_query = db_search.utils.isms.bilby.sql_term_filter if application == 'bilbyui' else sql_term_filter
+
+    term_dict['ngram_filter'] = sql_ngram_filter.format_map(term_dict) if use_index else ''
+
+    return sql_term_query.format_map(term_dict).strip()
+
+
+def build_window_filter(column, window):
+    """
+    Builds the predicate limiting a timestamp column to the time window of a search
+
+    :param column: The timestamp column, ie, "{job_state_table}.timestamp"
+    :param window: A tuple of if the time window has a start time and if it has an end time
+
+    :return: The SQL predicate, which is empty if the window is unbounded
+    """
+    since, until = window
+
+    filters = []
+    if since:
+        filters.append(sql_since_filter.format(column=column))
+
+    if until:
+        filters.append(sql_until_filter.format(column=column))
+
+    return ' '.join(filters)
+
+
+def add_window_filters(db_dict, window):
+    """
+    Adds the time window filters of a search statement to the database and table names it is built from
+
+    :param db_dict: The database and table names of the application (See get_db_dict)
+    :param window: A tuple of if the time window has a start time and if it has an end time
+    """
+    since, until = window
+
+    filters = {
+        'history_since_join': sql_job_history_since_join if since else '',
+        'history_until_filter': sql_job_history_until_filter if until else '',
+        **{
+            name: build_window_filter(column, window)
+            for name, column in window_filter_columns.items()
+        }
+    }
+
+    # The filters refer to the tables by name, so the names are filled in too
+    db_dict.update({name: sql_filter.format_map(db_dict) for name, sql_filter in filters.items()})
+
+
+def build_document_statement(application, term_count, window):
+    """
+    Builds the SQL statement that finds the jobs matching every one of a number of terms from the search documents
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param term_count: The number of terms
+    :param window: A tuple of if the time window has a start time and if it has an end time
+
+    :return: The SQL statement, using named parameters (See get_term_param_names)
+    """
+    # Get the correct SQL for bilby
+    sql_query = db_search.utils.isms.bilby.sql_document_search if application == 'bilbyui' else sql_document_search
+
+    db_dict = get_db_dict(application)
+
+    term_filters = [
+        sql_document_term_filter.format_map({**db_dict, **get_term_param_names(idx)}).strip()
+        for idx in range(term_count)
+    ]
+
+    # Every term must match each result. If there are no terms then every job matches
+    db_dict['term_filter'] = '\n    AND '.join(term_filters) if term_filters else 'TRUE'
+
+    add_window_filters(db_dict, window)
+
+    return sql_query.format_map(db_dict)
+
+
+def build_search_statement(application, term_variants, window, candidates=False, replica_tail=False, job_states=False):
+    """
+    Builds the SQL statement that finds the jobs matching every one of a number of terms
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param term_variants: A tuple with the variant of each term (See build_term_filter)
+    :param window: A tuple of if the time window has a start time and if it has an end time. The job history is only
+    joined if the window has a start time
+    :param candidates: If this is True the terms have already been matched by find_candidates, and the statement is
+    limited to the candidate jobs instead
+    :param replica_tail: If this is True the candidate jobs were found in the search replica, and the terms are only
+    matched against the jobs created since the replica was last updated (See sql_replica_tail_filter)
+    :param job_states: If this is True the jobs are filtered on job state using the job state table rather than the job
+    history (See use_job_state_table)
+
+    :return: The SQL statement, using named parameters (See get_term_param_names)
+    """
+    # The search documents hold everything needed to match the terms, job state and time window
+    if settings.SEARCH_ENGINE == 'document' and not candidates:
+        return build_document_statement(application, len(term_variants), window)
+
+    # Get the correct SQL for bilby
+    sql_query = db_search.utils.isms.bilby.sql_search if application == 'bilbyui' else sql_search
+
+    db_dict = get_db_dict(application)
+
+    term_filters = [
+        build_term_filter(application, db_dict, idx, variant) for idx, variant in enumerate(term_variants)
+    ]
+
+    if replica_tail:
+        tail_dict = {**db_dict, 'term_filter': '\n        AND '.join(term_filters)}
+        tail_filter = sql_replica_tail_filter.format_map(tail_dict)
+        if candidates:
+            tail_filter = f'({sql_candidate_filter.format_map(db_dict)}\n    OR {tail_filter})'
+
+        term_filters = [tail_filter]
+    elif candidates:
+        term_filters.append(sql_candidate_filter.format_map(db_dict))
+
+    # Every term must match each result. If there are no terms then every job matches
+    db_dict['term_filter'] = '\n    AND '.join(term_filters) if term_filters else 'TRUE'
+
+    add_window_filters(db_dict, window)
+
+    # Filter on job state using the job state table if it's enabled and has been built
+    job_controller_query = sql_job_state_filter if job_states else sql_job_history_filter
+    db_dict['job_controller_filter'] = job_controller_query.format_map(db_dict).strip()
+
+    return sql_query.format_map(db_dict)
+
+
+def build_term_statement(application, variant, pushdown):
+    """
+    Builds the SQL statement that finds the jobs matching a single term, for narrowing a search down to a set of
+    candidate jobs (See find_candidates)
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param variant: The variant of the term (See build_term_filter)
+    :param pushdown: If the statement should only check the candidate jobs found from earlier terms
+
+    :return: The SQL statement, using the named parameters of the first term (See get_term_param_names)
+    """
+    db_dict = get_db_dict(application)
+
+    term_filters = [build_term_filter(application, db_dict, 0, variant)]
+
+    # Check the candidates first, so the term is only matched against the jobs that are left
+    if pushdown:
+        term_filters.insert(0, sql_candidate_filter.format_map(db_dict))
+
+    db_dict['term_filter'] = '\n    AND '.join(term_filters)
+
+    return sql_term_candidates.format_map(db_dict)
+
+
+def get_registered_statement(key, build, *args):
+    """
+    Gets a SQL statement from the statement registry, building it the first time it is needed
+
+    :param key: A tuple identifying the statement
+    :param build: The function that builds the statement
+    :param args: The arguments to the build function
+
+    :return: The SQL statement
+    """
+    # The statement also depends on the database names and the search engine. The key is only made from settings, so
+    # statements can be built without touching the database (See warm_search_statements)
+    key = (*key, settings.TESTING, settings.SEARCH_ENGINE)
+
+    statement = _search_statements.get(key)
+    if statement is None:
+        # The number of variants grows with the number of terms searched, so the registry is bounded
+        if len(_search_statements) >= MAX_SEARCH_STATEMENTS:
+            clear_search_statements()
+
+        statement = _search_statements[key] = build(*args)
+
+    return statement
+
+
+def get_search_statement(application, term_variants, window, candidates=False, replica_tail=False, job_states=False):
+    """
+    Gets the SQL statement that finds the jobs matching every one of a number of terms from the statement registry. The
+    parameters are the same as for build_search_statement.
+
+    :return: The SQL statement
+    """
+    return get_registered_statement(
+        ('search', application, term_variants, window, candidates, replica_tail, job_states), build_search_statement,
+        application, term_variants, window, candidates, replica_tail, job_states
+    )
+
+
+def get_term_statement(application, variant, pushdown):
+    """
+    Gets the SQL statement that finds the jobs matching a single term from the statement registry. The parameters are
+    the same as for build_term_statement.
+
+    :return: The SQL statement
+    """
+    return get_registered_statement(
+        ('term', application, variant, pushdown), build_term_statement, application, variant, pushdown
+    )
+
+
+def clear_search_statements():
+    """
+    Empties the statement registry, so that statements are built again from the current settings
+    """
+    _search_statements.clear()
+    parse_named_params.cache_clear()
+
+
+@receiver(setting_changed)
+def reset_search_statements(setting, **kwargs):
+    """
+    Empties the statement registry when the databases change, so statements use the new database names
+    """
+    if setting == 'DATABASES':
+        clear_search_statements()
+
+
+def warm_search_statements():
+    """
+    Builds the statements for searches of up to one term for every application, over a time window with a start time
+    and over all time, so that they are ready before the first request is served. This is called while the application
+    loads, when the database may not exist yet, so it must not query the database. The statements using the job state
+    table are built as well if the table is enabled, since whether it has been built can't be checked here.
+    """
+    for job_states in {False, settings.SEARCH_JOB_STATE_TABLE}:
+        for application in job_klasses:
+            for term_variants in [(), ((False, ()),), ((True, ()),)]:
+                for window in [(True, False), (False, False)]:
+                    parse_named_params(
+                        get_search_statement(application, term_variants, window, job_states=job_states)
+                    )
+
+
+def match_term_ids(application, term):
+    """
+    Finds the users, labels and event ids whose names contain a term, from the in-process indexes of their names
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param term: The single word term
+
+    :return: A dictionary of id filter name -> a sorted list of the matching ids (See sql_id_filters)
+    """
+    matches = {
+        'user_ids': match_users(term),
+        'label_ids': match_labels(application, job_klasses[application], term)
+    }
+
+    # Only bilby jobs have event ids
+    if application == 'bilbyui':
+        matches['event_ids'] = match_event_ids(term)
+
+    return matches
+
+
+def get_term_params(application, idx, term):
+    """
+    Gets the statement parameters of a term in a search
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param idx: The index of the term in the search
+    :param term: The single word term
+
+    :return: A tuple of a dictionary of the term's parameters and the variant of the term (See build_term_filter)
+    """
+    param_names = get_term_param_names(idx)
+
+    params = {param_names['term']: f'%{term}%'}
+
+    # The search documents hold the user, label and event id names, otherwise the ids with names matching the term are
+    # found in process
+    matched = ()
+    if settings.SEARCH_ENGINE != 'document':
+        for name, ids in match_term_ids(application, term).items():
+            if name == 'user_ids' and len(ids) > settings.SEARCH_MAX_USER_IDS:
+                matched += ('user_names',)
+            elif ids:
+                params[param_names[name]] = ids
+                matched += (name,)
+
+    if settings.SEARCH_ENGINE == 'fulltext':
+        # Terms are matched with LIKE scans if they are too short for the FULLTEXT indexes, or the indexes haven't been
+        # created yet
+        query = fulltext_query(term)
+        if query is None or not fulltext_ready(application, job_klasses[application]):
+            return params, (False, matched)
+
+        params[param_names['fulltext']] = query
+        return params, (True, matched)
+
+    # Only use the n-gram index if it's enabled and the term is long enough to be looked up in it
+    ngrams = term_ngrams(term) if settings.SEARCH_ENGINE == 'ngram' else set()
+    if ngrams:
+        params[param_names['ngrams']] = sorted(ngrams)
+        params[param_names['ngram_count']] = len(ngrams)
+
+    return params, (bool(ngrams), matched)
+
+
+def compile_search(application, terms, window, candidate_ids=None, replica_job_id=None, job_states=False):
+    """
+    Gets the SQL statement and term parameters that find the jobs matching every one of a list of terms
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param terms: The list of single word terms that each job must match
+    :param window: A tuple of if the time window has a start time and if it has an end time
+    :param candidate_ids: The ids of the jobs that match every term, if they have already been found by
+    find_candidates or the search replica. The statement is then limited to these jobs rather than matching the terms
+    again
+    :param replica_job_id: The id of the newest job copied to the search replica, if the candidate jobs were found in
+    the replica. The terms are still matched against the jobs created after it
+    :param job_states: If the jobs should be filtered on job state using the job state table
+
+    :return: A tuple of the SQL statement and a dictionary of the term specific parameters for the statement
+    """
+    if candidate_ids is not None and replica_job_id is None:
+        statement = get_search_statement(application, (), window, True, job_states=job_states)
+        return statement, {'candidate_ids': sorted(candidate_ids)}
+
+    term_variants = []
+    params = {}
+    # Repeated terms don't change the result so each distinct term is only filtered on once
+    for idx, term in enumerate(dict.fromkeys(terms)):
+        term_params, variant = get_term_params(application, idx, term)
+
+        params.update(term_params)
+        term_variants.append(variant)
+
+    if replica_job_id is not None:
+        params['replica_job_id'] = replica_job_id
+        if candidate_ids:
+            params['candidate_ids'] = sorted(candidate_ids)
+
+        statement = get_search_statement(
+            application, tuple(term_variants), window, bool(candidate_ids), True, job_states
+        )
+        return statement, params
+
+    return get_search_statement(application, tuple(term_variants), window, job_states=job_states), params
+
+
+def record_term_matches(application, term, count):
+    """
+    Records the number of jobs a term matched, to estimate the selectivity of the term in later searches
+    """
+    with _term_matches_lock:
+        _term_matches[(application, term)] = count
+        _term_matches.move_to_end((application, term))
+
+        while len(_term_matches) > MAX_TERM_MATCHES:
+            _term_matches.popitem(last=False)
+
+
+def clear_term_matches():
+    with _term_matches_lock:
+        _term_matches.clear()
+
+
+def estimate_term_matches(application, terms):
+    """
+    Estimates the number of jobs each of a list of terms matches, so that the most selective terms can be matched
+    first. Estimates come from, in order of preference:-
+        * the number of jobs the term matched when it was last searched for
+        * the number of jobs the n-gram index holds for the rarest n-gram of the term, if the n-gram engine is in use
+        * the length of the term, with longer terms assumed to match fewer jobs
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param terms: The list of single word terms
+
+    :return: A dictionary of term -> the estimated number of jobs it matches
+    """
+    with _term_matches_lock:
+        estimates = {
+            term: _term_matches[(application, term)] for term in terms if (application, term) in _term_matches
+        }
+
+    unknown = {term: term_ngrams(term) for term in terms if term not in estimates}
+
+    # Jobs can only match a term if the index holds every n-gram of the term for them. Terms too short to use the
+    # index are estimated from their length
+    if settings.SEARCH_ENGINE == 'ngram' and any(unknown.values()):
+        ngram_counts = dict(
+            SearchNgram.objects.using('db_search')
+            .filter(application=application, ngram__in=set().union(*unknown.values()))
+            .values_list('ngram')
+            .annotate(count=Count('id'))
+        )
+
+        for term, ngrams in unknown.items():
+            if ngrams:
+                estimates[term] = min(ngram_counts.get(ngram, 0) for ngram in ngrams)
+
+    unknown = [term for term in terms if term not in estimates]
+    if unknown:
+        # The greatest job id is found from the primary key index, and is close enough to the number of jobs
+        job_count = job_klasses[application].objects.using(application).order_by('-id') \
+            .values_list('id', flat=True).first() or 0
+
+        for term in unknown:
+            estimates[term] = job_count * TERM_CHARACTER_SELECTIVITY ** len(term)
+
+    return estimates
+
+
+def find_candidates(application, terms, exclude_ligo_jobs):
+    """
+    Finds the jobs matching every one of several terms by matching one term at a time, most selective first. Each term
+    after the first is only checked against the jobs that matched the terms before it, and no more terms are checked
+    once no jobs are left. A search for "gw150914 the" only scans the jobs for "gw150914", and then only checks the few
+    jobs it matched for "the".
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param terms: The list of distinct single word terms
+    :param exclude_ligo_jobs: If jobs which have is_ligo_job=True should be excluded from the search
+
+    :return: A tuple of the terms ordered from most to least selective and the set of ids of the jobs matching every
+    term. The set is None if too many jobs match the most selective term (See SEARCH_CANDIDATE_LIMIT), in which case
+    the terms should be matched by the search statement instead
+    """
+    candidate_limit = settings.SEARCH_CANDIDATE_LIMIT
+
+    estimates = estimate_term_matches(application, terms)
+    terms = sorted(terms, key=lambda term: estimates[term])
+
+    job_klass = job_klasses[application]
+    candidate_ids = None
+
+    with observe_stage('candidates', application):
+        for term in terms:
+            params, variant = get_term_params(application, 0, term)
+            params.update({
+                'application': application,
+                'ligo_job_states': (False,) if exclude_ligo_jobs else (True, False),
+                # One more job than the limit is fetched to find out if the limit was exceeded
+                'candidate_limit': candidate_limit + 1
+            })
+
+            if candidate_ids is not None:
+                params['candidate_ids'] = sorted(candidate_ids)
+
+            statement = get_term_statement(application, variant, candidate_ids is not None)
+            job_ids = {job.id for job in job_klass.objects.using(application).raw(statement, params)}
+
+            if candidate_ids is None:
+                record_term_matches(application, term, len(job_ids))
+
+                # Too many jobs to pass between statements, the rest of the terms are left to the search statement
+                if len(job_ids) > candidate_limit:
+                    return terms, None
+
+            candidate_ids = job_ids
+
+            # No job can match the remaining terms
+            if not candidate_ids:
+                break
+
+    count_rows('candidates', application, len(candidate_ids))
+    return terms, candidate_ids
+
+
+def prepare_search(application, terms, end_time, valid_states, exclude_ligo_jobs, until=None):
+    """
+    Prepares the SQL statement and parameters that select the ids of all jobs matching:-
+        * every one of the specified single word terms
+        * last active between end time and until
+        * the specified job states
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilby"
+    :param terms: The list of single word terms to filter on. If this is empty all jobs are matched
+    :param end_time: Jobs that have finished or updated since this time will be considered. If this is None jobs are
+    considered no matter how long ago they were last active
+    :param valid_states: An array of job states to filter on
+    :param exclude_ligo_jobs: If jobs which have is_ligo_job=True should be excluded from the search
+    :param until: Jobs that have finished or updated after this time are not considered. If this is None jobs are
+    considered no matter how recently they were last active
+
+    :return: A tuple of the SQL statement and a dictionary of its named parameters, or None if no job can match the
+    terms
+    """
+    terms = list(dict.fromkeys(terms))
+    candidate_ids = None
+    replica_job_id = None
+    if terms and settings.SEARCH_ENGINE == 'replica':
+        # The terms are resolved to jobs from the local replica, unless too many jobs match to pass them to the search
+        # statement, in which case the terms are matched by the search statement. The replica is built and updated by
+        # the sync thread or the update_search_replica command, and until then the terms are matched by the statement
+        replica_job_id = get_replica_job_id(application)
+        if replica_job_id is not None:
+            candidate_ids = find_replica_candidates(application, terms, settings.SEARCH_CANDIDATE_LIMIT)
+            if candidate_ids is None:
+                replica_job_id = None
+    elif len(terms) > 1 and settings.SEARCH_CANDIDATE_LIMIT and settings.SEARCH_ENGINE != 'document':
+        # Searches for several terms are first narrowed down to the jobs matching every term, one term at a time
+        terms, candidate_ids = find_candidates(application, terms, exclude_ligo_jobs)
+
+    # Jobs newer than the replica may still match even if no candidates were found in it
+    if candidate_ids is not None and not candidate_ids and replica_job_id is None:
+        return None
+
+    # Searches without a start or end time leave those filters out of the statement
+    window = (end_time is not None, until is not None)
+
+    sql_query, params = compile_search(
+        application, terms, window, candidate_ids, replica_job_id, job_states=use_job_state_table()
+    )
+
+    return sql_query, {
+        **params,
+        'end_time': end_time,
+        'until': until,
+        'valid_states': valid_states,
+        'application': application,
+        'ligo_job_states': (False,) if exclude_ligo_jobs else (True, False)
+    }
+
+
+@functools.lru_cache(maxsize=MAX_SEARCH_STATEMENTS)
+def parse_named_params(sql_query):
+    """
+    Converts a SQL statement using named parameters to one using positional parameters. Statements come from the
+    statement registry, so each is only converted once.
+
+    :param sql_query: The SQL statement with %(name)s style parameters
+
+    :return: A tuple of the SQL statement with %s style parameters and a tuple of the parameter names in order
+    """
+    names = []
+
+    def replace(match):
+        names.append(match.group(1))
+        return '%s'
+
+    return re.sub(r'%\((\w+)\)s', replace, sql_query), tuple(names)
+
+
+def to_positional_params(sql_query, params):
+    """
+    Converts a SQL statement using named parameters to one using positional parameters. The Django ORM only supports
+    positional parameters in raw SQL expressions.
+
+    :param sql_query: The SQL statement with %(name)s style parameters
+    :param params: A dictionary of the named parameters
+
+    :return: A tuple of the SQL statement with %s style parameters and a list of the parameters
+    """
+    sql_query, names = parse_named_params(sql_query)
+
+    return sql_query, [params[name] for name in names]
+
+
+def job_search_terms(application, job_klass, terms, end_time, valid_states, exclude_ligo_jobs, until=None):
+    """
+    Performs a single database search for all jobs matching:-
+        * every one of the specified single word terms
+        * last active between end time and until
+        * the specified job states
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilby"
+    :param job_klass: The class representing the main job class for the provided application, ie, BilbyJob or ViterbiJob
+    :param terms: The list of single word terms to filter on. If this is empty all jobs are matched
+    :param end_time: Jobs that have finished or updated up until this time will be considered
+    :param valid_states: An array of job states to filter on
+    :param exclude_ligo_jobs: If jobs which have is_ligo_job=True should be excluded from the search
+    :param until: Jobs that have finished or updated after this time are not considered, unless this is None
+
+    :return: A list of job IDs representing the matched jobs
+    """
+    search_query = prepare_search(application, terms, end_time, valid_states, exclude_ligo_jobs, until)
+    if search_query is None:
+        return []
+
+    # Process the query for all terms
+    qs = job_klass.objects.using(application).raw(*search_query)
+
+    # Convert the query to a list of Job IDs and return
+    return [job.id for job in qs]
+
+
 def job_search_single_term(application, job_klass, term, end_time, valid_states, exclude_ligo_jobs):
     """
     Performs a database search for all jobs matching:-
@@ -86,131 +986,70 @@ def job_search_single_term(application, job_klass, term, end_time, valid_states,
 
     :return: A list of job IDs representing the matched jobs
     """
-    # Get the correct job model name and SQL query for bilby
-    sql_query = sql_term_search
-    job_model_name = application
-    if application == 'bilbyui':
-        job_model_name = 'bilby'
-        sql_query = db_search.utils.isms.bilby.sql_term_search
+    return job_search_terms(application, job_klass, [term], end_time, valid_states, exclude_ligo_jobs)
 
-    # We need to use the correct database names for testing
-    if settings.TESTING:
-        db_dict = \
-            {
-                'auth_database': settings.DATABASES['gwauth']['TEST']['NAME'],
-                'jobcontroller_database': settings.DATABASES['jobserver']['TEST']['NAME'],
-                'job_table': settings.DATABASES[application]['TEST']['NAME'] + f'.{application}_{job_model_name}job',
-                'label_table': settings.DATABASES[application]['TEST']['NAME'] + f'.{application}_label',
-                'job_label_table':
-                    settings.DATABASES[application]['TEST']['NAME'] + f'.{application}_{job_model_name}job_labels',
-                'event_id_table':
-                    settings.DATABASES[application]['TEST']['NAME'] + f'.{application}_eventid',
-                'application': application,
-                'job_model_name': job_model_name
-            }
-
-    else:
-        db_dict = \
-            {
-                'auth_database': settings.DATABASES['gwauth']['NAME'],
-                'jobcontroller_database': settings.DATABASES['jobserver']['NAME'],
-                'job_table': settings.DATABASES[application]['NAME'] + f'.{application}_{job_model_name}job',
-                'label_table': settings.DATABASES[application]['NAME'] + f'.{application}_label',
-                'job_label_table':
-                    settings.DATABASES[application]['NAME'] + f'.{application}_{job_model_name}job_labels',
-                'event_id_table':
-                    settings.DATABASES[application]['NAME'] + f'.{application}_eventid',
-                'application': application,
-                'job_model_name': job_model_name
-            }
-
-    # Format the database query
-    sql_term_search_prepared = sql_query.format_map(db_dict)
-
-    # Process the query for this term
-    qs = job_klass.objects.using(application).raw(
-        sql_term_search_prepared,
-        {
-            'term': f'%{term}%',
-            'end_time': end_time,
-            'valid_states': valid_states,
-            'application': application,
-            'ligo_job_states': (False,) if exclude_ligo_jobs else (True, False)
-        }
-    )
 
-    # Convert the query to a list of Job IDs and return
-    return [job.id for job in qs]
+def get_job_fields(job_klass, fields):
+    """
+    Gets the job fields to load from the database for a set of requested fields
 
+    :param job_klass: The class representing the main job class for the provided application, ie, BilbyJob or ViterbiJob
+    :param fields: The names of the requested job fields, or None if every field is requested
 
-def job_search(application, terms, end_time, order_by, first, count, exclude_ligo_jobs):
+    :return: A list of the names of the job fields to load, or None if every field should be loaded
     """
-    Searches for jobs by a list of terms
+    if fields is None:
+        return None
 
-    :param application: The application to perform the search on, ie, "viterbi" or "bilby"
-    :param terms: The list of terms to search on
-    :param end_time: Jobs that have finished after this time
-    :param order_by: Order by field
-    :param first: Result start offset
-    :param count: Number of results to return
-    :param exclude_ligo_jobs: If this is True then all real data jobs run by LIGO users which aren't using GWOSC
-    channels are excluded from the search
+    job_fields = list(required_job_fields)
+    for name in fields:
+        try:
+            field = job_klass._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Fields such as __typename aren't stored on the job
+            continue
 
-    :return: A list of job "objects" that contain information about the matched jobs
+        # Many to many and reverse relations are loaded by their own queries
+        if field.concrete and not field.many_to_many and name not in job_fields:
+            job_fields.append(name)
+
+    return job_fields
+
+
+def search_page_queryset(application, job_klass, terms, end_time, states, first, count, exclude_ligo_jobs, after,
+                         fields=None, until=None):
     """
+    Builds the query for a page of jobs matching a search. The parameters are the same as for job_search, except that
+    fields is a list of the job fields to load (See get_job_fields).
 
-    # Always include completed or running jobs
-    states = [
-        # A job is pending if it is currently waiting for a cluster to submit the job to
-        # (ie, all available clusters are offline)
-        JobStatus.PENDING,
-        # A job is submitting if the job has been submitted but is waiting for the client to acknowledge it has received
-        # the job submission command
-        JobStatus.SUBMITTING,
-        # A job is submitted if it is submitted on a cluster
-        JobStatus.SUBMITTED,
-        # A job is queued if it is in the queue on the cluster it is to run on
-        JobStatus.QUEUED,
-        # A job is running if it is currently running on the cluster it is to run on
-        JobStatus.RUNNING,
-        # A job is completed if it is finished running on the cluster without error
-        JobStatus.COMPLETED
-    ]
+    :return: A queryset of the jobs on the requested page, ordered from newest to oldest
+    """
+    # Find the jobs that match every term (or all jobs if there are no terms). This is a subquery of the query for the
+    # requested page of jobs, so the ordering and range are applied by the database and only the page is returned
+    search_query = prepare_search(application, terms, end_time, states, exclude_ligo_jobs, until)
+    if search_query is None:
+        return job_klass.objects.using(application).none()
 
-    # Get the job class
-    job_klass = None
-    if application == 'bilbyui':
-        job_klass = BilbyJob
-    elif application == 'viterbi':
-        job_klass = ViterbiJob
-
-    # Prevent "use before define" warning
-    jobs = None
-
-    if len(terms):
-        # Iterate over the terms
-        for idx, term in enumerate(terms):
-            if idx == 0:
-                # If this is the first term, create the initial set of job ids
-                jobs = set(job_search_single_term(application, job_klass, term, end_time, states, exclude_ligo_jobs))
-            else:
-                # Otherwise intersect the set of job ids, such that the new term is contained in the results from the
-                # previous search. (Every term must exist in each result)
-                jobs = jobs.intersection(job_search_single_term(application, job_klass, term, end_time, states,
-                                                                exclude_ligo_jobs))
-    else:
-        # If there are no terms, this query will be used which returns all jobs
-        jobs = job_search_single_term(application, job_klass, '', end_time, states, exclude_ligo_jobs)
+    search_query = RawSQL(*to_positional_params(*search_query))
+    jobs = job_klass.objects.using(application).filter(id__in=search_query)
 
-    # Next we filter by range count
-    jobs = job_klass.objects.using(application).filter(id__in=jobs)
+    # Only load the requested fields
+    if fields is not None:
+        jobs = jobs.only(*fields)
 
     if job_klass is BilbyJob and exclude_ligo_jobs:
         # Checking that EMBARGO_START_TIME is not None shouldn't be necessary, it should be handled by exclude_ligo_jobs
         jobs = qs_embargo_filter(jobs) if settings.EMBARGO_START_TIME is not None else jobs
 
-    # Sort the jobs by their creation time
-    jobs = jobs.order_by('-creation_time')
+    # Skip to the jobs following the provided job
+    if after:
+        after_creation_time, after_id = after
+        jobs = jobs.filter(
+            Q(creation_time__lt=after_creation_time) | Q(creation_time=after_creation_time, id__lt=after_id)
+        )
+
+    # Sort the jobs by their creation time, using the id to give jobs created at the same time a stable order
+    jobs = jobs.order_by('-creation_time', '-id')
 
     if first:
         jobs = jobs[first:]
@@ -218,8 +1057,193 @@ def job_search(application, terms, end_time, order_by, first, count, exclude_lig
     if count:
         jobs = jobs[:count]
 
-    # Generate a set of job controller job ids to look up histories for
-    job_controller_ids = set([job.job_controller_id for job in jobs])
+    return jobs
+
+
+def get_search_watermark(application, job_klass):
+    """
+    Gets a value that changes whenever a job or job history entry is added, so cached search results can be discarded
+    when they may be out of date. The job history is append only, so the newest entry is found from the primary key
+    index rather than needing to scan for the greatest timestamp.
+
+    :param application: The application being searched, ie, "viterbi" or "bilbyui"
+    :param job_klass: The class representing the main job class for the provided application, ie, BilbyJob or ViterbiJob
+
+    :return: A tuple of the id and timestamp of the newest job history entry and the greatest job id
+    """
+    history = JobHistory.objects.using('jobserver').order_by('-id').values_list('id', 'timestamp').first()
+    job_id = job_klass.objects.using(application).order_by('-id').values_list('id', flat=True).first()
+
+    return history, job_id
+
+
+def get_recent_search_watermark(application, job_klass):
+    """
+    Gets the search watermark, reading it from the database at most once every SEARCH_CACHE_WATERMARK_TTL seconds per
+    process rather than before every cache lookup. Results stored against an older watermark are only discarded sooner,
+    but cached results may still be served for up to SEARCH_CACHE_WATERMARK_TTL seconds after a job or job history
+    entry is added. The parameters are the same as for get_search_watermark.
+
+    :return: The search watermark
+    """
+    key = (application, connections[application].settings_dict['NAME'])
+
+    with _search_watermarks_lock:
+        read = _search_watermarks.get(key)
+
+    if read is not None:
+        watermark, read_at = read
+        if time.monotonic() - read_at < settings.SEARCH_CACHE_WATERMARK_TTL:
+            return watermark
+
+    with observe_stage('watermark', application):
+        watermark = get_search_watermark(application, job_klass)
+
+    with _search_watermarks_lock:
+        _search_watermarks[key] = (watermark, time.monotonic())
+
+    return watermark
+
+
+@receiver(setting_changed)
+def reset_search_watermarks(setting, **kwargs):
+    """
+    Reads the search watermarks again when the databases or the search cache settings change
+    """
+    if setting == 'DATABASES' or setting.startswith('SEARCH_CACHE_'):
+        with _search_watermarks_lock:
+            _search_watermarks.clear()
+
+
+def get_search_page_jobs(application, job_klass, *args):
+    """
+    Runs the query for a page of jobs matching a search. The parameters are the same as for search_page_queryset.
+
+    :return: A list of the jobs on the requested page, ordered from newest to oldest
+    """
+    # The terms, job state, embargo and range are all applied by this one query
+    with observe_stage('search', application):
+        jobs = list(search_page_queryset(application, job_klass, *args))
+
+    count_rows('search', application, len(jobs))
+    return jobs
+
+
+def get_search_page(application, job_klass, terms, end_time, states, first, count, exclude_ligo_jobs, after,
+                    fields=None, until=None):
+    """
+    Gets a page of jobs matching a search, using the search result cache if it is enabled. The parameters are the same
+    as for search_page_queryset.
+
+    :return: A list of the jobs on the requested page, ordered from newest to oldest
+    """
+    search_args = (states, first, count, exclude_ligo_jobs, after, fields, until)
+
+    cache = get_search_cache()
+    if cache is None:
+        return get_search_page_jobs(application, job_klass, terms, end_time, *search_args)
+
+    # The order of the terms doesn't change the results. The search engines match terms differently (ie, the full text
+    # engines match whole words), so results found by each engine are kept apart
+    key = (
+        application,
+        tuple(sorted({term.lower() for term in terms})),
+        end_time,
+        until,
+        tuple(states),
+        exclude_ligo_jobs,
+        settings.EMBARGO_START_TIME,
+        settings.SEARCH_ENGINE,
+        first,
+        count,
+        after
+    )
+
+    # The watermark must be read before the search is done, so that results are never stored against a watermark newer
+    # than the data they were found from
+    watermark = get_recent_search_watermark(application, job_klass)
+
+    cached = cache.get(key)
+    if cached is not None and cached['watermark'] == watermark:
+        CACHE_LOOKUPS.labels(application, 'hit').inc()
+
+        with observe_stage('cache', application):
+            # The jobs are checked again in case they have been made private, or moved in to the embargo, since the
+            # results were cached
+            jobs = job_klass.objects.using(application).filter(private=False)
+            if exclude_ligo_jobs:
+                jobs = jobs.filter(is_ligo_job=False)
+
+                if job_klass is BilbyJob and settings.EMBARGO_START_TIME is not None:
+                    jobs = qs_embargo_filter(jobs)
+
+            jobs = (jobs.only(*fields) if fields is not None else jobs).in_bulk(cached['job_ids'])
+
+        count_rows('cache', application, len(jobs))
+        return [jobs[job_id] for job_id in cached['job_ids'] if job_id in jobs]
+
+    CACHE_LOOKUPS.labels(application, 'miss' if cached is None else 'stale').inc()
+
+    jobs = get_search_page_jobs(application, job_klass, terms, end_time, *search_args)
+
+    cache.set(key, {'watermark': watermark, 'job_ids': [job.id for job in jobs]})
+
+    return jobs
+
+
+def get_job_histories(job_controller_ids, history_limit, application):
+    """
+    Gets the newest job history entries for a set of job controller jobs
+
+    :param job_controller_ids: The ids of the job controller jobs to get the history of. None may be included for jobs
+    that have no job controller job
+    :param history_limit: The number of entries to get for each job. If this is None or 0 every entry is returned
+    :param application: The application the jobs belong to, used to label metrics
+
+    :return: A dictionary of job controller job id -> list of job history entries, ordered from newest to oldest
+    """
+    histories = {job_id: [] for job_id in job_controller_ids}
+    job_controller_ids = [job_id for job_id in job_controller_ids if job_id is not None]
+
+    if not job_controller_ids:
+        return histories
+
+    ordering = ('-timestamp', '-id')
+    queryset = JobHistory.objects.using('jobserver').order_by(*ordering)
+
+    if history_limit:
+        # Fetch only the newest entries of each job in a single query, as a UNION ALL of one limited query per job. Each
+        # of these is resolved with the job id index rather than reading the full history of the job
+        per_job = [queryset.filter(job_id=job_id)[:history_limit] for job_id in job_controller_ids]
+        queryset = per_job[0].union(*per_job[1:], all=True) if len(per_job) > 1 else per_job[0]
+
+        # The order of the combined rows is not defined, so they are sorted here
+        with observe_stage('histories', application):
+            tmp_histories = sorted(queryset, key=lambda history: (history.timestamp, history.id), reverse=True)
+    else:
+        with observe_stage('histories', application):
+            tmp_histories = list(queryset.filter(job_id__in=job_controller_ids))
+
+    count_rows('histories', application, len(tmp_histories))
+
+    # Organise the job histories by job id
+    for history in tmp_histories:
+        histories[history.job_id].append(history)
+
+    return histories
+
+
+def get_job_users(jobs, application):
+    """
+    Gets the users that own a list of jobs
+
+    :param jobs: The list of jobs
+    :param application: The application the jobs belong to, used to label metrics
+
+    :return: A dictionary of user id -> user
+    """
+    if not jobs:
+        return {}
 
     # Get the list of user ids to fetch
     users = set()
@@ -227,25 +1251,186 @@ def job_search(application, terms, end_time, order_by, first, count, exclude_lig
         users.add(job.user_id)
 
     # Get users and add them to a dictionary by user id
-    users = GWCloudUser.objects.using('gwauth').filter(id__in=users)
-    users = {user.id: user for user in users}
+    with observe_stage('users', application):
+        users = list(GWCloudUser.objects.using('gwauth').filter(id__in=users))
 
-    # Get the job histories for the jobs found
-    tmp_histories = JobHistory.objects.using('jobserver').filter(job_id__in=job_controller_ids).order_by('-timestamp')
+    count_rows('users', application, len(users))
+    return {user.id: user for user in users}
 
-    # Organise the job histories by job id
-    histories = {job_id: [] for job_id in job_controller_ids}
 
-    for history in tmp_histories:
-        histories[history.job_id].append(history)
+def compile_results(jobs, users, histories):
+    """
+    Compiles the job "objects" returned by a search
 
-    # Compile the results
+    :param jobs: The list of jobs found
+    :param users: A dictionary of user id -> user, or None if the users weren't looked up
+    :param histories: A dictionary of job controller job id -> job history entries, or None if the histories weren't
+    looked up
+
+    :return: A list of job "objects", one for each job
+    """
     result = []
     for job in jobs:
         result.append({
-            'user': users[job.user_id],
-            'history': histories[job.job_controller_id],
+            'user': users[job.user_id] if users is not None else None,
+            'history': histories[job.job_controller_id] if histories is not None else None,
             'job': job
         })
 
     return result
+
+
+def hydrate_jobs(application, jobs, history_limit, include_user, include_history, concurrent=False):
+    """
+    Looks up the users and histories of a list of jobs. The parameters are the same as for job_search.
+
+    :return: A list of job "objects" that contain information about the jobs
+    """
+    calls = []
+    if include_user:
+        calls.append((get_job_users, jobs, application))
+
+    if include_history:
+        # Get the job histories for the jobs found
+        calls.append((get_job_histories, set([job.job_controller_id for job in jobs]), history_limit, application))
+
+    if concurrent:
+        hydrated = run_concurrently(*calls)
+    else:
+        hydrated = [func(*args) for func, *args in calls]
+
+    users = hydrated.pop(0) if include_user else None
+    histories = hydrated.pop(0) if include_history else None
+
+    return compile_results(jobs, users, histories)
+
+
+def job_search(application, terms, end_time, order_by, first, count, exclude_ligo_jobs, after=None, history_limit=None,
+               job_fields=None, include_user=True, include_history=True, until=None, concurrent=False):
+    """
+    Searches for jobs by a list of terms. Results are ordered from newest to oldest by creation time, then id
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilby"
+    :param terms: The list of terms to search on
+    :param end_time: Jobs that have finished or updated since this time. If this is None jobs are found no matter how
+    long ago they were last active, and the job history isn't joined by the search
+    :param order_by: Order by field
+    :param first: Result start offset
+    :param count: Number of results to return
+    :param exclude_ligo_jobs: If this is True then all real data jobs run by LIGO users which aren't using GWOSC
+    channels are excluded from the search
+    :param after: An optional (creation time, id) tuple of a job. Only jobs that come after this job in the results
+    are returned, which allows the database to seek directly to a page of results (See db_search.utils.cursor)
+    :param history_limit: The number of job history entries to return for each job, newest first. If this is None or 0
+    the full history is returned
+    :param job_fields: The names of the job fields that are needed. Only these fields (and those needed to order the
+    results) are loaded from the database. If this is None the complete jobs are loaded
+    :param include_user: If this is False the users of the jobs aren't looked up, and the user of each result is None
+    :param include_history: If this is False the job histories aren't looked up, and the history of each result is None
+    :param until: Jobs that have finished or updated after this time aren't found. If this is None jobs are found no
+    matter how recently they were last active
+    :param concurrent: If this is True the users and job histories are looked up at the same time on the search thread
+    pool (See db_search.utils.concurrency)
+
+    :return: A list of job "objects" that contain information about the matched jobs
+    """
+
+    # Get the job class
+    job_klass = job_klasses.get(application)
+
+    # Get the requested page of jobs
+    fields = get_job_fields(job_klass, job_fields)
+    jobs = get_search_page(
+        application, job_klass, terms, end_time, search_states, first, count, exclude_ligo_jobs, after, fields, until
+    )
+
+    return hydrate_jobs(application, jobs, history_limit, include_user, include_history, concurrent)
+
+
+async def job_search_async(application, terms, end_time, order_by, first, count, exclude_ligo_jobs, after=None,
+                           history_limit=None, job_fields=None, include_user=True, include_history=True, until=None):
+    """
+    Searches for jobs by a list of terms without blocking the event loop. Each database query runs on a worker thread,
+    and the user and job history lookups run concurrently once the page of jobs is known. The parameters and results are
+    the same as for job_search.
+    """
+    # Get the job class
+    job_klass = job_klasses.get(application)
+
+    # Get the requested page of jobs. Every term is matched by the single page query (See compile_search)
+    fields = get_job_fields(job_klass, job_fields)
+    jobs = await run_in_thread(
+        get_search_page,
+        application, job_klass, terms, end_time, search_states, first, count, exclude_ligo_jobs, after, fields, until
+    )
+
+    async def get_users():
+        return await run_in_thread(get_job_users, jobs, application) if include_user else None
+
+    async def get_histories():
+        if not include_history:
+            return None
+
+        job_controller_ids = set([job.job_controller_id for job in jobs])
+        return await run_in_thread(get_job_histories, job_controller_ids, history_limit, application)
+
+    users, histories = await asyncio.gather(get_users(), get_histories())
+
+    return compile_results(jobs, users, histories)
+
+
+def public_job_search(applications, terms, end_time, first, count, exclude_ligo_jobs, history_limit=None,
+                      job_fields=None, include_user=True, include_history=True, until=None):
+    """
+    Searches for jobs in several applications at once, returning a single page of the jobs from every application. The
+    search of each application runs concurrently on the search thread pool (See db_search.utils.concurrency), followed
+    by the user and history lookups for the jobs on the page, so a search takes about as long as the slowest application
+    rather than the total of every application.
+
+    :param applications: The list of applications to search, ie, ["bilbyui", "viterbi"]
+
+    The other parameters are the same as for job_search.
+
+    :return: A list of job "objects" that contain information about the matched jobs, ordered from newest to oldest by
+    creation time, then id. Each object also contains the application the job belongs to
+    """
+    applications = list(dict.fromkeys(applications))
+    first = first or 0
+
+    # Each application must return every job up to the end of the page, as any of them could be on the merged page
+    limit = first + count if count else 0
+
+    calls = []
+    for application in applications:
+        job_klass = job_klasses[application]
+        fields = get_job_fields(job_klass, job_fields)
+        calls.append((
+            get_search_page,
+            application, job_klass, terms, end_time, search_states, 0, limit, exclude_ligo_jobs, None, fields, until
+        ))
+
+    pages = run_concurrently(*calls)
+
+    # Merge the pages of each application into a single page
+    jobs = sorted(
+        (
+            (application, job)
+            for application, page in zip(applications, pages)
+            for job in page
+        ),
+        key=lambda item: (item[1].creation_time, item[1].id, item[0]),
+        reverse=True
+    )
+
+    jobs = jobs[first:limit] if limit else jobs[first:]
+    job_applications = [application for application, _ in jobs]
+    jobs = [job for _, job in jobs]
+
+    # The users and job histories of every application are stored together, so they are looked up in a single batch
+    # for the whole page. The metrics of the lookups are labelled with every application searched
+    label = ','.join(sorted(applications))
+    results = hydrate_jobs(label, jobs, history_limit, include_user, include_history, concurrent=True)
+    for application, result in zip(job_applications, results):
+        result['application'] = application
+
+    return results
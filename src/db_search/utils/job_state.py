@@ -0,0 +1,217 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections, transaction
+from django.dispatch import receiver
+from django.db.models import Max
+from jobserver.models import JobHistory
+
+from db_search.models import JobState
+from db_search.utils.locks import named_lock
+
+# The number of job history entries to apply at a time
+JOB_STATE_BATCH_SIZE = 5000
+
+# The number of job history ids below the watermark that are applied again by each update. Ids are allocated when an
+# entry is inserted rather than when it is committed, so an entry can become visible after entries with greater ids
+# have already been applied.
+JOB_STATE_LOOKBACK = 1000
+
+# The number of seconds before a job state table found to be empty is checked again
+JOB_STATE_RECHECK_INTERVAL = 60
+
+# If the job state table has been built, and when it was checked, by database name (See job_states_ready)
+_ready = {}
+_ready_lock = threading.Lock()
+
+
+def apply_job_histories(histories, replace=()):
+    """
+    Applies a batch of job history entries to the job state table
+
+    :param histories: A list of job history value dictionaries, with the keys id, job_id, job__application, state and
+    timestamp, ordered by id
+    :param replace: The ids of the jobs whose current states are replaced by the newest entry in this batch rather than
+    updated by it (See update_job_states)
+    """
+    # Find the newest entry for each job in this batch. Entries with the same timestamp are ordered by id
+    latest = {}
+    last_history_ids = {}
+    for history in histories:
+        current = latest.get(history['job_id'])
+        if current is None or history['timestamp'] >= current['timestamp']:
+            latest[history['job_id']] = history
+
+        last_history_ids[history['job_id']] = history['id']
+
+    existing = JobState.objects.using('db_search').in_bulk(list(latest.keys()))
+
+    created = []
+    updated = []
+    for job_id, history in latest.items():
+        job_state = existing.get(job_id)
+        if job_state is None:
+            created.append(
+                JobState(
+                    job_id=job_id,
+                    application=history['job__application'],
+                    state=history['state'],
+                    timestamp=history['timestamp'],
+                    last_history_id=last_history_ids[job_id]
+                )
+            )
+            continue
+
+        if job_id in replace:
+            job_state.application = history['job__application']
+            job_state.state = history['state']
+            job_state.timestamp = history['timestamp']
+            job_state.last_history_id = last_history_ids[job_id]
+            updated.append(job_state)
+            continue
+
+        # Entries that are older than the job's current state are still recorded as applied. Entries within the
+        # lookback are applied again, so an entry with the same timestamp only replaces the state if it is newer
+        if history['timestamp'] > job_state.timestamp or (
+            history['timestamp'] == job_state.timestamp and history['id'] >= job_state.last_history_id
+        ):
+            job_state.state = history['state']
+            job_state.timestamp = history['timestamp']
+
+        job_state.last_history_id = max(job_state.last_history_id, last_history_ids[job_id])
+        updated.append(job_state)
+
+    with transaction.atomic(using='db_search'):
+        JobState.objects.using('db_search').bulk_create(created)
+        JobState.objects.using('db_search').bulk_update(
+            updated, ['application', 'state', 'timestamp', 'last_history_id']
+        )
+
+
+def update_job_states(rebuild=False, batch_size=JOB_STATE_BATCH_SIZE):
+    """
+    Applies any job history entries that have been added since the job state table was last updated. The last
+    JOB_STATE_LOOKBACK entries that were already applied are applied again, to pick up entries that were committed
+    after entries with greater ids.
+
+    :param rebuild: If the job state table should be rebuilt from the full job history. This is needed if job history
+    entries are ever modified or deleted, since otherwise only new entries are applied. The table is rebuilt in place,
+    so searches keep using it while it is rebuilt: the state of each job is replaced by the first batch of entries
+    that has the job, and the states of jobs with no entries left are removed once every entry has been applied
+    :param batch_size: The number of job history entries to apply at a time
+
+    :return: The number of new job history entries applied (every entry if rebuilding), or None if another process is
+    already updating the job states
+    """
+    with named_lock('db_search_job_state') as acquired:
+        if not acquired:
+            return None
+
+        if rebuild:
+            watermark = 0
+        else:
+            watermark = (
+                JobState.objects.using('db_search').aggregate(Max('last_history_id'))['last_history_id__max'] or 0
+            )
+
+        # The jobs found so far by a rebuild
+        rebuilt = set()
+
+        count = 0
+        position = max(watermark - JOB_STATE_LOOKBACK, 0)
+        while True:
+            histories = list(
+                JobHistory.objects.using('jobserver')
+                .filter(id__gt=position)
+                .order_by('id')
+                .values('id', 'job_id', 'job__application', 'state', 'timestamp')[:batch_size]
+            )
+
+            if not histories:
+                break
+
+            replace = ()
+            if rebuild:
+                replace = set(history['job_id'] for history in histories) - rebuilt
+                rebuilt.update(replace)
+
+            apply_job_histories(histories, replace)
+
+            position = histories[-1]['id']
+            count += sum(1 for history in histories if history['id'] > watermark)
+
+        if rebuild:
+            remove_stale_job_states(rebuilt, batch_size)
+
+    clear_job_states_ready()
+    return count
+
+
+def remove_stale_job_states(job_ids, batch_size=JOB_STATE_BATCH_SIZE):
+    """
+    Removes the states of jobs that no longer have any job history entries
+
+    :param job_ids: The set of ids of every job that has job history entries
+    :param batch_size: The number of job states to remove at a time
+    """
+    stale = [
+        job_id
+        for job_id in JobState.objects.using('db_search').values_list('job_id', flat=True).iterator()
+        if job_id not in job_ids
+    ]
+
+    for idx in range(0, len(stale), batch_size):
+        JobState.objects.using('db_search').filter(job_id__in=stale[idx:idx + batch_size]).delete()
+
+
+def job_states_ready():
+    """
+    Checks if the job state table has been built by the update_job_states management command or the sync thread. The
+    result is remembered once the table has been built. Otherwise the table is checked again after
+    JOB_STATE_RECHECK_INTERVAL seconds, so that a table built by another process is picked up.
+
+    :return: True if the job state table has any job states
+    """
+    key = connections['db_search'].settings_dict['NAME']
+
+    with _ready_lock:
+        checked = _ready.get(key)
+
+    if checked is not None:
+        ready, checked_at = checked
+        if ready or time.monotonic() - checked_at < JOB_STATE_RECHECK_INTERVAL:
+            return ready
+
+    ready = JobState.objects.using('db_search').exists()
+
+    with _ready_lock:
+        _ready[key] = (ready, time.monotonic())
+
+    return ready
+
+
+def clear_job_states_ready():
+    with _ready_lock:
+        _ready.clear()
+
+
+@receiver(setting_changed)
+def reset_job_states_ready(setting, **kwargs):
+    """
+    Checks the job state table again when the databases change
+    """
+    if setting == 'DATABASES':
+        clear_job_states_ready()
+
+
+def use_job_state_table():
+    """
+    Checks if searches should filter on job state using the job state table. Searches use the job history until the
+    table has been built, since building it from the full job history is too slow to do during a search. The table is
+    kept up to date by the sync thread or the update_job_states management command, never by a search.
+
+    :return: True if SEARCH_JOB_STATE_TABLE is enabled and the job state table has been built
+    """
+    return settings.SEARCH_JOB_STATE_TABLE and job_states_ready()
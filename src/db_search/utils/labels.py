@@ -0,0 +1,80 @@
+"""
+An in-process dictionary of the label names of each application, so that search terms are matched against label names
+in Python rather than by a subquery on the label table in every term filter. The label tables only hold a few dozen
+labels, so each process loads them all, and loads them again every SEARCH_LABEL_REFRESH_INTERVAL seconds to pick up
+new and renamed labels.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+from db_search.utils.names import like_regex
+from db_search.utils.ngram import normalise
+
+# The ids and normalised names of the labels of each application, and when they were loaded, by application and
+# database name (See get_label_names)
+_labels = {}
+_labels_lock = threading.Lock()
+
+
+def get_label_names(application, job_klass, refresh=False):
+    """
+    Gets the labels of an application from the label dictionary, loading them if they haven't been loaded in the last
+    SEARCH_LABEL_REFRESH_INTERVAL seconds
+
+    :param application: The application, ie, "viterbi" or "bilbyui"
+    :param job_klass: The class representing the main job class for the application, ie, BilbyJob or ViterbiJob
+    :param refresh: If the labels should be loaded again now
+
+    :return: A list of (label id, normalised label name) tuples
+    """
+    key = (application, connections[application].settings_dict['NAME'])
+
+    with _labels_lock:
+        loaded = _labels.get(key)
+
+    if loaded is not None and not refresh and time.monotonic() - loaded[1] < settings.SEARCH_LABEL_REFRESH_INTERVAL:
+        return loaded[0]
+
+    label_klass = job_klass.labels.field.related_model
+    labels = [
+        (label_id, normalise(name))
+        for label_id, name in label_klass.objects.using(application).values_list('id', 'name')
+    ]
+
+    with _labels_lock:
+        _labels[key] = (labels, time.monotonic())
+
+    return labels
+
+
+def match_labels(application, job_klass, term):
+    """
+    Finds the labels whose names contain a search term, as name LIKE '%term%' would
+
+    :param application: The application, ie, "viterbi" or "bilbyui"
+    :param job_klass: The class representing the main job class for the application, ie, BilbyJob or ViterbiJob
+    :param term: The single word search term
+
+    :return: A sorted list of the ids of the matching labels
+    """
+    regex = like_regex(f'%{term}%')
+    return sorted(label_id for label_id, name in get_label_names(application, job_klass) if regex.fullmatch(name))
+
+
+def clear_label_names():
+    with _labels_lock:
+        _labels.clear()
+
+
+@receiver(setting_changed)
+def reset_label_names(setting, **kwargs):
+    """
+    Loads the labels again when the databases change
+    """
+    if setting == 'DATABASES':
+        clear_label_names()
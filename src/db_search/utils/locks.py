@@ -0,0 +1,52 @@
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+@contextmanager
+def named_lock(name, using='db_search'):
+    """
+    Attempts to take a MySQL named lock without waiting, so that work that should only be done by one process at a time
+    (such as updating a db_search owned table) can be skipped by other processes while it is in progress
+
+    :param name: The name of the lock
+    :param using: The database alias to take the lock on
+
+    :return: A context manager that yields True if the lock was acquired, otherwise False
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT GET_LOCK(%s, 0)", [name])
+        acquired = cursor.fetchone()[0] == 1
+
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", [name])
+
+
+@contextmanager
+def file_lock(name):
+    """
+    Attempts to take a lock on a file in the temporary directory without waiting, so that work that should only be done
+    by one process on this server at a time (such as updating a local SQLite database) can be skipped by other
+    processes while it is in progress
+
+    :param name: The name of the lock, which is used as the name of the lock file
+
+    :return: A context manager that yields True if the lock was acquired, otherwise False
+    """
+    with open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,210 @@
+"""
+Search metrics, served in the Prometheus text format by the /metrics view (See db_search.views.metrics).
+
+The metrics are kept with prometheus_client. When the PROMETHEUS_MULTIPROC_DIR environment variable is set before the
+application is loaded (See gunicorn.conf), every process writes its metrics to files in the directory, and the /metrics
+view reports the metrics of every process, so a scrape of any gunicorn worker reports every worker. The directory must
+be emptied before the server starts, and the live gauges of each worker are removed when it exits.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+
+from db_search.db.pool import get_pool_metrics
+
+QUERY_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 30, 50)
+
+# The number of database queries made while handling the current request (See count_queries)
+_request_queries = contextvars.ContextVar('request_queries', default=None)
+
+# The pool counts last added to the pool counters, by database alias and metric (See update_pool_metrics)
+_pool_counts = {}
+_pool_counts_lock = threading.Lock()
+
+STAGE_SECONDS = Histogram(
+    'db_search_stage_seconds',
+    'The time taken by each stage of a search',
+    ['stage', 'application']
+)
+
+STAGE_ROWS = Counter(
+    'db_search_stage_rows',
+    'The number of rows returned by each stage of a search',
+    ['stage', 'application']
+)
+
+CACHE_LOOKUPS = Counter(
+    'db_search_cache_lookups',
+    'The number of search result cache lookups, by result (hit, miss or stale)',
+    ['application', 'result']
+)
+
+QUERIES = Counter(
+    'db_search_queries',
+    'The number of database queries made, by database alias',
+    ['alias']
+)
+
+REQUEST_SECONDS = Histogram(
+    'db_search_request_seconds',
+    'The time taken to handle each request'
+)
+
+REQUEST_QUERIES = Histogram(
+    'db_search_request_queries',
+    'The number of database queries made while handling each request',
+    buckets=QUERY_BUCKETS
+)
+
+# The connection pool metrics that can go up and down. The values of every live process are summed
+POOL_GAUGES = {
+    metric: Gauge(f'db_search_db_pool_{metric}', documentation, ['alias'], multiprocess_mode='livesum')
+    for metric, documentation in [
+        ('in_use', 'The number of pooled connections checked out'),
+        ('idle', 'The number of idle pooled connections')
+    ]
+}
+
+# The connection pool metrics that only go up
+POOL_COUNTERS = {
+    metric: Counter(f'db_search_db_pool_{metric}', documentation, ['alias'])
+    for metric, documentation in [
+        ('checkouts', 'The number of connections checked out of the pool'),
+        ('created', 'The number of connections opened by the pool'),
+        ('waits', 'The number of checkouts that waited for a connection'),
+        ('wait_seconds', 'The total time checkouts have waited for a connection'),
+        ('timeouts', 'The number of checkouts that timed out waiting for a connection'),
+        ('evicted', 'The number of idle connections closed by the pool'),
+        ('failed_checks', 'The number of idle connections that failed their health check')
+    ]
+}
+
+
+@contextmanager
+def observe_stage(stage, application):
+    """
+    Records the time taken by a stage of a search
+
+    :param stage: The name of the stage, ie, "search" or "users"
+    :param application: The application being searched
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage, application).observe(time.perf_counter() - started)
+
+
+def count_rows(stage, application, rows):
+    """
+    Records the number of rows returned by a stage of a search
+    """
+    STAGE_ROWS.labels(stage, application).inc(rows)
+
+
+def update_pool_metrics():
+    """
+    Copies the metrics of the connection pools of this process to the pool gauges and counters. The pools keep their own
+    counts, so each counter is increased by how much its count has grown since it was last copied. A count that has gone
+    down belongs to a new pool (ie, after a fork), and is added in full.
+    """
+    with _pool_counts_lock:
+        for alias, metrics in get_pool_metrics().items():
+            for metric, gauge in POOL_GAUGES.items():
+                gauge.labels(alias).set(metrics[metric])
+
+            for metric, counter in POOL_COUNTERS.items():
+                last = _pool_counts.get((alias, metric), 0)
+                value = metrics[metric]
+                counter.labels(alias).inc(value - last if value >= last else value)
+                _pool_counts[(alias, metric)] = value
+
+
+class QueryCount:
+    """
+    A thread safe count of database queries
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def inc(self):
+        with self.lock:
+            self.count += 1
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the database queries made within the block. Queries made on other threads are included as long as they run
+    in a copy of the caller's context (See db_search.utils.concurrency).
+
+    :return: The QueryCount of the block
+    """
+    queries = QueryCount()
+    token = _request_queries.set(queries)
+    try:
+        yield queries
+    finally:
+        _request_queries.reset(token)
+
+
+@contextmanager
+def observe_request():
+    """
+    Records the time taken and the number of database queries made while handling a request
+    """
+    with count_queries() as queries:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started)
+            REQUEST_QUERIES.observe(queries.count)
+
+            # A scrape is only served by one process, so every process copies its pool metrics after each request
+            update_pool_metrics()
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    A database execute wrapper that counts the queries made on each connection
+    """
+    QUERIES.labels(context['connection'].alias).inc()
+
+    queries = _request_queries.get()
+    if queries is not None:
+        queries.inc()
+
+    return execute(sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(connection, **kwargs):
+    # Connection wrappers are reused when they reconnect, so the counter must only be installed once
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def render_metrics():
+    """
+    Renders every metric in the Prometheus text format. When PROMETHEUS_MULTIPROC_DIR is set, the metrics of every
+    process are rendered.
+
+    :return: The metrics text
+    """
+    update_pool_metrics()
+
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
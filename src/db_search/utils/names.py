@@ -0,0 +1,197 @@
+"""
+In-process indexes of the names of small tables that every search term is matched against, such as the first and last
+names of users and the bilby event ids, so that terms are matched in Python rather than by scanning the tables with a
+subquery in every term filter. The matching ids are passed to the search statement instead.
+
+Each index holds the normalised names of every row, along with the rows whose names contain each n-gram (See
+db_search.utils.ngram), so that a term is only checked against the rows whose names contain every n-gram of the term.
+Rows are only ever added to these tables with increasing ids, so new rows are added to an index incrementally, and
+the whole table is only loaded again every so often to pick up changed and deleted rows.
+"""
+import re
+import threading
+import time
+
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+
+from db_search.utils.ngram import normalise, term_ngrams, text_ngrams
+
+# The number of seconds between checks for rows added since an index was loaded
+NEW_ROW_CHECK_INTERVAL = 5
+
+# The name indexes of this process, by index name and database (See get_name_index)
+_name_indexes = {}
+_name_indexes_lock = threading.Lock()
+
+# The locks held while a name index is loaded, by index name and database, so only one thread loads each index at a time
+_name_index_loads = {}
+
+
+def like_regex(pattern):
+    """
+    Converts a LIKE pattern to a regular expression that matches the same normalised text. % matches any number of
+    characters, _ matches a single character and a backslash matches the character after it literally, as in MySQL.
+
+    :param pattern: The LIKE pattern, ie, "%potato%"
+
+    :return: The compiled regular expression, to be used with fullmatch
+    """
+    regex = []
+    escaped = False
+    for character in normalise(pattern):
+        if escaped:
+            regex.append(re.escape(character))
+            escaped = False
+        elif character == '\\':
+            escaped = True
+        elif character == '%':
+            regex.append('.*')
+        elif character == '_':
+            regex.append('.')
+        else:
+            regex.append(re.escape(character))
+
+    # MySQL matches a trailing backslash literally
+    if escaped:
+        regex.append(re.escape('\\'))
+
+    return re.compile(''.join(regex), re.DOTALL)
+
+
+class NameIndex:
+    """
+    The normalised names of a set of rows, and the rows whose names contain each n-gram
+    """
+
+    def __init__(self, rows=()):
+        """
+        :param rows: A list of tuples of the id of each row followed by its names, ie, (user id, first name, last name)
+        """
+        self.names = {}
+        self.ngrams = {}
+        self.max_id = 0
+        self.loaded_at = self.checked_at = time.monotonic()
+
+        # Rows may be added while other threads are matching terms
+        self.lock = threading.Lock()
+
+        self.add(rows)
+
+    def add(self, rows):
+        """
+        Adds rows to the index
+
+        :param rows: A list of tuples of the id of each row followed by its names
+        """
+        with self.lock:
+            for row_id, *names in rows:
+                names = tuple(normalise(name) for name in names)
+                self.names[row_id] = names
+                self.max_id = max(self.max_id, row_id)
+
+                for ngram in set().union(*(text_ngrams(name) for name in names)):
+                    self.ngrams.setdefault(ngram, set()).add(row_id)
+
+    def match(self, term):
+        """
+        Finds the rows with any name that contains a term, as name LIKE '%term%' would
+
+        :return: A sorted list of the ids of the matching rows
+        """
+        regex = like_regex(f'%{term}%')
+
+        with self.lock:
+            # Only rows with every n-gram of the term can match it. Terms too short to have n-grams are checked against
+            # every row
+            ngrams = sorted(term_ngrams(term), key=lambda ngram: len(self.ngrams.get(ngram, ())))
+            row_ids = self.names.keys()
+            if ngrams:
+                row_ids = set(self.ngrams.get(ngrams[0], ()))
+                for ngram in ngrams[1:]:
+                    row_ids &= self.ngrams.get(ngram, set())
+
+            return sorted(
+                row_id for row_id in row_ids if any(regex.fullmatch(name) for name in self.names[row_id])
+            )
+
+
+def get_name_index(name, queryset, fields, refresh_interval, refresh=False):
+    """
+    Gets a name index of a table. Rows added since the index was loaded are added to it every NEW_ROW_CHECK_INTERVAL
+    seconds, and the whole table is loaded again every refresh_interval seconds. Only one thread loads the table at a
+    time, and other threads carry on using the existing index while it does. Threads only wait for the load if there is
+    no index yet, or if refresh is set.
+
+    :param name: The name of the index, ie, "users"
+    :param queryset: The rows of the table to index, ie, GWCloudUser.objects.using('gwauth')
+    :param fields: The names of the fields holding the names of each row
+    :param refresh_interval: The number of seconds before the whole table is loaded again
+    :param refresh: If the whole table should be loaded again now
+
+    :return: The NameIndex
+    """
+    key = (name, connections[queryset.db].settings_dict['NAME'])
+
+    with _name_indexes_lock:
+        index = _name_indexes.get(key)
+        load_lock = _name_index_loads.setdefault(key, threading.Lock())
+
+    if index is None or refresh:
+        with load_lock:
+            # Another thread may have loaded the index while this one waited
+            with _name_indexes_lock:
+                loaded = _name_indexes.get(key)
+
+            if loaded is not None and loaded is not index and not refresh:
+                return loaded
+
+            return load_name_index(key, queryset, fields)
+
+    if time.monotonic() - index.loaded_at >= refresh_interval and load_lock.acquire(blocking=False):
+        try:
+            return load_name_index(key, queryset, fields)
+        finally:
+            load_lock.release()
+
+    with index.lock:
+        now = time.monotonic()
+        check = now - index.checked_at >= NEW_ROW_CHECK_INTERVAL
+        if check:
+            index.checked_at = now
+
+    if check:
+        # Only the rows newer than the newest row in the index are read, which is a primary key range scan
+        index.add(queryset.filter(id__gt=index.max_id).values_list('id', *fields))
+
+    return index
+
+
+def load_name_index(key, queryset, fields):
+    """
+    Loads a name index from the whole of a table, replacing the existing index. The parameters are the same as for
+    get_name_index.
+
+    :return: The NameIndex
+    """
+    index = NameIndex(queryset.values_list('id', *fields))
+
+    with _name_indexes_lock:
+        _name_indexes[key] = index
+
+    return index
+
+
+def clear_name_indexes():
+    with _name_indexes_lock:
+        _name_indexes.clear()
+
+
+@receiver(setting_changed)
+def reset_name_indexes(setting, **kwargs):
+    """
+    Loads the tables again when the databases change
+    """
+    if setting == 'DATABASES':
+        clear_name_indexes()
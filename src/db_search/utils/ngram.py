@@ -0,0 +1,78 @@
+import unicodedata
+
+from django.db import transaction
+
+from db_search.models import SearchNgram
+
+# The length of the n-grams stored in the index
+NGRAM_SIZE = 3
+
+# Characters that have a special meaning in a LIKE pattern. N-grams containing these can't be used to look up the index
+# because the term may match text that does not contain them literally
+LIKE_SPECIAL_CHARACTERS = {'_', '%', '\\'}
+
+
+def normalise(text):
+    """
+    Normalises text so that n-grams compare the same way that the MySQL case and accent insensitive collations compare
+    strings
+
+    :param text: The text to normalise
+    :return: The lower case text with any accents removed
+    """
+    if not text:
+        return ''
+
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def text_ngrams(text):
+    """
+    Generates the set of n-grams that make up a piece of searchable text
+
+    :param text: The text to split in to n-grams
+    :return: A set of all distinct n-grams in the normalised text
+    """
+    text = normalise(text)
+    return {text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1)}
+
+
+def term_ngrams(term):
+    """
+    Generates the set of n-grams that any text matching the search term must contain. N-grams that contain LIKE wildcard
+    characters are skipped since these don't need to be literally present in matching text.
+
+    :param term: The single word search term
+    :return: A set of n-grams to look up in the index. This will be empty if the term is too short to use the index
+    """
+    return {ngram for ngram in text_ngrams(term) if not LIKE_SPECIAL_CHARACTERS.intersection(ngram)}
+
+
+def index_jobs(application, job_klass, job_ids):
+    """
+    Replaces the n-gram index entries for the specified jobs. Only the job names and descriptions are indexed, as the
+    users, labels and event ids that terms match are found from their own in-process indexes (See
+    db_search.utils.job_search.match_term_ids)
+
+    :param application: The application the jobs belong to, ie, "viterbi" or "bilbyui"
+    :param job_klass: The class representing the main job class for the provided application, ie, BilbyJob or ViterbiJob
+    :param job_ids: The ids of the jobs to index. Jobs that no longer exist have their index entries removed
+
+    :return: The number of postings written
+    """
+    jobs = job_klass.objects.using(application).filter(id__in=job_ids).values_list('id', 'name', 'description')
+
+    postings = []
+    for job_id, name, description in jobs:
+        ngrams = text_ngrams(name) | text_ngrams(description)
+        postings += [SearchNgram(application=application, job_id=job_id, ngram=ngram) for ngram in ngrams]
+
+    with transaction.atomic(using='db_search'):
+        SearchNgram.objects.using('db_search').filter(application=application, job_id__in=job_ids).delete()
+
+        # normalise doesn't fold every character the way the collation does (ie, 'ß' compares equal to 's'), so distinct
+        # n-grams of a job can still collide on the unique key. Only one of them needs to be stored
+        SearchNgram.objects.using('db_search').bulk_create(postings, batch_size=5000, ignore_conflicts=True)
+
+    return len(postings)
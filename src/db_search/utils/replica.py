@@ -0,0 +1,364 @@
+"""
+A local SQLite replica of the searchable text of every job, used when SEARCH_ENGINE is "replica". Search terms are
+resolved to job ids from SQLite FTS5 tables in process, so only the final query for the page of jobs (which applies the
+job state, time range and ordering) is made against MySQL.
+
+The replica lives in the SEARCH_REPLICA_DATABASE database, which must be a SQLite database with FTS5 and the trigram
+tokenizer (SQLite 3.34 or newer). The trigram tokenizer lets LIKE patterns use the full text index, so terms match the
+same substrings that the "like" engine matches. Text is normalised before it is stored (See
+db_search.utils.ngram.normalise) so that matches are case and accent insensitive, as with the MySQL collations.
+
+The replica is kept up to date incrementally by the sync thread or the update_search_replica management command (See
+update_replica), never by a search:-
+    * jobs are copied when they are created, or when their last_updated time changes if they have one
+    * job labels are copied when they are added, or when the job changes
+    * users, labels and event ids are small, so they are compared in full and only the rows that were added, changed or
+      deleted are written
+Jobs that are deleted, or labels removed from unchanged jobs, stay in the replica until it is rebuilt. Deleted jobs are
+never returned by searches though, since the page query only finds jobs that still exist. Jobs created since the
+replica was last updated are matched by the search statement itself (See get_replica_job_id).
+
+The replica is a SQLite file local to each server, so updates are serialised with a file lock rather than a database
+lock shared by every server.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from gwauth.models import GWCloudUser
+from bilbyui.models import EventID
+
+from db_search.utils.locks import file_lock
+from db_search.utils.metrics import count_rows, observe_stage
+from db_search.utils.ngram import normalise
+
+# The number of jobs to copy at a time
+REPLICA_BATCH_SIZE = 5000
+
+# The prefix of the replica table names
+REPLICA_TABLE_PREFIX = 'db_search_replica'
+
+
+def get_table(name, application=None):
+    return f'{REPLICA_TABLE_PREFIX}_{application}_{name}' if application else f'{REPLICA_TABLE_PREFIX}_{name}'
+
+
+def get_replica_schema(applications):
+    """
+    Gets the statements that create the replica tables. The full text tables use the id of the row they replicate as
+    their rowid, so rows can be replaced without scanning the table.
+
+    :param applications: The names of the applications to replicate
+
+    :return: A list of SQL statements
+    """
+    statements = [
+        f"CREATE TABLE IF NOT EXISTS {get_table('state')} (name TEXT PRIMARY KEY, value TEXT)",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {get_table('user')} "
+        f"USING fts5(first_name, last_name, tokenize='trigram')",
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {get_table('event_id')} "
+        f"USING fts5(event_id, trigger_id, nickname, tokenize='trigram')"
+    ]
+
+    for application in applications:
+        statements += [
+            f"CREATE TABLE IF NOT EXISTS {get_table('job', application)} "
+            f"(job_id INTEGER PRIMARY KEY, user_id INTEGER, event_id INTEGER)",
+            f"CREATE INDEX IF NOT EXISTS {get_table('job_user', application)} "
+            f"ON {get_table('job', application)} (user_id)",
+            f"CREATE INDEX IF NOT EXISTS {get_table('job_event_id', application)} "
+            f"ON {get_table('job', application)} (event_id)",
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {get_table('job_text', application)} "
+            f"USING fts5(name, description, tokenize='trigram')",
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {get_table('label', application)} "
+            f"USING fts5(name, tokenize='trigram')",
+            f"CREATE TABLE IF NOT EXISTS {get_table('job_label', application)} "
+            f"(job_id INTEGER, label_id INTEGER, PRIMARY KEY (job_id, label_id))",
+            f"CREATE INDEX IF NOT EXISTS {get_table('job_label_label', application)} "
+            f"ON {get_table('job_label', application)} (label_id)"
+        ]
+
+    return statements
+
+
+def drop_replica(cursor, applications):
+    """
+    Drops every replica table, so the replica is rebuilt from scratch
+    """
+    tables = [get_table('state'), get_table('user'), get_table('event_id')]
+    for application in applications:
+        tables += [get_table(name, application) for name in ['job', 'job_text', 'label', 'job_label']]
+
+    for table in tables:
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+def get_state(cursor, name):
+    cursor.execute(f"SELECT value FROM {get_table('state')} WHERE name = %s", [name])
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def set_state(cursor, name, value):
+    cursor.execute(f"INSERT OR REPLACE INTO {get_table('state')} (name, value) VALUES (%s, %s)", [name, str(value)])
+
+
+def replace_rows(cursor, table, columns, rows):
+    """
+    Replaces rows of a full text table by rowid
+
+    :param rows: A list of tuples of the rowid followed by the value of each column
+    """
+    cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(row[0], ) for row in rows])
+    cursor.executemany(
+        f'INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES ({", ".join(["%s"] * (len(columns) + 1))})',
+        [(row[0], *[normalise(value) for value in row[1:]]) for row in rows]
+    )
+
+
+def sync_table(cursor, table, columns, rows):
+    """
+    Makes a full text table hold exactly a set of rows, only writing the rows that were added, changed or deleted
+
+    :param rows: A list of tuples of the rowid followed by the value of each column
+
+    :return: The number of rows written or deleted
+    """
+    cursor.execute(f'SELECT rowid, {", ".join(columns)} FROM {table}')
+    existing = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    changed = [row for row in rows if existing.get(row[0]) != tuple(normalise(value) for value in row[1:])]
+    deleted = existing.keys() - {row[0] for row in rows}
+
+    cursor.executemany(f'DELETE FROM {table} WHERE rowid = %s', [(row_id, ) for row_id in deleted])
+    replace_rows(cursor, table, columns, changed)
+
+    return len(changed) + len(deleted)
+
+
+def copy_jobs(cursor, application, job_klass):
+    """
+    Copies the jobs of an application that have been created or changed since they were last copied, along with their
+    labels
+
+    :return: The number of jobs copied
+    """
+    job_field = f'{job_klass._meta.model_name}_id'
+    label_klass = job_klass.labels.through
+    has_last_updated = any(field.name == 'last_updated' for field in job_klass._meta.get_fields())
+
+    last_job_id = int(get_state(cursor, f'{application}_job_id') or 0)
+    last_updated = get_state(cursor, f'{application}_last_updated')
+    last_job_label_id = int(get_state(cursor, f'{application}_job_label_id') or 0)
+
+    changed = Q(id__gt=last_job_id)
+    if has_last_updated and last_updated:
+        # Jobs updated at the same time as the watermark may not all have been copied, so they are copied again
+        changed |= Q(last_updated__gte=last_updated)
+
+    fields = ['id', 'name', 'description', 'user_id']
+    fields += ['event_id_id'] if application == 'bilbyui' else []
+    fields += ['last_updated'] if has_last_updated else []
+
+    count = 0
+    after_id = 0
+    while True:
+        jobs = list(
+            job_klass.objects.using(application)
+            .filter(changed, id__gt=after_id)
+            .order_by('id')
+            .values(*fields)[:REPLICA_BATCH_SIZE]
+        )
+
+        if not jobs:
+            break
+
+        job_ids = [job['id'] for job in jobs]
+
+        replace_rows(
+            cursor, get_table('job_text', application), ['name', 'description'],
+            [(job['id'], job['name'], job['description']) for job in jobs]
+        )
+
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {get_table('job', application)} (job_id, user_id, event_id) VALUES (%s, %s, %s)",
+            [(job['id'], job['user_id'], job.get('event_id_id')) for job in jobs]
+        )
+
+        # The labels of changed jobs are copied again, in case any were removed
+        job_labels = label_klass.objects.using(application) \
+            .filter(**{f'{job_field}__in': job_ids}) \
+            .values_list(job_field, 'label_id')
+
+        cursor.executemany(f"DELETE FROM {get_table('job_label', application)} WHERE job_id = %s", [
+            (job_id, ) for job_id in job_ids
+        ])
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {get_table('job_label', application)} (job_id, label_id) VALUES (%s, %s)",
+            list(job_labels)
+        )
+
+        last_job_id = max(last_job_id, job_ids[-1])
+        if has_last_updated:
+            newest = max(job['last_updated'] for job in jobs)
+            last_updated = max(last_updated, newest.isoformat()) if last_updated else newest.isoformat()
+
+        after_id = job_ids[-1]
+        count += len(jobs)
+
+    # Labels added to jobs that haven't otherwise changed
+    job_labels = list(
+        label_klass.objects.using(application)
+        .filter(id__gt=last_job_label_id)
+        .order_by('id')
+        .values_list('id', job_field, 'label_id')
+    )
+
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO {get_table('job_label', application)} (job_id, label_id) VALUES (%s, %s)",
+        [(job_id, label_id) for _, job_id, label_id in job_labels]
+    )
+
+    if job_labels:
+        last_job_label_id = job_labels[-1][0]
+
+    set_state(cursor, f'{application}_job_id', last_job_id)
+    set_state(cursor, f'{application}_job_label_id', last_job_label_id)
+    if last_updated:
+        set_state(cursor, f'{application}_last_updated', last_updated)
+
+    return count
+
+
+def update_replica(applications, rebuild=False):
+    """
+    Copies any searchable text that has been added or changed since the replica was last updated
+
+    :param applications: A dictionary of application -> the main job class of the application, ie, BilbyJob
+    :param rebuild: If the replica should be rebuilt from scratch. This is needed to remove deleted jobs and labels
+    removed from unchanged jobs, since otherwise only new and changed rows are copied
+
+    :return: The number of jobs copied, or None if another process is already updating the replica
+    """
+    using = settings.SEARCH_REPLICA_DATABASE
+
+    # Only processes on this server share the replica, so they take a lock named after its database
+    name = hashlib.sha256(str(connections[using].settings_dict['NAME']).encode()).hexdigest()[:16]
+    with file_lock(f'db_search_replica_{name}') as acquired:
+        if not acquired:
+            return None
+
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            if rebuild:
+                drop_replica(cursor, applications)
+
+            for statement in get_replica_schema(applications):
+                cursor.execute(statement)
+
+            sync_table(
+                cursor, get_table('user'), ['first_name', 'last_name'],
+                list(GWCloudUser.objects.using('gwauth').values_list('id', 'first_name', 'last_name'))
+            )
+
+            sync_table(
+                cursor, get_table('event_id'), ['event_id', 'trigger_id', 'nickname'],
+                list(EventID.objects.using('bilbyui').values_list('id', 'event_id', 'trigger_id', 'nickname'))
+            )
+
+            count = 0
+            for application, job_klass in applications.items():
+                label_klass = job_klass.labels.field.related_model
+                sync_table(
+                    cursor, get_table('label', application), ['name'],
+                    list(label_klass.objects.using(application).values_list('id', 'name'))
+                )
+
+                count += copy_jobs(cursor, application, job_klass)
+
+        return count
+
+
+def get_replica_job_id(application):
+    """
+    Gets the id of the newest job of an application that has been copied to the replica. Jobs created after it haven't
+    been copied yet, so searches match them with the search statement instead
+
+    :param application: The application, ie, "viterbi" or "bilbyui"
+
+    :return: The job id, or None if the replica hasn't been built yet
+    """
+    with connections[settings.SEARCH_REPLICA_DATABASE].cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [get_table('state')])
+        if cursor.fetchone() is None:
+            return None
+
+        job_id = get_state(cursor, f'{application}_job_id')
+
+    return int(job_id) if job_id is not None else None
+
+
+def build_term_query(application):
+    """
+    Builds the query for the ids of the jobs matching a single term, with the same fields as the term filters of the
+    search statements. Each LIKE is on a single full text column so that it can use the trigram index.
+
+    :return: The SQL query, with one %s parameter for each LIKE pattern
+    """
+    queries = [
+        f"SELECT rowid AS job_id FROM {get_table('job_text', application)} WHERE name LIKE %s",
+        f"SELECT rowid FROM {get_table('job_text', application)} WHERE description LIKE %s",
+        f"""SELECT job_id FROM {get_table('job', application)} WHERE user_id IN (
+            SELECT rowid FROM {get_table('user')} WHERE first_name LIKE %s
+            UNION SELECT rowid FROM {get_table('user')} WHERE last_name LIKE %s
+        )""",
+        f"""SELECT job_id FROM {get_table('job_label', application)} WHERE label_id IN (
+            SELECT rowid FROM {get_table('label', application)} WHERE name LIKE %s
+        )"""
+    ]
+
+    # Bilby jobs can also be found by their event ids
+    if application == 'bilbyui':
+        queries.append(
+            f"""SELECT job_id FROM {get_table('job', application)} WHERE event_id IN (
+                SELECT rowid FROM {get_table('event_id')} WHERE event_id LIKE %s
+                UNION SELECT rowid FROM {get_table('event_id')} WHERE trigger_id LIKE %s
+                UNION SELECT rowid FROM {get_table('event_id')} WHERE nickname LIKE %s
+            )"""
+        )
+
+    return '\nUNION '.join(queries)
+
+
+def find_replica_candidates(application, terms, limit=None):
+    """
+    Finds the ids of the jobs matching every one of a list of terms from the replica
+
+    :param application: The application to perform the search on, ie, "viterbi" or "bilbyui"
+    :param terms: The list of distinct single word terms
+    :param limit: The maximum number of jobs to return, or None for no limit
+
+    :return: A set of the ids of the jobs matching every term, or None if more than limit jobs match
+    """
+    term_query = build_term_query(application)
+
+    # Every term must match, and the terms are wrapped in sub queries since compound selects have no precedence
+    query = '\nINTERSECT '.join(f'SELECT job_id FROM ({term_query})' for _ in terms)
+    params = [f'%{normalise(term)}%' for term in terms for _ in range(term_query.count('%s'))]
+
+    if limit:
+        # One more job than the limit is fetched to find out if the limit was exceeded
+        query += '\nLIMIT %s'
+        params.append(limit + 1)
+
+    with observe_stage('replica', application):
+        with connections[settings.SEARCH_REPLICA_DATABASE].cursor() as cursor:
+            cursor.execute(query, params)
+            job_ids = {row[0] for row in cursor.fetchall()}
+
+    count_rows('replica', application, len(job_ids))
+
+    if limit and len(job_ids) > limit:
+        return None
+
+    return job_ids
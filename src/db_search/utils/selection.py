@@ -0,0 +1,48 @@
+from graphene.utils.str_converters import to_snake_case
+from graphql.language.ast import FragmentSpread, InlineFragment
+
+
+def get_selections(info, selection_set):
+    """
+    Gets the fields in a selection set, expanding any fragments
+
+    :param info: The resolve info of the field being resolved
+    :param selection_set: The selection set to get the fields of
+
+    :return: A generator of the field selections
+    """
+    for selection in selection_set.selections:
+        if isinstance(selection, FragmentSpread):
+            yield from get_selections(info, info.fragments[selection.name.value].selection_set)
+        elif isinstance(selection, InlineFragment):
+            yield from get_selections(info, selection.selection_set)
+        else:
+            yield selection
+
+
+def get_selected_fields(info, *path):
+    """
+    Gets the names of the fields the query requests from an object below the field being resolved. For example,
+    get_selected_fields(info, 'job') for the query "publicBilbyJobs { job { id name } }" returns {'id', 'name'}
+
+    :param info: The resolve info of the field being resolved
+    :param path: The names of the fields leading to the object, as they appear in the query
+
+    :return: A set of the requested field names, converted to snake case to match the model fields. The set is empty if
+    the object isn't requested
+    """
+    selection_sets = [field.selection_set for field in info.field_asts if field.selection_set]
+
+    for name in path:
+        selection_sets = [
+            selection.selection_set
+            for selection_set in selection_sets
+            for selection in get_selections(info, selection_set)
+            if selection.name.value == name and selection.selection_set
+        ]
+
+    return {
+        to_snake_case(selection.name.value)
+        for selection_set in selection_sets
+        for selection in get_selections(info, selection_set)
+    }
@@ -0,0 +1,586 @@
+"""
+Keeps the db_search owned search structures (the n-gram index and the search documents) up to date with the
+application and job controller databases, by re-indexing only the jobs that have changed since the last sync rather
+than rebuilding the structures (See the sync_search_index management command).
+
+Each structure has its own watermarks (See db_search.models.SyncWatermark). These record the newest job id, job last
+updated time and job label id of each application, and for the search documents the newest job history entry, that
+have been applied to the structure. The watermarks are saved after each batch, so an interrupted sync carries on from
+where it stopped. Ids are allocated when a row is inserted rather than when it is committed, so each sync also looks
+back a little way below each watermark to pick up rows that were committed late.
+
+Both structures also hold the names of the users, labels and event ids of each job. These tables are small, so each
+sync compares a digest of every row's names with the digests saved by the last sync (See db_search.models.SyncName),
+and re-indexes the jobs that use any row that has been renamed or deleted.
+
+Deleted jobs are only picked up by rebuilding the structure.
+"""
+import datetime
+import hashlib
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from bilbyui.models import BilbyJob, EventID
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Min, Q
+from gwauth.models import GWCloudUser
+from jobserver.models import JobHistory
+
+from db_search.models import SearchDocument, SearchNgram, SyncName, SyncWatermark
+from db_search.utils.concurrency import run_with_connections
+from db_search.utils.document import index_documents, join_text
+from db_search.utils.job_search import job_klasses
+from db_search.utils.job_state import update_job_states
+from db_search.utils.locks import named_lock
+from db_search.utils.ngram import index_jobs
+from db_search.utils.replica import update_replica
+
+logger = logging.getLogger(__name__)
+
+# The number of jobs to re-index at a time
+SYNC_BATCH_SIZE = 500
+
+# The number of job history entries to read at a time
+SYNC_HISTORY_BATCH_SIZE = 5000
+
+# The number of job ids given to a worker process at a time when rebuilding
+SYNC_RANGE_SIZE = 10000
+
+# How far below each watermark a sync looks back for rows that were committed after rows with greater ids or later
+# last updated times had already been synced. The jobs found in the lookback are re-indexed again by every sync.
+SYNC_ID_LOOKBACK = 50
+SYNC_HISTORY_LOOKBACK = 500
+SYNC_LAST_UPDATED_LOOKBACK = datetime.timedelta(seconds=60)
+
+# The number of renamed or deleted users, labels or event ids to find the jobs of at a time
+SYNC_NAME_BATCH_SIZE = 1000
+
+# Search structure -> (the model holding the structure, the function that re-indexes a list of jobs, if the structure
+# holds the state of each job from the job history, if the structure holds the names of the users, labels and event ids
+# of each job (See get_name_sources))
+SYNC_STRUCTURES = {
+    'ngrams': (SearchNgram, index_jobs, False, False),
+    'documents': (SearchDocument, index_documents, True, True)
+}
+
+# The search structures used by each search engine
+ENGINE_STRUCTURES = {
+    'ngram': ['ngrams'],
+    'document': ['documents']
+}
+
+# The background sync thread of this process (See start_sync_thread)
+_sync_thread = None
+_sync_thread_lock = threading.Lock()
+
+
+def get_sync_structures():
+    """
+    Gets the search structures used by the configured SEARCH_ENGINE
+
+    :return: A list of search structure names (See SYNC_STRUCTURES)
+    """
+    return ENGINE_STRUCTURES.get(settings.SEARCH_ENGINE, [])
+
+
+def has_last_updated(job_klass):
+    return any(field.name == 'last_updated' for field in job_klass._meta.get_fields())
+
+
+def get_watermarks(structure):
+    """
+    Gets the saved watermarks of a search structure
+
+    :return: A dictionary of watermark name -> value
+    """
+    return dict(
+        SyncWatermark.objects.using('db_search').filter(structure=structure).values_list('name', 'value')
+    )
+
+
+def save_watermarks(structure, watermarks):
+    with transaction.atomic(using='db_search'):
+        for name, value in watermarks.items():
+            SyncWatermark.objects.using('db_search').update_or_create(
+                structure=structure, name=name, defaults={'value': str(value)}
+            )
+
+
+def get_current_watermarks(structure):
+    """
+    Gets the watermarks of a search structure that has every current job and job history entry applied to it
+
+    :return: A dictionary of watermark name -> value
+    """
+    watermarks = {}
+    for application, job_klass in job_klasses.items():
+        jobs = job_klass.objects.using(application)
+        watermarks[f'{application}_job_id'] = jobs.aggregate(Max('id'))['id__max'] or 0
+
+        if has_last_updated(job_klass):
+            last_updated = jobs.aggregate(Max('last_updated'))['last_updated__max']
+            if last_updated:
+                watermarks[f'{application}_last_updated'] = last_updated.isoformat()
+
+        job_labels = job_klass.labels.through.objects.using(application)
+        watermarks[f'{application}_job_label_id'] = job_labels.aggregate(Max('id'))['id__max'] or 0
+
+    if SYNC_STRUCTURES[structure][2]:
+        watermarks['job_history_id'] = \
+            JobHistory.objects.using('jobserver').aggregate(Max('id'))['id__max'] or 0
+
+    return watermarks
+
+
+def index_in_batches(structure, application, job_klass, job_ids, batch_size=SYNC_BATCH_SIZE):
+    """
+    Re-indexes a list of jobs in a search structure, batch_size jobs at a time
+
+    :return: The number of jobs re-indexed
+    """
+    index = SYNC_STRUCTURES[structure][1]
+    job_ids = sorted(job_ids)
+
+    for idx in range(0, len(job_ids), batch_size):
+        index(application, job_klass, job_ids[idx:idx + batch_size])
+
+    return len(job_ids)
+
+
+def sync_jobs(structure, application, job_klass, watermarks, batch_size=SYNC_BATCH_SIZE):
+    """
+    Re-indexes the jobs of an application that have been created or changed, or had labels added, since the
+    watermarks, looking back SYNC_ID_LOOKBACK ids and SYNC_LAST_UPDATED_LOOKBACK below them. The watermarks are updated
+    and saved after each batch.
+
+    :return: The number of jobs re-indexed
+    """
+    last_job_id = int(watermarks.get(f'{application}_job_id', 0))
+    last_updated = watermarks.get(f'{application}_last_updated')
+    last_job_label_id = int(watermarks.get(f'{application}_job_label_id', 0))
+
+    changed = Q(id__gt=max(last_job_id - SYNC_ID_LOOKBACK, 0))
+    fields = ['id']
+    if has_last_updated(job_klass):
+        fields.append('last_updated')
+        if last_updated:
+            # Jobs updated at the same time as the watermark may not all have been re-indexed, so they are done again
+            changed |= Q(last_updated__gte=datetime.datetime.fromisoformat(last_updated) - SYNC_LAST_UPDATED_LOOKBACK)
+
+    count = 0
+    after_id = 0
+    while True:
+        jobs = list(
+            job_klass.objects.using(application)
+            .filter(changed, id__gt=after_id)
+            .order_by('id')
+            .values(*fields)[:batch_size]
+        )
+
+        if not jobs:
+            break
+
+        job_ids = [job['id'] for job in jobs]
+        count += index_in_batches(structure, application, job_klass, job_ids, batch_size)
+
+        # Jobs are read in id order, so every new job up to the last id of the batch has been re-indexed. Changed jobs
+        # are not, so the last updated watermark is only moved once every batch is done
+        watermarks[f'{application}_job_id'] = max(last_job_id, job_ids[-1])
+        if 'last_updated' in fields:
+            newest = max(job['last_updated'] for job in jobs).isoformat()
+            last_updated = max(last_updated, newest) if last_updated else newest
+
+        save_watermarks(structure, watermarks)
+        after_id = job_ids[-1]
+
+    if last_updated:
+        watermarks[f'{application}_last_updated'] = last_updated
+        save_watermarks(structure, watermarks)
+
+    # Labels added to jobs that haven't otherwise changed
+    job_field = f'{job_klass._meta.model_name}_id'
+    after_id = max(last_job_label_id - SYNC_ID_LOOKBACK, 0)
+    while True:
+        job_labels = list(
+            job_klass.labels.through.objects.using(application)
+            .filter(id__gt=after_id)
+            .order_by('id')
+            .values_list('id', job_field)[:batch_size]
+        )
+
+        if not job_labels:
+            break
+
+        count += index_in_batches(structure, application, job_klass, {job_id for _, job_id in job_labels}, batch_size)
+
+        watermarks[f'{application}_job_label_id'] = max(last_job_label_id, job_labels[-1][0])
+        save_watermarks(structure, watermarks)
+        after_id = job_labels[-1][0]
+
+    return count
+
+
+def sync_histories(structure, watermarks, batch_size=SYNC_BATCH_SIZE, history_batch_size=SYNC_HISTORY_BATCH_SIZE,
+                   lookback=SYNC_HISTORY_LOOKBACK):
+    """
+    Re-indexes the jobs that have had job history entries added since the watermarks, looking back lookback entries
+    below them, so that their states are up to date. The watermarks are updated and saved after each batch of entries.
+
+    :return: The number of jobs re-indexed
+    """
+    last_history_id = int(watermarks.get('job_history_id', 0))
+    after_id = max(last_history_id - lookback, 0)
+
+    count = 0
+    while True:
+        histories = list(
+            JobHistory.objects.using('jobserver')
+            .filter(id__gt=after_id)
+            .order_by('id')
+            .values_list('id', 'job_id', 'job__application')[:history_batch_size]
+        )
+
+        if not histories:
+            return count
+
+        job_controller_ids = {}
+        for _, job_id, application in histories:
+            job_controller_ids.setdefault(application, set()).add(job_id)
+
+        for application, job_klass in job_klasses.items():
+            if application not in job_controller_ids:
+                continue
+
+            job_ids = job_klass.objects.using(application) \
+                .filter(job_controller_id__in=job_controller_ids[application]) \
+                .values_list('id', flat=True)
+
+            count += index_in_batches(structure, application, job_klass, list(job_ids), batch_size)
+
+        watermarks['job_history_id'] = max(last_history_id, histories[-1][0])
+        save_watermarks(structure, watermarks)
+        after_id = histories[-1][0]
+
+
+def get_name_sources():
+    """
+    Gets the tables of names that the searchable text of jobs is built from, other than the job tables
+
+    :return: A dictionary of source name -> (a query of the rows of the table, the fields holding the searchable
+    strings of each row)
+    """
+    sources = {'users': (GWCloudUser.objects.using('gwauth'), ['first_name', 'last_name'])}
+
+    for application, job_klass in job_klasses.items():
+        label_klass = job_klass.labels.field.related_model
+        sources[f'{application}_labels'] = (label_klass.objects.using(application), ['name'])
+
+    sources['bilbyui_event_ids'] = (EventID.objects.using('bilbyui'), ['event_id', 'trigger_id', 'nickname'])
+
+    return sources
+
+
+def get_name_jobs(source, row_ids):
+    """
+    Finds the jobs whose searchable text includes the names of some rows of a name source (See get_name_sources)
+
+    :return: A dictionary of application -> list of job ids
+    """
+    if source == 'users':
+        return {
+            application: list(
+                job_klass.objects.using(application).filter(user_id__in=row_ids).values_list('id', flat=True)
+            )
+            for application, job_klass in job_klasses.items()
+        }
+
+    if source == 'bilbyui_event_ids':
+        return {
+            'bilbyui': list(BilbyJob.objects.using('bilbyui').filter(event_id__in=row_ids).values_list('id', flat=True))
+        }
+
+    application = source[:-len('_labels')]
+    job_klass = job_klasses[application]
+    job_field = f'{job_klass._meta.model_name}_id'
+    job_ids = job_klass.labels.through.objects.using(application) \
+        .filter(label_id__in=row_ids) \
+        .values_list(job_field, flat=True)
+
+    return {application: list(set(job_ids))}
+
+
+def get_name_digests():
+    """
+    Gets a digest of the normalised searchable text of every row of every name source
+
+    :return: A dictionary of (source name, row id) -> SHA-1 hex digest
+    """
+    digests = {}
+    for source, (rows, fields) in get_name_sources().items():
+        for row_id, *strings in rows.values_list('id', *fields):
+            digests[(source, row_id)] = hashlib.sha1(join_text(strings).encode()).hexdigest()
+
+    return digests
+
+
+def get_saved_name_digests(structure):
+    """
+    :return: A dictionary of (source name, row id) -> SyncName of the name digests saved for a search structure
+    """
+    return {
+        (name.source, name.row_id): name
+        for name in SyncName.objects.using('db_search').filter(structure=structure)
+    }
+
+
+def save_name_digests(structure, digests, saved):
+    """
+    Replaces the name digests saved for a search structure
+
+    :param digests: The new digests (See get_name_digests)
+    :param saved: The digests that are currently saved (See get_saved_name_digests)
+    """
+    created = []
+    updated = []
+    for (source, row_id), digest in digests.items():
+        name = saved.get((source, row_id))
+        if name is None:
+            created.append(SyncName(structure=structure, source=source, row_id=row_id, digest=digest))
+        elif name.digest != digest:
+            name.digest = digest
+            updated.append(name)
+
+    removed = [name.id for key, name in saved.items() if key not in digests]
+
+    with transaction.atomic(using='db_search'):
+        for idx in range(0, len(removed), SYNC_NAME_BATCH_SIZE):
+            SyncName.objects.using('db_search').filter(id__in=removed[idx:idx + SYNC_NAME_BATCH_SIZE]).delete()
+
+        SyncName.objects.using('db_search').bulk_update(updated, ['digest'], batch_size=SYNC_NAME_BATCH_SIZE)
+        SyncName.objects.using('db_search').bulk_create(created, batch_size=SYNC_NAME_BATCH_SIZE)
+
+
+def sync_names(structure, batch_size=SYNC_BATCH_SIZE):
+    """
+    Re-indexes the jobs that use any user, label or event id that has been renamed or deleted since the name digests of
+    a search structure were saved, then saves the current digests. A structure with no saved digests only has them
+    saved.
+
+    :return: The number of jobs re-indexed
+    """
+    # The digests are taken before any jobs are read, so anything renamed while the jobs are re-indexed is picked up by
+    # the next sync
+    digests = get_name_digests()
+    saved = get_saved_name_digests(structure)
+
+    changed = {}
+    for (source, row_id), name in saved.items():
+        if digests.get((source, row_id)) != name.digest:
+            changed.setdefault(source, []).append(row_id)
+
+    count = 0
+    for source, row_ids in changed.items():
+        for idx in range(0, len(row_ids), SYNC_NAME_BATCH_SIZE):
+            for application, job_ids in get_name_jobs(source, row_ids[idx:idx + SYNC_NAME_BATCH_SIZE]).items():
+                count += index_in_batches(structure, application, job_klasses[application], job_ids, batch_size)
+
+    save_name_digests(structure, digests, saved)
+    return count
+
+
+def sync_structure(structure, batch_size=SYNC_BATCH_SIZE):
+    """
+    Re-indexes the jobs that have changed since a search structure was last synced
+
+    :param structure: The search structure to sync, ie, "documents" (See SYNC_STRUCTURES)
+    :param batch_size: The number of jobs to re-index at a time
+
+    :return: The number of jobs re-indexed, or None if another process is already syncing the structure. A job that
+    changed in more than one way may be counted more than once
+    """
+    with named_lock(f'db_search_sync_{structure}') as acquired:
+        if not acquired:
+            return None
+
+        watermarks = get_watermarks(structure)
+        history_lookback = SYNC_HISTORY_LOOKBACK
+        if not watermarks and SYNC_STRUCTURES[structure][2]:
+            # A structure that has never been synced has every job indexed with its current state below, so the job
+            # history that came before doesn't need to be applied
+            watermarks['job_history_id'] = \
+                JobHistory.objects.using('jobserver').aggregate(Max('id'))['id__max'] or 0
+            history_lookback = 0
+
+        count = 0
+        for application, job_klass in job_klasses.items():
+            count += sync_jobs(structure, application, job_klass, watermarks, batch_size)
+
+        if SYNC_STRUCTURES[structure][3]:
+            count += sync_names(structure, batch_size)
+
+        if SYNC_STRUCTURES[structure][2]:
+            count += sync_histories(structure, watermarks, batch_size, lookback=history_lookback)
+
+        return count
+
+
+def sync_search_index(structures=None, batch_size=SYNC_BATCH_SIZE):
+    """
+    Syncs several search structures
+
+    :param structures: The search structures to sync, or None to sync those used by SEARCH_ENGINE
+
+    :return: A dictionary of search structure -> the number of jobs re-indexed (See sync_structure)
+    """
+    return {
+        structure: sync_structure(structure, batch_size)
+        for structure in (get_sync_structures() if structures is None else structures)
+    }
+
+
+def get_id_ranges(structure, application, job_klass, range_size=SYNC_RANGE_SIZE):
+    """
+    Splits the ids of the jobs of an application, and of the jobs of the application indexed in a search structure, in
+    to ranges
+
+    :return: A list of (first id, end id) tuples. The end id is not included in the range
+    """
+    model = SYNC_STRUCTURES[structure][0]
+    bounds = [
+        job_klass.objects.using(application).aggregate(first=Min('id'), last=Max('id')),
+        model.objects.using('db_search').filter(application=application)
+        .aggregate(first=Min('job_id'), last=Max('job_id'))
+    ]
+
+    firsts = [bound['first'] for bound in bounds if bound['first'] is not None]
+    if not firsts:
+        return []
+
+    first_id = min(firsts)
+    end_id = max(bound['last'] for bound in bounds if bound['last'] is not None) + 1
+
+    return [
+        (start_id, min(start_id + range_size, end_id))
+        for start_id in range(first_id, end_id, range_size)
+    ]
+
+
+def rebuild_range(structure, application, start_id, end_id, batch_size=SYNC_BATCH_SIZE):
+    """
+    Indexes the jobs of an application with ids in a range, and removes the entries of jobs in the range that no longer
+    exist. This is run by the rebuild worker processes
+
+    :return: The number of jobs indexed or removed
+    """
+    job_klass = job_klasses[application]
+    job_ids = set(
+        job_klass.objects.using(application)
+        .filter(id__gte=start_id, id__lt=end_id)
+        .values_list('id', flat=True)
+    )
+
+    model = SYNC_STRUCTURES[structure][0]
+    job_ids.update(
+        model.objects.using('db_search')
+        .filter(application=application, job_id__gte=start_id, job_id__lt=end_id)
+        .values_list('job_id', flat=True)
+        .distinct()
+    )
+
+    try:
+        return index_in_batches(structure, application, job_klass, job_ids, batch_size)
+    finally:
+        # Worker processes are reused for many ranges, so connections aren't left open between them
+        connections.close_all()
+
+
+def rebuild_structure(structure, workers=None, range_size=SYNC_RANGE_SIZE, batch_size=SYNC_BATCH_SIZE):
+    """
+    Rebuilds a search structure from every job, spreading ranges of job ids over a pool of worker processes. The entries
+    of each job are replaced in place, so searches keep using the existing entries while the rebuild runs.
+
+    :param structure: The search structure to rebuild, ie, "documents" (See SYNC_STRUCTURES)
+    :param workers: The number of worker processes, or None for SEARCH_SYNC_WORKERS. 0 rebuilds the structure in this
+    process
+    :param range_size: The number of job ids given to a worker at a time
+    :param batch_size: The number of jobs to index at a time
+
+    :return: The number of jobs indexed, or None if another process is already syncing the structure
+    """
+    workers = settings.SEARCH_SYNC_WORKERS if workers is None else workers
+
+    with named_lock(f'db_search_sync_{structure}') as acquired:
+        if not acquired:
+            return None
+
+        # The watermarks and name digests are taken before any jobs are read, so anything that changes during the
+        # rebuild is picked up by the next sync
+        watermarks = get_current_watermarks(structure)
+        digests = get_name_digests()
+
+        ranges = [
+            (structure, application, start_id, end_id, batch_size)
+            for application, job_klass in job_klasses.items()
+            for start_id, end_id in get_id_ranges(structure, application, job_klass, range_size)
+        ]
+
+        if workers:
+            # Workers are started fresh rather than forked, since a forked worker would share this process's database
+            # connections, including the one holding the lock
+            with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup
+            ) as executor:
+                count = sum(executor.map(rebuild_range, *zip(*ranges))) if ranges else 0
+        else:
+            count = sum(rebuild_range(*args) for args in ranges)
+
+        save_watermarks(structure, watermarks)
+        if SYNC_STRUCTURES[structure][3]:
+            save_name_digests(structure, digests, get_saved_name_digests(structure))
+
+        return count
+
+
+def sync_forever(interval):
+    """
+    Syncs the search structures used by SEARCH_ENGINE, the job state table if it is used and the search replica if it
+    is used, every interval seconds
+    """
+    while True:
+        time.sleep(interval)
+
+        try:
+            run_with_connections(sync_search_index)
+            if settings.SEARCH_JOB_STATE_TABLE:
+                run_with_connections(update_job_states)
+            if settings.SEARCH_ENGINE == 'replica':
+                run_with_connections(update_replica, job_klasses)
+        except Exception:
+            logger.exception('Failed to sync the search structures')
+
+
+def start_sync_thread():
+    """
+    Starts a background thread in this process that syncs the search structures every SEARCH_SYNC_INTERVAL seconds,
+    unless one is already running. Only one process syncs a structure at a time, the others skip it.
+
+    :return: The thread
+    """
+    global _sync_thread
+
+    with _sync_thread_lock:
+        if _sync_thread is None or not _sync_thread.is_alive():
+            _sync_thread = threading.Thread(
+                target=sync_forever,
+                args=(settings.SEARCH_SYNC_INTERVAL,),
+                name='db_search_sync',
+                daemon=True
+            )
+            _sync_thread.start()
+
+        return _sync_thread
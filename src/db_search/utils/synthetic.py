@@ -0,0 +1,279 @@
+"""
+Generates synthetic users, jobs, labels, event ids and job histories for benchmarking searches at scale (See the
+generate_search_data management command).
+
+Words in job names, descriptions and user names are drawn from a fixed vocabulary with a Zipf distribution, so some
+words match a large share of the jobs and others only a few, as in real searches.
+"""
+import datetime
+import itertools
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from gwauth.models import GWCloudUser
+from jobserver.models import Job, JobHistory
+from bilbyui.constants import BilbyJobType
+from bilbyui.models import EventID
+
+from db_search.status import JobStatus
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'po', 'ru', 'sa', 'ti', 'vo', 'ze', 'bra', 'cle', 'dro', 'fli', 'gru', 'sto']
+
+# Every two syllable word, ie, "kalo"
+VOCABULARY = [first + second for first, second in itertools.product(SYLLABLES, repeat=2)]
+
+# The final state of generated jobs and the chance of a job finishing in it. Jobs that are still running stop at
+# RUNNING
+FINAL_STATES = [
+    (JobStatus.COMPLETED, 0.7),
+    (JobStatus.ERROR, 0.12),
+    (JobStatus.RUNNING, 0.1),
+    (JobStatus.CANCELLED, 0.05),
+    (JobStatus.WALL_TIME_EXCEEDED, 0.03)
+]
+
+# The states a job passes through before its final state
+PROGRESS_STATES = [JobStatus.PENDING, JobStatus.SUBMITTING, JobStatus.SUBMITTED, JobStatus.QUEUED, JobStatus.RUNNING]
+
+BATCH_SIZE = 5000
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Gets the weights of a Zipf distribution over count items
+
+    :return: A list of the weight of each item, the first item is the most likely
+    """
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class WordSampler:
+    """
+    Draws words from the vocabulary with a Zipf distribution
+    """
+
+    def __init__(self, rng, exponent=1.1):
+        self.rng = rng
+        self.cumulative_weights = list(itertools.accumulate(zipf_weights(len(VOCABULARY), exponent)))
+
+    def words(self, count):
+        return self.rng.choices(VOCABULARY, cum_weights=self.cumulative_weights, k=count)
+
+    def text(self, count):
+        return ' '.join(self.words(count))
+
+
+def next_id(klass, using):
+    """
+    Gets the next free id of a model. MySQL doesn't return the ids of bulk created rows, so generated rows are given
+    their ids up front.
+    """
+    return (klass.objects.using(using).aggregate(Max('id'))['id__max'] or 0) + 1
+
+
+def generate_users(rng, count, ligo_fraction=0.5, batch_size=BATCH_SIZE):
+    """
+    Generates users with names drawn from the vocabulary
+
+    :param rng: The random number generator
+    :param count: The number of users to generate
+    :param ligo_fraction: The fraction of users that are LIGO users
+
+    :return: A list of the ids of the generated users
+    """
+    sampler = WordSampler(rng)
+    first_id = next_id(GWCloudUser, 'gwauth')
+
+    users = [
+        GWCloudUser(
+            id=user_id,
+            username=f'synthetic_{user_id}',
+            email=f'synthetic_{user_id}@example.com',
+            first_name=sampler.text(1).title(),
+            last_name=sampler.text(1).title(),
+            is_ligo_user=rng.random() < ligo_fraction
+        )
+        for user_id in range(first_id, first_id + count)
+    ]
+
+    with transaction.atomic(using='gwauth'):
+        GWCloudUser.objects.using('gwauth').bulk_create(users, batch_size=batch_size)
+
+    return [user.id for user in users]
+
+
+def generate_labels(application, job_klass, count):
+    """
+    Generates labels for an application
+
+    :return: A list of the ids of the generated labels
+    """
+    label_klass = job_klass.labels.field.related_model
+    first_id = next_id(label_klass, application)
+
+    labels = [
+        label_klass(id=label_id, name=f'Synthetic Label {label_id}', description=f'Synthetic label {label_id}')
+        for label_id in range(first_id, first_id + count)
+    ]
+
+    label_klass.objects.using(application).bulk_create(labels)
+
+    return [label.id for label in labels]
+
+
+def generate_event_ids(rng, count, batch_size=BATCH_SIZE):
+    """
+    Generates bilby event ids
+
+    :return: A list of the ids of the generated event ids
+    """
+    sampler = WordSampler(rng)
+    first_id = next_id(EventID, 'bilbyui')
+
+    event_ids = [
+        EventID(
+            id=event_id,
+            event_id=f'GW{rng.randrange(150000, 240000):06d}_{event_id:06d}',
+            trigger_id=f'S{rng.randrange(150000, 240000):06d}{rng.choice("abcdefgh")}',
+            nickname=sampler.text(1)
+        )
+        for event_id in range(first_id, first_id + count)
+    ]
+
+    with transaction.atomic(using='bilbyui'):
+        EventID.objects.using('bilbyui').bulk_create(event_ids, batch_size=batch_size)
+
+    return [event_id.id for event_id in event_ids]
+
+
+def generate_history(rng, job, created, mean_histories):
+    """
+    Generates the job history of a job controller job, moving through the job states from its creation time
+
+    :return: A list of unsaved job history entries, oldest first
+    """
+    final_state = rng.choices([state for state, _ in FINAL_STATES], [weight for _, weight in FINAL_STATES])[0]
+
+    # Long running jobs may move between queued and running many times before they finish
+    length = max(1, min(int(rng.expovariate(1 / mean_histories)) + 1, 1000))
+    states = (PROGRESS_STATES * (length // len(PROGRESS_STATES) + 1))[:length - 1] + [final_state]
+
+    histories = []
+    timestamp = created
+    for state in states:
+        timestamp += datetime.timedelta(seconds=rng.randrange(1, 3600))
+        histories.append(JobHistory(job=job, what='synthetic', state=state, timestamp=timestamp, details=''))
+
+    return histories
+
+
+def generate_jobs(rng, application, job_klass, count, user_ids, label_ids=(), event_ids=(), days=365,
+                  mean_histories=5, private_fraction=0.1, ligo_fraction=0.3, uploaded_fraction=0.1,
+                  labels_per_job=1, batch_size=BATCH_SIZE):
+    """
+    Generates jobs for an application along with their job controller jobs and job histories
+
+    :param rng: The random number generator
+    :param application: The application to generate jobs for, ie, "bilbyui" or "viterbi"
+    :param job_klass: The class representing the main job class for the application, ie, BilbyJob or ViterbiJob
+    :param count: The number of jobs to generate
+    :param user_ids: The ids of the users that may own the jobs
+    :param label_ids: The ids of the labels that may be added to the jobs
+    :param event_ids: The ids of the event ids that may be given to bilby jobs
+    :param days: Jobs are created at random times over this many days up to now
+    :param mean_histories: The mean number of job history entries of each job
+    :param private_fraction: The fraction of jobs that are private
+    :param ligo_fraction: The fraction of jobs that are LIGO jobs
+    :param uploaded_fraction: The fraction of bilby jobs that are uploaded rather than run by the job controller
+    :param labels_per_job: The mean number of labels added to each job
+    :param batch_size: The number of jobs inserted at once
+
+    :return: The number of job history entries generated
+    """
+    sampler = WordSampler(rng)
+    now = timezone.now()
+    label_field = f'{job_klass._meta.model_name}_id'
+    label_klass = job_klass.labels.through
+    history_count = 0
+
+    for batch_start in range(0, count, batch_size):
+        batch_count = min(batch_size, count - batch_start)
+        first_job_id = next_id(job_klass, application)
+        first_controller_id = next_id(Job, 'jobserver')
+
+        controller_jobs = []
+        histories = []
+        jobs = []
+        job_labels = []
+
+        for idx in range(batch_count):
+            job_id = first_job_id + idx
+            user_id = rng.choice(user_ids)
+            created = now - datetime.timedelta(seconds=rng.randrange(days * 24 * 60 * 60))
+
+            job = job_klass(
+                id=job_id,
+                user_id=user_id,
+                name=f'{sampler.text(1)}_{sampler.text(1)}_{job_id}',
+                description=sampler.text(rng.randrange(3, 30)),
+                private=rng.random() < private_fraction,
+                is_ligo_job=rng.random() < ligo_fraction,
+                creation_time=created
+            )
+
+            uploaded = application == 'bilbyui' and rng.random() < uploaded_fraction
+            if application == 'bilbyui':
+                if uploaded:
+                    job.job_type = BilbyJobType.UPLOADED
+                job.ini_string = ''
+                job.event_id_id = rng.choice(event_ids) if event_ids and rng.random() < 0.5 else None
+
+            if not uploaded:
+                controller_job = Job(
+                    id=first_controller_id + len(controller_jobs),
+                    user=user_id,
+                    cluster='synthetic',
+                    bundle='synthetic',
+                    application=application
+                )
+                controller_jobs.append(controller_job)
+                histories += generate_history(rng, controller_job, created, mean_histories)
+                job.job_controller_id = controller_job.id
+
+            jobs.append(job)
+
+            if label_ids:
+                for label_id in rng.sample(label_ids, min(len(label_ids), int(rng.expovariate(1 / labels_per_job)))):
+                    job_labels.append(label_klass(**{label_field: job_id, 'label_id': label_id}))
+
+        with transaction.atomic(using='jobserver'):
+            Job.objects.using('jobserver').bulk_create(controller_jobs, batch_size=batch_size)
+            JobHistory.objects.using('jobserver').bulk_create(histories, batch_size=batch_size)
+
+        with transaction.atomic(using=application):
+            job_klass.objects.using(application).bulk_create(jobs, batch_size=batch_size)
+
+            # The creation time is set automatically when the jobs are inserted, so it is set again here
+            job_klass.objects.using(application).bulk_update(jobs, ['creation_time'], batch_size=batch_size)
+
+            label_klass.objects.using(application).bulk_create(job_labels, batch_size=batch_size)
+
+        history_count += len(histories)
+
+    return history_count
+
+
+def random_terms(rng, count, common=True):
+    """
+    Picks search terms from the vocabulary
+
+    :param rng: The random number generator
+    :param count: The number of terms
+    :param common: If this is True the terms are picked from the most common words, otherwise they are picked from the
+    least common words
+
+    :return: A list of the terms
+    """
+    words = VOCABULARY[:len(VOCABULARY) // 10] if common else VOCABULARY[-len(VOCABULARY) // 2:]
+    return rng.sample(words, count)
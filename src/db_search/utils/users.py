@@ -0,0 +1,35 @@
+"""
+An in-process index of user names, so that search terms are matched against the first and last names of users in
+Python rather than by scanning the auth database's user table for every term of every search (See
+db_search.utils.names). New users are added to the index as they are created, and the index is loaded again every
+SEARCH_USER_REFRESH_INTERVAL seconds to pick up renamed and deleted users.
+"""
+from django.conf import settings
+from gwauth.models import GWCloudUser
+
+from db_search.utils.names import get_name_index
+
+
+def get_user_index(refresh=False):
+    """
+    Gets the user name index
+
+    :param refresh: If the index should be loaded again now
+
+    :return: The NameIndex of the first and last name of each user
+    """
+    return get_name_index(
+        'users', GWCloudUser.objects.using('gwauth'), ['first_name', 'last_name'],
+        settings.SEARCH_USER_REFRESH_INTERVAL, refresh
+    )
+
+
+def match_users(term):
+    """
+    Finds the users whose first or last name contains a search term
+
+    :param term: The single word search term
+
+    :return: A sorted list of the ids of the matching users
+    """
+    return get_user_index().match(term)
@@ -0,0 +1,80 @@
+import functools
+import hmac
+import ipaddress
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from graphene_django.views import GraphQLView
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from db_search.utils.concurrency import run_with_connections
+from db_search.utils.metrics import observe_stage, render_metrics
+
+
+class AsyncGraphQLView(GraphQLView):
+    """
+    A GraphQL view that doesn't tie up the server while a query runs. When served with ASGI (See gw_db_search.asgi),
+    each query is executed on a worker thread, and the public job searches run their database queries concurrently on
+    the search thread pool (See db_search.utils.concurrency).
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        # Django would run a synchronous view on the single thread it uses for thread sensitive code, which would only
+        # allow one query to run at a time. Worker threads don't see the request finished signal, so their connections
+        # are managed by run_with_connections. The view threads only wait on the search thread pool, which never waits
+        # on them in turn
+        sync_view = sync_to_async(functools.partial(run_with_connections, view), thread_sensitive=False)
+
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            # Tells the public job resolvers that they can search concurrently
+            request.concurrent_search = True
+            return await sync_view(request, *args, **kwargs)
+
+        # The GraphQL endpoint authenticates with JSON web tokens rather than sessions, so it is exempt from CSRF checks
+        async_view.csrf_exempt = True
+
+        return async_view
+
+    def execute_graphql_request(self, *args, **kwargs):
+        with observe_stage('execute', 'graphql'):
+            return super().execute_graphql_request(*args, **kwargs)
+
+    def json_encode(self, *args, **kwargs):
+        with observe_stage('serialisation', 'graphql'):
+            return super().json_encode(*args, **kwargs)
+
+
+def metrics_allowed(request):
+    """
+    Checks if a request may read the metrics. If SEARCH_METRICS_TOKEN is set, the request must have the token as a
+    bearer token. Otherwise the request must come straight from a private address rather than through a proxy, so the
+    metrics are only served within the cluster network.
+    """
+    if settings.SEARCH_METRICS_TOKEN:
+        return hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(),
+            f'Bearer {settings.SEARCH_METRICS_TOKEN}'.encode()
+        )
+
+    if 'X-Forwarded-For' in request.headers or 'X-Real-IP' in request.headers:
+        return False
+
+    try:
+        return ipaddress.ip_address(request.META.get('REMOTE_ADDR', '')).is_private
+    except ValueError:
+        return False
+
+
+def metrics(request):
+    """
+    Serves the metrics in the Prometheus text format (See db_search.utils.metrics)
+    """
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,124 @@
+"""
+Gunicorn configuration for serving gw_db_search in production. Every setting can be overridden by an environment
+variable, ie, GUNICORN_WORKERS=8.
+
+See https://docs.gunicorn.org/en/stable/settings.html
+"""
+import gc
+import glob
+import math
+import os
+import tempfile
+
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).lower() == 'true'
+
+
+def cpu_quota():
+    """
+    Gets the number of CPUs the container is limited to by its cgroup. The CPU count of the node is no guide to this, as
+    it is the same for every pod on the node
+
+    :return: The number of CPUs, or None if the container has no CPU limit
+    """
+    try:
+        # cgroup v2
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                quota = f.read().strip()
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = f.read().strip()
+        except OSError:
+            return None
+
+    if quota in ('max', '-1'):
+        return None
+
+    return int(quota) / int(period)
+
+
+def default_workers():
+    # Each worker holds its own thread pool, in-process indexes and database connections, so a small fixed number of
+    # workers is used unless the container has a CPU limit to size them from
+    quota = cpu_quota()
+    if quota is None:
+        return 2
+
+    return max(1, math.ceil(quota))
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# ASGI workers serve many requests at once from their event loop (See gw_db_search.asgi). The number of threads only
+# applies to the gthread worker class
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+workers = int(os.getenv('GUNICORN_WORKERS', default_workers()))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
+
+# Load the application (and the GWCloud apps it imports) once in the master process before the workers are forked, so
+# the workers share its memory and start quickly
+preload_app = env_bool('GUNICORN_PRELOAD', True)
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Restart workers after a number of requests to bound the growth of their memory. 0 disables restarts
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+# Move every object created while loading the application into the permanent generation before forking. The garbage
+# collector would otherwise touch them in each worker, copying the shared pages into every worker's memory
+gc_freeze = env_bool('GUNICORN_GC_FREEZE', True)
+
+
+# Each worker writes its metrics to this directory with prometheus_client, so that a scrape of any worker reports the
+# metrics of every worker (See db_search.utils.metrics). This is read when prometheus_client is imported, so it is set
+# here before the application is loaded. Set PROMETHEUS_MULTIPROC_DIR to an empty string to report the metrics of each
+# worker alone
+metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'db_search_metrics')
+)
+if metrics_dir:
+    # The preloaded application creates its metric files in the directory as it is imported
+    os.makedirs(metrics_dir, exist_ok=True)
+else:
+    # prometheus_client writes to the directory if the variable is set at all
+    del os.environ['PROMETHEUS_MULTIPROC_DIR']
+
+
+def on_starting(server):
+    # The metrics of an earlier server would otherwise be added to this server's. The master process doesn't record any
+    # metrics itself, so the files it created while preloading the application can be removed as well
+    if metrics_dir:
+        for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    # The counts of a worker that has exited are still reported, since counters must never go down, but its live gauges
+    # are not
+    if metrics_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    if preload_app and gc_freeze:
+        gc.collect()
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    # Each worker syncs the search structures in the background if enabled. Threads don't survive the fork from the
+    # master process, so the thread is started once the worker has loaded the application
+    from django.conf import settings
+
+    if settings.SEARCH_SYNC_THREAD:
+        from db_search.utils.sync import start_sync_thread
+        start_sync_thread()
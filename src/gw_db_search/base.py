@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'db_search.middleware.metrics_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -126,6 +127,18 @@ DATABASES = {
             'NAME': 'test_gwlab_viterbi',
         },
     },
+    # Search structures (indexes, caches of derived state) that are owned by db_search itself
+    'db_search': {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': 'gwcloud_db_search',
+        'HOST': mysql_host,
+        'USER': 'root',
+        'PORT': 3306,
+        'PASSWORD': 'root',
+        'TEST': {
+            'NAME': 'test_gwcloud_db_search',
+        },
+    },
 }
 
 # Password validation
@@ -209,4 +222,92 @@ TESTING = False
 # The maximum number of results to return from the graphql endpoint
 GRAPHENE_RESULTS_LIMIT = 100
 
+# The maximum number of results a search can skip with first. Skipped results still have to be found by the search
+SEARCH_MAX_OFFSET = 10000
+
 EMBARGO_START_TIME = None
+
+# The engine used to match search terms against jobs. One of:
+#   'like'     - leading wildcard LIKE scans over the application tables
+#   'ngram'    - candidate jobs are found using the db_search n-gram index, and only those candidates are LIKE scanned.
+#                The index is built with the sync_search_index management command (with --rebuild) and kept up to
+#                date by the command or the sync thread (See SEARCH_SYNC_THREAD).
+#   'fulltext' - job names and descriptions are matched with InnoDB FULLTEXT indexes in boolean mode, matching words
+#                that start with each term. The indexes are created with the create_fulltext_indexes management command.
+#                LIKE scans are used until they exist, and for terms shorter than SEARCH_FULLTEXT_MIN_TOKEN_SIZE, which
+#                should match the innodb_ft_min_token_size of the server.
+#   'replica'  - terms are resolved to jobs in process from a SQLite FTS5 replica of the searchable text, kept in the
+#                SEARCH_REPLICA_DATABASE database. The replica is built and updated from new and changed jobs by the
+#                update_search_replica management command or the sync thread (See SEARCH_SYNC_THREAD). Jobs created
+#                since it was last updated, and every job until it has been built, are matched with LIKE scans, as are
+#                the terms if more than SEARCH_CANDIDATE_LIMIT jobs match.
+#   'document' - terms, job states and time ranges are all matched against the db_search search document table, which
+#                holds the searchable text and filters of every job. The documents are built with the
+#                sync_search_index management command (with --rebuild) and kept up to date by the command or the sync
+#                thread (See SEARCH_SYNC_THREAD).
+SEARCH_ENGINE = 'like'
+SEARCH_FULLTEXT_MIN_TOKEN_SIZE = 3
+SEARCH_REPLICA_DATABASE = 'default'
+
+# Search terms are matched against label names from a dictionary of the labels of each application held by each
+# process, which is loaded again every SEARCH_LABEL_REFRESH_INTERVAL seconds, rather than from the label tables
+SEARCH_LABEL_REFRESH_INTERVAL = 60
+
+# Search terms are matched against user names and bilby event ids from indexes of the names held by each process,
+# rather than from the auth and event id tables. New users and event ids are added to the indexes as they are created,
+# and the indexes are loaded again every SEARCH_USER_REFRESH_INTERVAL and SEARCH_EVENT_ID_REFRESH_INTERVAL seconds to
+# pick up changed names.
+SEARCH_USER_REFRESH_INTERVAL = 300
+SEARCH_EVENT_ID_REFRESH_INTERVAL = 300
+
+# The matching user ids are put in the search statement, unless a term (ie, a term of one or two characters) matches
+# more than SEARCH_MAX_USER_IDS users. The user names are then matched by a subquery of the auth database, which must be
+# on the same server as the application databases.
+SEARCH_MAX_USER_IDS = 300
+
+# If searches should filter on job state using the db_search job state table rather than the job history. The table must
+# be built with the update_job_states management command or the sync thread, and searches use the job history until it
+# has been. Searches never update the table themselves, so once built it must be kept up to date with new job history
+# entries by the sync thread or by running the command regularly.
+SEARCH_JOB_STATE_TABLE = False
+
+# Searches for several terms match the most selective term first, then check each further term against only the jobs
+# that matched the terms before it. If more than SEARCH_CANDIDATE_LIMIT jobs match the most selective term, the terms
+# are all matched by a single statement instead. 0 always matches the terms with a single statement.
+SEARCH_CANDIDATE_LIMIT = 10000
+
+# Search result caching. SEARCH_CACHE_BACKEND is one of:
+#   None     - search results are not cached
+#   'local'  - an in-process LRU cache holding up to SEARCH_CACHE_MAX_ENTRIES results
+#   'django' - the Django cache named by SEARCH_CACHE_ALIAS, which may be shared between processes
+# Cached results expire after SEARCH_CACHE_TTL seconds, or earlier if a job or job history entry is added. The end times
+# (the start of the time window) of time_range searches are rounded down to SEARCH_CACHE_TIME_QUANTUM seconds so that
+# searches made close together can share results. Explicit since times are never rounded. The newest job and job
+# history entry are read at most every SEARCH_CACHE_WATERMARK_TTL seconds per process to check if results are out of
+# date, so results may be served for that long after a job is added. 0 checks before every lookup.
+SEARCH_CACHE_BACKEND = None
+SEARCH_CACHE_TTL = 60
+SEARCH_CACHE_MAX_ENTRIES = 1024
+SEARCH_CACHE_ALIAS = 'default'
+SEARCH_CACHE_TIME_QUANTUM = 60
+SEARCH_CACHE_WATERMARK_TTL = 1
+
+# The search structures used by SEARCH_ENGINE (the n-gram index or the search documents) are kept up to date by
+# re-indexing new and changed jobs with the sync_search_index management command. If SEARCH_SYNC_THREAD is set, each
+# server process also runs a background thread that syncs them every SEARCH_SYNC_INTERVAL seconds, along with the job
+# state table if SEARCH_JOB_STATE_TABLE is set and the search replica if SEARCH_ENGINE is 'replica'.
+# sync_search_index --rebuild spreads the jobs over SEARCH_SYNC_WORKERS processes.
+SEARCH_SYNC_THREAD = False
+SEARCH_SYNC_INTERVAL = 30
+SEARCH_SYNC_WORKERS = 4
+
+# The number of threads each process uses to query several databases at once, ie, when the publicJobs query searches
+# every application concurrently. Each thread holds its own database connections.
+SEARCH_THREAD_POOL_SIZE = 4
+
+# The search metrics are served at /metrics (See db_search.utils.metrics). If the PROMETHEUS_MULTIPROC_DIR environment
+# variable is set, each process writes its metrics to files in the directory, and /metrics reports the metrics of every
+# process, so that every gunicorn worker reports the same totals (See gunicorn.conf). If SEARCH_METRICS_TOKEN is set,
+# /metrics requires it as a bearer token, otherwise /metrics is only served to requests made straight from a private
+# address.
+SEARCH_METRICS_TOKEN = None
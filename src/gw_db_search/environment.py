@@ -45,4 +45,55 @@ DATABASES = {
         'PORT': 3306,
         'PASSWORD': MYSQL_PASSWORD,
     },
+    'db_search': {
+        'ENGINE': 'django.db.backends.mysql',
+        'NAME': 'gwcloud_db_search',
+        'HOST': MYSQL_HOST,
+        'USER': MYSQL_USER,
+        'PORT': 3306,
+        'PASSWORD': MYSQL_PASSWORD,
+    },
 }
+
+SEARCH_ENGINE = os.getenv('SEARCH_ENGINE', 'like')
+SEARCH_FULLTEXT_MIN_TOKEN_SIZE = int(os.getenv('SEARCH_FULLTEXT_MIN_TOKEN_SIZE', 3))
+
+SEARCH_LABEL_REFRESH_INTERVAL = int(os.getenv('SEARCH_LABEL_REFRESH_INTERVAL', 60))
+SEARCH_USER_REFRESH_INTERVAL = int(os.getenv('SEARCH_USER_REFRESH_INTERVAL', 300))
+SEARCH_EVENT_ID_REFRESH_INTERVAL = int(os.getenv('SEARCH_EVENT_ID_REFRESH_INTERVAL', 300))
+SEARCH_MAX_USER_IDS = int(os.getenv('SEARCH_MAX_USER_IDS', 300))
+
+SEARCH_JOB_STATE_TABLE = os.getenv('SEARCH_JOB_STATE_TABLE', 'false').lower() == 'true'
+
+SEARCH_CANDIDATE_LIMIT = int(os.getenv('SEARCH_CANDIDATE_LIMIT', 10000))
+
+SEARCH_CACHE_BACKEND = os.getenv('SEARCH_CACHE_BACKEND')
+SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 60))
+SEARCH_CACHE_WATERMARK_TTL = float(os.getenv('SEARCH_CACHE_WATERMARK_TTL', 1))
+
+SEARCH_SYNC_THREAD = os.getenv('SEARCH_SYNC_THREAD', 'false').lower() == 'true'
+SEARCH_SYNC_INTERVAL = int(os.getenv('SEARCH_SYNC_INTERVAL', 30))
+SEARCH_SYNC_WORKERS = int(os.getenv('SEARCH_SYNC_WORKERS', 4))
+
+SEARCH_THREAD_POOL_SIZE = int(os.getenv('SEARCH_THREAD_POOL_SIZE', 4))
+
+SEARCH_METRICS_TOKEN = os.getenv('SEARCH_METRICS_TOKEN')
+
+# Keep connections open between requests for DB_CONN_MAX_AGE seconds, and optionally check connections out of a pool
+# per database rather than opening a new connection for each request (See db_search.db.backends.mysql)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 0))
+DB_POOL = os.getenv('DB_POOL', 'false').lower() == 'true'
+
+for database in DATABASES.values():
+    if database['ENGINE'] != 'django.db.backends.mysql':
+        continue
+
+    database['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+
+    if DB_POOL:
+        database['ENGINE'] = 'db_search.db.backends.mysql'
+        database['POOL'] = {
+            'SIZE': int(os.getenv('DB_POOL_SIZE', 10)),
+            'IDLE_TIMEOUT': int(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+            'CHECKOUT_TIMEOUT': int(os.getenv('DB_POOL_CHECKOUT_TIMEOUT', 10))
+        }
@@ -0,0 +1,7 @@
+#!/bin/bash
+# Waits until the db_search migrations for this release have been applied by the gwcloud-db-search-migrate job, so
+# that servers never start against an out of date schema
+until /src/venv/bin/python /src/production-manage.py migrate db_search --database db_search --check; do
+  echo "Waiting for the db_search migrations to be applied"
+  sleep 5
+done